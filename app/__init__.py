@@ -4,10 +4,47 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object('config.Config')
 
+    # select the storage backend (supabase / sqlite / memory)
+    from .backends import init_backend
+    init_backend(app.config)
+
+    from . import events
+    events.configure(app.config['EVENTS_QUEUE_SIZE'], app.config['EVENTS_MAX_SUBSCRIBERS'])
+
+    from .throttle import login_throttle
+    login_throttle.configure(app.config['LOGIN_MAX_FAILURES'], app.config['LOGIN_MAX_FAILURES_PER_ADDRESS'],
+                             app.config['LOGIN_THROTTLE_WINDOW'])
+
+    # orjson encoding, compression
+    from . import responses
+    responses.init_app(app)
+
+    if app.config['METRICS_ENABLED']:
+        from . import metrics
+        metrics.init_app(app)
+
     # import and register routes
     from .routes import main
     app.register_blueprint(main)
 
+    @app.cli.command('migrate-log-payloads')
+    def migrate_log_payloads():
+        """Moves JSON change sets of old log entries into the payload column."""
+        from .db import migrate_log_payloads
+        print(f"migrated {migrate_log_payloads()} log entries")
+
+    @app.cli.command('hash-passwords')
+    def hash_passwords():
+        """Hashes the plaintext passwords stored before password hashing was introduced."""
+        from .db import hash_plaintext_passwords
+        print(f"hashed {hash_plaintext_passwords()} passwords")
+
+    @app.cli.command('remove-unclaimed-uploads')
+    def remove_unclaimed_uploads():
+        """Removes direct uploads that were never recorded and can't be anymore."""
+        from .db import remove_unclaimed_uploads
+        print(f"removed {remove_unclaimed_uploads()} files")
+
     # inject path constants globally into all Jinja templates
     @app.context_processor
     def inject_constants():
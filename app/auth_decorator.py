@@ -1,34 +1,48 @@
 import inspect
 from functools import wraps
 
-from flask import Response, request
+from flask import Response, current_app, request
 
-from app.db import validate_token
+from app.models import UserRoles
+from app.tokens import validate_token
 
 
-def authorized(f):
+def authorized(f=None, *, roles: list[UserRoles] | None = None):
+    """
+    Checks the access token of the request, usable as @authorized or @authorized(roles=[...]).
+    Tokens of other roles are rejected with 403 before the view runs.
+    The view gets `role` / `user_id` passed if it has parameters with these names.
+    """
+    if f is None:
+        return lambda view: authorized(view, roles=roles)
+
+    allowed = frozenset(roles) if roles else None
+    # resolved once here instead of inspecting the view on every request
+    params = inspect.signature(f).parameters
+    wants_role = 'role' in params
+    wants_user_id = 'user_id' in params
+
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Token')
         if not token:
             return Response(status=401)
 
-        role, user_id = validate_token(token)
-        if role is None:
+        # invalid or expired tokens are answered with 401, the client refreshes and retries
+        result = validate_token(token)
+        if result is None:
             return Response(status=401)
+        role, user_id = result
 
-        # get function parameter names
-        sig = inspect.signature(f)
-        params = sig.parameters
+        if allowed is not None and role not in allowed:
+            return Response(status=403)
 
-        # build only kwargs that function accepts
-        call_kwargs = {}
-        if 'role' in params:
-            call_kwargs['role'] = role
-        if 'user_id' in params:
-            call_kwargs['user_id'] = user_id
+        if wants_role:
+            kwargs['role'] = role
+        if wants_user_id:
+            kwargs['user_id'] = user_id
 
-        # Pass role to the route function
-        return f(*args, **call_kwargs, **kwargs)
+        # async views are run to completion by Flask
+        return current_app.ensure_sync(f)(*args, **kwargs)
 
-    return decorated
\ No newline at end of file
+    return decorated
@@ -0,0 +1,85 @@
+"""
+Storage backend selection.
+
+Every function in app/db.py talks to the backend through `get_client()`, which
+returns an object exposing the same fluent API as the Supabase client
+(`table(...).select(...).eq(...).execute()`, `storage.from_(bucket)` and `rpc`).
+The engine is chosen by `Config.STORAGE_BACKEND`:
+
+- "supabase": the hosted Supabase project (default)
+- "sqlite":   a local SQLite database file at `Config.SQLITE_PATH`
+- "memory":   a throw-away in-memory SQLite database
+
+`Config.SIMULATED_LATENCY_MS` adds a fixed delay to every backend call, so the
+local engines can stand in for the remote service in benchmarks and load tests.
+"""
+import threading
+
+from config import Config
+
+_client = None
+_lock = threading.Lock()
+
+
+def create_client(config) -> object:
+    from .instrumented import InstrumentedClient, simulated_latency, timed
+
+    client = _create_engine_client(config)
+    if config.get("SIMULATED_LATENCY_MS"):
+        client = InstrumentedClient(client, simulated_latency(config["SIMULATED_LATENCY_MS"] / 1000))
+    if config.get("METRICS_ENABLED"):
+        client = InstrumentedClient(client, timed)
+    return client
+
+
+def _create_engine_client(config) -> object:
+    engine = (config.get("STORAGE_BACKEND") or "supabase").lower()
+
+    if engine == "supabase":
+        from .supabase_backend import create_supabase_client
+        return create_supabase_client(
+            config.get("SUPABASE_URL"),
+            config.get("SUPABASE_KEY"),
+            pool_size=config.get("BACKEND_POOL_SIZE") or 20,
+            keepalive=config.get("BACKEND_KEEPALIVE") or 30,
+            timeout=config.get("BACKEND_TIMEOUT") or 10,
+        )
+    if engine == "sqlite":
+        from .sqlite_backend import SQLiteClient
+        return SQLiteClient(config.get("SQLITE_PATH") or "maintenance_tracker.db")
+    if engine == "memory":
+        from .sqlite_backend import SQLiteClient
+        return SQLiteClient(":memory:")
+
+    raise ValueError(f"Unknown storage backend: {engine}")
+
+
+def init_backend(config) -> object:
+    """(Re)creates the global client from a Flask config mapping."""
+    global _client
+    with _lock:
+        _client = create_client(config)
+    return _client
+
+
+def reset_client() -> None:
+    """
+    Drops the client inherited from the parent process, the next `get_client()` of
+    a forked worker opens its own connections.
+    """
+    set_client(None)
+
+
+def set_client(client) -> None:
+    global _client
+    with _lock:
+        _client = client
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = create_client({k: getattr(Config, k) for k in dir(Config) if k.isupper()})
+    return _client
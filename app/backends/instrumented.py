@@ -0,0 +1,98 @@
+"""
+Wraps a backend client so every query, rpc and storage call goes through a hook
+`hook(label, call)` that has to invoke `call()` and return its result.
+Used for the metrics (see app/metrics.py) and the simulated backend latency.
+"""
+import time
+
+_OPERATIONS = ("select", "insert", "upsert", "update", "delete")
+
+
+class InstrumentedQuery:
+    def __init__(self, query, label: str, hook):
+        self._query = query
+        self._label = label
+        self._hook = hook
+
+    def __getattr__(self, name):
+        attr = getattr(self._query, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            label = f"{self._label}.{name}" if name in _OPERATIONS and "." not in self._label else self._label
+            return InstrumentedQuery(result, label, self._hook)
+
+        return call
+
+    def execute(self):
+        return self._hook(self._label, self._query.execute)
+
+
+class InstrumentedBucket:
+    # pure url building, no round trip
+    _UNHOOKED = ("get_public_url",)
+
+    def __init__(self, bucket, name: str, hook):
+        self._bucket = bucket
+        self._name = name
+        self._hook = hook
+
+    def __getattr__(self, name):
+        attr = getattr(self._bucket, name)
+        if not callable(attr) or name in self._UNHOOKED:
+            return attr
+
+        def call(*args, **kwargs):
+            return self._hook(f"storage.{self._name}.{name}", lambda: attr(*args, **kwargs))
+
+        return call
+
+
+class InstrumentedStorage:
+    def __init__(self, storage, hook):
+        self._storage = storage
+        self._hook = hook
+
+    def from_(self, bucket: str) -> InstrumentedBucket:
+        return InstrumentedBucket(self._storage.from_(bucket), bucket, self._hook)
+
+    def __getattr__(self, name):
+        return getattr(self._storage, name)
+
+
+class InstrumentedClient:
+    def __init__(self, client, hook):
+        self.client = client
+        self.storage = InstrumentedStorage(client.storage, hook)
+        self._hook = hook
+
+    def table(self, name: str) -> InstrumentedQuery:
+        return InstrumentedQuery(self.client.table(name), name, self._hook)
+
+    def rpc(self, name: str, params: dict | None = None) -> InstrumentedQuery:
+        return InstrumentedQuery(self.client.rpc(name, params or {}), f"rpc.{name}", self._hook)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def timed(label: str, call):
+    from .. import metrics
+
+    start = time.perf_counter()
+    try:
+        return call()
+    finally:
+        metrics.record_backend_call(label, time.perf_counter() - start)
+
+
+def simulated_latency(seconds: float):
+    """Hook that adds a fixed round trip time to every call, e.g. to make the local engine behave like a remote one."""
+    def hook(label: str, call):
+        time.sleep(seconds)
+        return call()
+    return hook
@@ -0,0 +1,940 @@
+"""
+Local SQLite engine that mimics the subset of the Supabase client used by app/db.py.
+
+It lets the app run, be benchmarked and load-tested without the remote service.
+Tables mirror the Supabase schema and carry indexes on the columns the app
+filters and sorts by (token, assigned_to, created_at, ticket_id, ...).
+Uploaded files are stored as blobs in the `storage_objects` table.
+"""
+import json
+import re
+import secrets
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    email TEXT UNIQUE,
+    password TEXT,
+    token TEXT UNIQUE,
+    role INTEGER DEFAULT 2,
+    created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    description TEXT,
+    priority INTEGER,
+    status INTEGER DEFAULT 1,
+    created_by TEXT,
+    assigned_to TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS ticket_log_entries (
+    id TEXT PRIMARY KEY,
+    ticket_id TEXT,
+    actor_user_id TEXT,
+    action_type TEXT,
+    message TEXT,
+    old_status INTEGER,
+    new_status INTEGER,
+    payload TEXT,
+    changed_fields TEXT,
+    created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS ticket_attachments (
+    id TEXT PRIMARY KEY,
+    ticket_id TEXT,
+    log_entry_id TEXT,
+    uploaded_by TEXT,
+    storage_path TEXT,
+    thumbnail_path TEXT,
+    medium_path TEXT,
+    file_name TEXT,
+    mime_type TEXT,
+    file_size INTEGER,
+    created_at TEXT
+);
+
+CREATE TABLE IF NOT EXISTS ticket_photos (
+    id TEXT PRIMARY KEY,
+    ticket_id TEXT,
+    url TEXT,
+    thumbnail_url TEXT,
+    medium_url TEXT,
+    file_path TEXT,
+    uploaded_by TEXT,
+    created_at TEXT
+);
+
+-- one row per ticket that was reassigned away from a user
+CREATE TABLE IF NOT EXISTS ticket_tombstones (
+    id TEXT PRIMARY KEY,
+    ticket_id TEXT,
+    user_id TEXT,
+    created_at TEXT
+);
+
+-- content addressed files shared by ticket_photos / ticket_attachments rows
+CREATE TABLE IF NOT EXISTS storage_blobs (
+    hash TEXT PRIMARY KEY,
+    storage_path TEXT UNIQUE,
+    size INTEGER,
+    mime_type TEXT,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    thumbnail_path TEXT,
+    medium_path TEXT,
+    created_at TEXT
+);
+
+-- ticket counts per assignee ('' = unassigned) / status / priority, maintained by triggers
+CREATE TABLE IF NOT EXISTS ticket_counts (
+    assignee TEXT NOT NULL DEFAULT '',
+    status INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (assignee, status, priority)
+);
+
+-- change counter per table, bumped by triggers, the ETags of the list endpoints are built from it
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS storage_objects (
+    bucket TEXT NOT NULL,
+    path TEXT NOT NULL,
+    content BLOB,
+    content_type TEXT,
+    size INTEGER,
+    created_at TEXT,
+    PRIMARY KEY (bucket, path)
+);
+
+-- logged out access tokens (jti) until they expire
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at TEXT NOT NULL,
+    created_at TEXT
+);
+
+-- tokens of the signed upload urls, used once
+CREATE TABLE IF NOT EXISTS storage_upload_tokens (
+    token TEXT PRIMARY KEY,
+    bucket TEXT NOT NULL,
+    path TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+"""
+
+# columns added after the first release, created on existing database files
+ADDED_COLUMNS = [
+    ("tickets", "updated_at", "TEXT"),
+    ("tickets", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("ticket_log_entries", "payload", "TEXT"),
+    ("ticket_log_entries", "changed_fields", "TEXT"),
+    ("ticket_attachments", "thumbnail_path", "TEXT"),
+    ("ticket_attachments", "medium_path", "TEXT"),
+    ("ticket_photos", "thumbnail_url", "TEXT"),
+    ("ticket_photos", "medium_url", "TEXT"),
+    ("ticket_photos", "uploaded_by", "TEXT"),
+]
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_users_token ON users(token);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_assigned_to ON tickets(assigned_to, created_at);
+CREATE INDEX IF NOT EXISTS idx_log_entries_created_at ON ticket_log_entries(created_at, id);
+CREATE INDEX IF NOT EXISTS idx_log_entries_ticket_id ON ticket_log_entries(ticket_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_attachments_log_entry_id ON ticket_attachments(log_entry_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_attachments_ticket_id ON ticket_attachments(ticket_id);
+CREATE INDEX IF NOT EXISTS idx_attachments_storage_path ON ticket_attachments(storage_path);
+CREATE INDEX IF NOT EXISTS idx_photos_ticket_id ON ticket_photos(ticket_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_photos_file_path ON ticket_photos(file_path);
+CREATE INDEX IF NOT EXISTS idx_tickets_updated_at ON tickets(updated_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_assigned_to_updated_at ON tickets(assigned_to, updated_at);
+CREATE INDEX IF NOT EXISTS idx_tombstones_user_id ON ticket_tombstones(user_id, created_at);
+"""
+
+# FTS5 indexes behind the search functions (search_tickets / search_log_entries in
+# sqlite_functions.py), kept up to date by triggers
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+    name, description, content='tickets', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO tickets_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_delete AFTER DELETE ON tickets BEGIN
+    INSERT INTO tickets_fts (tickets_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_update AFTER UPDATE OF name, description ON tickets BEGIN
+    INSERT INTO tickets_fts (tickets_fts, rowid, name, description) VALUES ('delete', old.rowid, old.name, old.description);
+    INSERT INTO tickets_fts (rowid, name, description) VALUES (new.rowid, new.name, new.description);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS log_entries_fts USING fts5(
+    message, content='ticket_log_entries', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS log_entries_fts_insert AFTER INSERT ON ticket_log_entries BEGIN
+    INSERT INTO log_entries_fts (rowid, message) VALUES (new.rowid, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS log_entries_fts_delete AFTER DELETE ON ticket_log_entries BEGIN
+    INSERT INTO log_entries_fts (log_entries_fts, rowid, message) VALUES ('delete', old.rowid, old.message);
+END;
+CREATE TRIGGER IF NOT EXISTS log_entries_fts_update AFTER UPDATE OF message ON ticket_log_entries BEGIN
+    INSERT INTO log_entries_fts (log_entries_fts, rowid, message) VALUES ('delete', old.rowid, old.message);
+    INSERT INTO log_entries_fts (rowid, message) VALUES (new.rowid, new.message);
+END;
+"""
+
+# keeps ticket_counts in step with the tickets table (tickets_counts trigger in Postgres)
+COUNTS_SCHEMA = """
+CREATE TRIGGER IF NOT EXISTS tickets_counts_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO ticket_counts (assignee, status, priority, count)
+    VALUES (coalesce(new.assigned_to, ''), coalesce(new.status, 0), coalesce(new.priority, 0), 1)
+    ON CONFLICT (assignee, status, priority) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_counts_delete AFTER DELETE ON tickets BEGIN
+    UPDATE ticket_counts SET count = count - 1
+    WHERE assignee = coalesce(old.assigned_to, '') AND status = coalesce(old.status, 0)
+      AND priority = coalesce(old.priority, 0);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_counts_update AFTER UPDATE OF assigned_to, status, priority ON tickets BEGIN
+    UPDATE ticket_counts SET count = count - 1
+    WHERE assignee = coalesce(old.assigned_to, '') AND status = coalesce(old.status, 0)
+      AND priority = coalesce(old.priority, 0);
+    INSERT INTO ticket_counts (assignee, status, priority, count)
+    VALUES (coalesce(new.assigned_to, ''), coalesce(new.status, 0), coalesce(new.priority, 0), 1)
+    ON CONFLICT (assignee, status, priority) DO UPDATE SET count = count + 1;
+END;
+"""
+
+# bumps table_versions on every change of the tables behind the list endpoints (table_versions trigger in Postgres)
+# users only on changes of the returned columns, not on token rotation / password rehashing
+VERSIONS_SCHEMA = """
+-- row version of every ticket, checked by update_ticket_with_log (tickets_row_version trigger in Postgres)
+CREATE TRIGGER IF NOT EXISTS tickets_row_version
+AFTER UPDATE OF name, description, priority, status, assigned_to, updated_at ON tickets BEGIN
+    UPDATE tickets SET version = old.version + 1 WHERE rowid = new.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_version_insert AFTER INSERT ON tickets BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('tickets', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_version_update AFTER UPDATE ON tickets BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('tickets', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_version_delete AFTER DELETE ON tickets BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('tickets', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS users_version_insert AFTER INSERT ON users BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('users', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS users_version_update AFTER UPDATE OF name, email, role ON users BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('users', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS users_version_delete AFTER DELETE ON users BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('users', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_log_entries_version_insert AFTER INSERT ON ticket_log_entries BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('ticket_log_entries', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_log_entries_version_update AFTER UPDATE ON ticket_log_entries BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('ticket_log_entries', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_log_entries_version_delete AFTER DELETE ON ticket_log_entries BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('ticket_log_entries', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_attachments_version_insert AFTER INSERT ON ticket_attachments BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('ticket_attachments', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_attachments_version_update AFTER UPDATE ON ticket_attachments BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('ticket_attachments', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_attachments_version_delete AFTER DELETE ON ticket_attachments BEGIN
+    INSERT INTO table_versions (table_name, version) VALUES ('ticket_attachments', 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = version + 1;
+END;
+"""
+
+# columns filled in by the database on the Supabase side
+DEFAULTS = {
+    "users": {
+        "id": lambda: str(uuid.uuid4()),
+        "token": lambda: uuid.uuid4().hex,
+        "created_at": lambda: datetime.now().isoformat(),
+    },
+    "tickets": {
+        "id": lambda: str(uuid.uuid4()),
+        "created_at": lambda: datetime.now().isoformat(),
+    },
+    "ticket_tombstones": {
+        "id": lambda: str(uuid.uuid4()),
+        "created_at": lambda: datetime.now().isoformat(),
+    },
+    "ticket_log_entries": {
+        "id": lambda: str(uuid.uuid4()),
+        "created_at": lambda: datetime.now().isoformat(),
+    },
+    "ticket_attachments": {
+        "id": lambda: str(uuid.uuid4()),
+        "created_at": lambda: datetime.now().isoformat(),
+    },
+    "ticket_photos": {
+        "id": lambda: str(uuid.uuid4()),
+        "created_at": lambda: datetime.now().isoformat(),
+    },
+}
+
+# foreign keys used for embedded resources in select(), e.g. "*, tickets(name)":
+# (table, embedded table) -> (local column, foreign column, embeds a list)
+RELATIONS = {
+    ("ticket_log_entries", "tickets"): ("ticket_id", "id", False),
+    ("ticket_log_entries", "ticket_attachments"): ("id", "log_entry_id", True),
+    ("ticket_attachments", "tickets"): ("ticket_id", "id", False),
+    ("ticket_attachments", "ticket_log_entries"): ("log_entry_id", "id", False),
+    ("ticket_photos", "tickets"): ("ticket_id", "id", False),
+    ("tickets", "ticket_log_entries"): ("id", "ticket_id", True),
+    ("tickets", "ticket_photos"): ("id", "ticket_id", True),
+}
+
+# columns stored as JSON text and decoded on read
+JSON_COLUMNS: dict[str, set[str]] = {
+    "ticket_log_entries": {"payload", "changed_fields"},
+}
+
+PUBLIC_STORAGE_PREFIX = "/storage"
+# same lifetime as the signed upload urls of supabase storage
+SIGNED_UPLOAD_URL_TTL = timedelta(hours=2)
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_OPERATORS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class APIError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+class APIResponse:
+    def __init__(self, data, count: int | None = None):
+        self.data = data
+        self.count = count
+
+
+def _ident(name: str) -> str:
+    name = name.strip()
+    if not _IDENTIFIER.match(name):
+        raise APIError(f"Invalid identifier: {name}")
+    return name
+
+
+def _split_top_level(text: str) -> list[str]:
+    """Splits on commas that are neither inside parentheses nor double quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(ch)
+    if current:
+        parts.append("".join(current))
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _condition(column: str, operator: str, value) -> tuple[str, list]:
+    column = _ident(column)
+
+    if operator in _OPERATORS:
+        return f"{column} {_OPERATORS[operator]} ?", [value]
+    if operator in ("like", "ilike"):
+        # PostgREST accepts * as wildcard next to %
+        return f"{column} LIKE ?", [str(value).replace("*", "%")]
+    if operator == "is":
+        if value is None or str(value).lower() == "null":
+            return f"{column} IS NULL", []
+        return f"{column} IS ?", [1 if str(value).lower() == "true" else 0]
+    if operator == "in":
+        values = list(value)
+        if not values:
+            return "0", []
+        return f"{column} IN ({', '.join('?' * len(values))})", values
+    if operator == "cs":
+        # JSON array column contains every given value
+        values = list(value)
+        if not values:
+            return "1", []
+        return " AND ".join(
+            f"EXISTS (SELECT 1 FROM json_each({column}) WHERE json_each.value = ?)" for _ in values
+        ), values
+
+    raise APIError(f"Unsupported operator: {operator}")
+
+
+def _parse_logic_tree(expression: str, joiner: str) -> tuple[str, list]:
+    """Translates a PostgREST `or`/`and` filter string into SQL."""
+    sql_parts, params = [], []
+    for part in _split_top_level(expression):
+        negate = part.startswith("not.")
+        if negate:
+            part = part[4:]
+
+        if part.startswith("or(") or part.startswith("and("):
+            inner_joiner = "OR" if part.startswith("or(") else "AND"
+            inner = part[part.index("(") + 1:-1]
+            sql, p = _parse_logic_tree(inner, inner_joiner)
+        else:
+            column, operator, value = part.split(".", 2)
+            if operator == "in":
+                value = [_unquote(v) for v in _split_top_level(value.strip("()"))]
+            else:
+                value = _unquote(value)
+            sql, p = _condition(column, operator, value)
+
+        sql_parts.append(f"NOT ({sql})" if negate else f"({sql})")
+        params.extend(p)
+
+    return f" {joiner} ".join(sql_parts), params
+
+
+class QueryBuilder:
+    def __init__(self, client: "SQLiteClient", table: str):
+        self._client = client
+        self._table = _ident(table)
+        self._operation = "select"
+        self._columns = "*"
+        self._payload = None
+        self._on_conflict = "id"
+        self._filters: list[tuple[str, list]] = []
+        self._embedded_filters: dict[str, list[tuple[str, list]]] = {}
+        self._order: list[str] = []
+        self._embedded_order: dict[str, list[str]] = {}
+        self._limit = None
+        self._offset = None
+        self._single = False
+        self._maybe_single = False
+        self._count = None
+
+    # --- operations ---
+    def select(self, columns: str = "*", count: str | None = None):
+        self._operation = "select"
+        self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, data):
+        self._operation = "insert"
+        self._payload = data
+        return self
+
+    def upsert(self, data, on_conflict: str = "id"):
+        self._operation = "upsert"
+        self._payload = data
+        self._on_conflict = on_conflict
+        return self
+
+    def update(self, data: dict):
+        self._operation = "update"
+        self._payload = data
+        return self
+
+    def delete(self):
+        self._operation = "delete"
+        return self
+
+    # --- filters ---
+    def _add(self, column: str, operator: str, value):
+        if "." in column:
+            # filter on an embedded resource, e.g. eq("tickets.name", ...)
+            table, column = column.split(".", 1)
+            self._embedded_filters.setdefault(_ident(table), []).append(_condition(column, operator, value))
+        else:
+            self._filters.append(_condition(column, operator, value))
+        return self
+
+    def eq(self, column, value):
+        return self._add(column, "eq", value)
+
+    def neq(self, column, value):
+        return self._add(column, "neq", value)
+
+    def gt(self, column, value):
+        return self._add(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._add(column, "gte", value)
+
+    def lt(self, column, value):
+        return self._add(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._add(column, "lte", value)
+
+    def like(self, column, pattern):
+        return self._add(column, "like", pattern)
+
+    def ilike(self, column, pattern):
+        return self._add(column, "ilike", pattern)
+
+    def is_(self, column, value):
+        return self._add(column, "is", value)
+
+    def in_(self, column, values):
+        return self._add(column, "in", values)
+
+    def contains(self, column, values):
+        return self._add(column, "cs", values)
+
+    def or_(self, filters: str):
+        self._filters.append(_parse_logic_tree(filters, "OR"))
+        return self
+
+    # --- modifiers ---
+    def order(self, column: str, desc: bool = False, foreign_table: str | None = None):
+        term = f"{_ident(column)} {'DESC' if desc else 'ASC'}"
+        if foreign_table:
+            self._embedded_order.setdefault(_ident(foreign_table), []).append(term)
+        else:
+            self._order.append(term)
+        return self
+
+    def limit(self, size: int):
+        self._limit = int(size)
+        return self
+
+    def range(self, start: int, end: int):
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._maybe_single = True
+        return self
+
+    # --- execution ---
+    @staticmethod
+    def _join(filters: list[tuple[str, list]]) -> tuple[str, list]:
+        params = []
+        for _, p in filters:
+            params.extend(p)
+        return " AND ".join(f"({sql})" for sql, _ in filters), params
+
+    def _relation(self, table: str) -> tuple[str, str, bool]:
+        relation = RELATIONS.get((self._table, table))
+        if relation is None:
+            raise APIError(f"Could not find a relationship between {self._table} and {table}")
+        return relation
+
+    def _where(self) -> tuple[str, list]:
+        filters = list(self._filters)
+
+        # !inner embeds drop the rows without a matching embedded row
+        for _, table, inner, _ in self._parse_columns()[1]:
+            if not inner:
+                continue
+            local, foreign, _ = self._relation(table)
+            sub_where, sub_params = self._join(self._embedded_filters.get(table, []))
+            sub_sql = f"SELECT {foreign} FROM {table}" + (f" WHERE {sub_where}" if sub_where else "")
+            filters.append((f"{local} IN ({sub_sql})", sub_params))
+
+        if not filters:
+            return "", []
+        sql, params = self._join(filters)
+        return " WHERE " + sql, params
+
+    def _parse_columns(self) -> tuple[list[str], list[tuple[str, str, bool, str]]]:
+        """Splits the select string into plain columns and (alias, table, inner, columns) embeds."""
+        columns, embeds = [], []
+        for item in _split_top_level(self._columns):
+            if "(" not in item:
+                columns.append(item if item == "*" else _ident(item))
+                continue
+            name, inner_columns = item[:-1].split("(", 1)
+            alias, _, name = name.rpartition(":")
+            name, _, hint = name.partition("!")
+            embeds.append((_ident(alias or name), _ident(name), hint == "inner", inner_columns or "*"))
+        return columns, embeds
+
+    def _embed(self, conn, rows: list[dict], embeds, added: set[str]) -> None:
+        for alias, table, _, columns in embeds:
+            local, foreign, many = self._relation(table)
+            keys = list({row[local] for row in rows if row.get(local) is not None})
+
+            related = {}
+            if keys:
+                child = QueryBuilder(self._client, table).select(columns)
+                child._filters = [_condition(foreign, "in", keys)] + self._embedded_filters.get(table, [])
+                child._order = self._embedded_order.get(table, [])
+                child_columns = child._parse_columns()[0]
+                if "*" not in child_columns and foreign not in child_columns:
+                    child._columns += f", {foreign}"
+                for item in child._select(conn).data:
+                    key = item[foreign] if "*" in child_columns or foreign in child_columns else item.pop(foreign)
+                    if many:
+                        related.setdefault(key, []).append(item)
+                    else:
+                        related[key] = item
+
+            for row in rows:
+                row[alias] = related.get(row.get(local), [] if many else None)
+
+        for row in rows:
+            for column in added:
+                row.pop(column, None)
+
+    def _select(self, conn) -> APIResponse:
+        columns, embeds = self._parse_columns()
+
+        # the join columns of embedded resources are fetched even if not selected
+        added = set()
+        if columns and "*" not in columns:
+            for _, table, _, _ in embeds:
+                local = self._relation(table)[0]
+                if local not in columns:
+                    columns.append(local)
+                    added.add(local)
+        column_list = "*" if not columns or "*" in columns else ", ".join(columns)
+
+        where, params = self._where()
+        sql = f"SELECT {column_list} FROM {self._table}{where}"
+        if self._order:
+            sql += " ORDER BY " + ", ".join(self._order)
+        if self._limit is not None:
+            sql += f" LIMIT {self._limit}"
+            if self._offset is not None:
+                sql += f" OFFSET {self._offset}"
+
+        rows = [self._client.decode_row(self._table, r) for r in conn.execute(sql, params).fetchall()]
+        if embeds:
+            self._embed(conn, rows, embeds, added)
+
+        count = None
+        if self._count:
+            count = conn.execute(f"SELECT COUNT(*) FROM {self._table}{where}", params).fetchone()[0]
+        return APIResponse(rows, count)
+
+    def _insert(self, conn, upsert: bool) -> APIResponse:
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        defaults = DEFAULTS.get(self._table, {})
+
+        rows = []
+        for item in payload:
+            row = {k: v() for k, v in defaults.items() if item.get(k) is None}
+            row.update({k: v for k, v in item.items() if not (k in defaults and v is None)})
+            row = self._client.encode_row(self._table, row)
+
+            columns = [_ident(c) for c in row]
+            sql = (f"INSERT INTO {self._table} ({', '.join(columns)}) "
+                   f"VALUES ({', '.join('?' * len(columns))})")
+            if upsert:
+                conflict = _ident(self._on_conflict)
+                updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != conflict)
+                sql += f" ON CONFLICT({conflict}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+            sql += " RETURNING *"
+
+            rows.extend(conn.execute(sql, list(row.values())).fetchall())
+
+        return APIResponse([self._client.decode_row(self._table, r) for r in rows])
+
+    def _update(self, conn) -> APIResponse:
+        data = self._client.encode_row(self._table, dict(self._payload))
+        if not data:
+            return APIResponse([])
+        where, params = self._where()
+        assignments = ", ".join(f"{_ident(c)} = ?" for c in data)
+        sql = f"UPDATE {self._table} SET {assignments}{where} RETURNING *"
+        rows = conn.execute(sql, list(data.values()) + params).fetchall()
+        return APIResponse([self._client.decode_row(self._table, r) for r in rows])
+
+    def _delete(self, conn) -> APIResponse:
+        where, params = self._where()
+        rows = conn.execute(f"DELETE FROM {self._table}{where} RETURNING *", params).fetchall()
+        return APIResponse([self._client.decode_row(self._table, r) for r in rows])
+
+    def execute(self) -> APIResponse:
+        try:
+            with self._client.transaction() as conn:
+                if self._operation == "select":
+                    response = self._select(conn)
+                elif self._operation in ("insert", "upsert"):
+                    response = self._insert(conn, self._operation == "upsert")
+                elif self._operation == "update":
+                    response = self._update(conn)
+                else:
+                    response = self._delete(conn)
+        except sqlite3.Error as e:
+            raise APIError(str(e)) from e
+
+        if self._single or self._maybe_single:
+            if len(response.data) == 1:
+                response.data = response.data[0]
+            elif self._maybe_single and not response.data:
+                response.data = None
+            else:
+                raise APIError(f"Expected a single row, got {len(response.data)}")
+        return response
+
+
+class BucketClient:
+    def __init__(self, client: "SQLiteClient", bucket: str):
+        self._client = client
+        self._bucket = bucket
+
+    def upload(self, path: str, file, file_options: dict | None = None):
+        content = file.read() if hasattr(file, "read") else file
+        content_type = (file_options or {}).get("content-type")
+        upsert = str((file_options or {}).get("upsert", "false")).lower() == "true"
+        try:
+            with self._client.transaction() as conn:
+                conn.execute(
+                    f"INSERT {'OR REPLACE ' if upsert else ''}INTO storage_objects "
+                    "(bucket, path, content, content_type, size, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self._bucket, path, content, content_type, len(content), datetime.now().isoformat()),
+                )
+        except sqlite3.IntegrityError as e:
+            raise APIError(f"The resource already exists: {path}") from e
+        return {"path": path, "Key": f"{self._bucket}/{path}"}
+
+    def download(self, path: str) -> bytes:
+        row = self._client.fetchone(
+            "SELECT content FROM storage_objects WHERE bucket = ? AND path = ?", (self._bucket, path)
+        )
+        if row is None:
+            raise APIError(f"Object not found: {path}")
+        return row["content"]
+
+    def content_type(self, path: str) -> str | None:
+        row = self._client.fetchone(
+            "SELECT content_type FROM storage_objects WHERE bucket = ? AND path = ?", (self._bucket, path)
+        )
+        return row["content_type"] if row else None
+
+    def remove(self, paths: list[str]) -> list[dict]:
+        with self._client.transaction() as conn:
+            for path in paths:
+                conn.execute("DELETE FROM storage_objects WHERE bucket = ? AND path = ?", (self._bucket, path))
+        return [{"name": p} for p in paths]
+
+    def get_public_url(self, path: str) -> str:
+        return f"{PUBLIC_STORAGE_PREFIX}/{self._bucket}/{path}"
+
+    def list(self, path: str = "", options: dict | None = None) -> list[dict]:
+        """Objects directly inside the folder `path` whose name starts with options["search"], by name."""
+        options = options or {}
+        prefix = f"{path.rstrip('/')}/" if path else ""
+        search = options.get("search", "")
+        offset = options.get("offset", 0)
+        rows = self._client.fetchall(
+            "SELECT path, size, content_type, created_at FROM storage_objects "
+            "WHERE bucket = ? AND substr(path, 1, ?) = ? ORDER BY path",
+            (self._bucket, len(prefix), prefix),
+        )
+        entries = []
+        for row in rows:
+            name = row["path"][len(prefix):]
+            if "/" in name or not name.startswith(search):
+                continue
+            entries.append({
+                "name": name,
+                "created_at": row["created_at"],
+                "metadata": {"size": row["size"], "mimetype": row["content_type"]},
+            })
+        return entries[offset:offset + options.get("limit", 100)]
+
+    def create_signed_upload_url(self, path: str) -> dict:
+        token = secrets.token_urlsafe(24)
+        with self._client.transaction() as conn:
+            conn.execute(
+                "INSERT INTO storage_upload_tokens (token, bucket, path, expires_at) VALUES (?, ?, ?, ?)",
+                (token, self._bucket, path, (datetime.now() + SIGNED_UPLOAD_URL_TTL).isoformat()),
+            )
+        return {
+            "signed_url": f"{PUBLIC_STORAGE_PREFIX}/upload/{self._bucket}/{path}?token={token}",
+            "token": token,
+            "path": path,
+        }
+
+    def upload_to_signed_url(self, path: str, token: str, file, file_options: dict | None = None):
+        with self._client.transaction() as conn:
+            valid = conn.execute(
+                "DELETE FROM storage_upload_tokens WHERE token = ? AND bucket = ? AND path = ? AND expires_at > ? "
+                "RETURNING token",
+                (token, self._bucket, path, datetime.now().isoformat()),
+            ).fetchone()
+            conn.execute("DELETE FROM storage_upload_tokens WHERE expires_at <= ?", (datetime.now().isoformat(),))
+        if valid is None:
+            raise APIError("Invalid or expired upload token")
+        return self.upload(path, file, file_options)
+
+
+class StorageClient:
+    def __init__(self, client: "SQLiteClient"):
+        self._client = client
+
+    def from_(self, bucket: str) -> BucketClient:
+        return BucketClient(self._client, bucket)
+
+
+class RPCBuilder:
+    def __init__(self, client: "SQLiteClient", name: str, params: dict):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def execute(self) -> APIResponse:
+        from .sqlite_functions import FUNCTIONS
+
+        function = FUNCTIONS.get(self._name)
+        if function is None:
+            raise APIError(f"Could not find the function {self._name}")
+        try:
+            with self._client.transaction() as conn:
+                return APIResponse(function(conn, **self._params))
+        except sqlite3.Error as e:
+            raise APIError(str(e)) from e
+
+
+class SQLiteClient:
+    """Drop-in replacement for the parts of `supabase.Client` used by the app."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._depth = 0
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._add_missing_columns()
+        self._conn.executescript(INDEXES)
+        self._create_search_index()
+        self._create_ticket_counts()
+        self._conn.executescript(VERSIONS_SCHEMA)
+        self.storage = StorageClient(self)
+
+    def _add_missing_columns(self) -> None:
+        for table, column, column_type in ADDED_COLUMNS:
+            existing = {row["name"] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _create_search_index(self) -> None:
+        existing = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tickets_fts'").fetchone()
+        self._conn.executescript(SEARCH_SCHEMA)
+        if existing is None:
+            # database files created before the search index
+            self._conn.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+            self._conn.execute("INSERT INTO log_entries_fts (log_entries_fts) VALUES ('rebuild')")
+
+    def _create_ticket_counts(self) -> None:
+        existing = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'tickets_counts_insert'").fetchone()
+        self._conn.executescript(COUNTS_SCHEMA)
+        if existing is None:
+            # database files created before the counters
+            self._conn.executescript("""
+                DELETE FROM ticket_counts;
+                INSERT INTO ticket_counts (assignee, status, priority, count)
+                SELECT coalesce(assigned_to, ''), coalesce(status, 0), coalesce(priority, 0), count(*)
+                FROM tickets GROUP BY 1, 2, 3;
+            """)
+
+    def table(self, name: str) -> QueryBuilder:
+        return QueryBuilder(self, name)
+
+    def rpc(self, name: str, params: dict | None = None) -> RPCBuilder:
+        """Calls one of the Python equivalents of the Postgres functions in supabase/migrations."""
+        return RPCBuilder(self, name, params or {})
+
+    def transaction(self):
+        return _Transaction(self)
+
+    def fetchone(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def encode_row(table: str, row: dict) -> dict:
+        json_columns = JSON_COLUMNS.get(table, ())
+        return {k: (json.dumps(v) if k in json_columns and v is not None else v) for k, v in row.items()}
+
+    @staticmethod
+    def decode_row(table: str, row: sqlite3.Row) -> dict:
+        data = dict(row)
+        for column in JSON_COLUMNS.get(table, ()):
+            if isinstance(data.get(column), str):
+                data[column] = json.loads(data[column])
+        return data
+
+
+class _Transaction:
+    """
+    Serializes access to the shared connection and wraps it in BEGIN/COMMIT.
+    Nested transactions join the outermost one.
+    """
+
+    def __init__(self, client: SQLiteClient):
+        self._client = client
+
+    def __enter__(self) -> sqlite3.Connection:
+        self._client._lock.acquire()
+        if self._client._depth == 0:
+            self._client._conn.execute("BEGIN")
+        self._client._depth += 1
+        return self._client._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self._client._depth -= 1
+            if self._client._depth == 0:
+                self._client._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self._client._lock.release()
+        return False
@@ -0,0 +1,219 @@
+"""
+Python equivalents of the Postgres functions in supabase/migrations, called through
+SQLiteClient.rpc(). Each function runs inside one transaction on the shared connection.
+"""
+import json
+import re
+import sqlite3
+import unicodedata
+import uuid
+from datetime import datetime
+
+HEADLINE_WORDS = 20
+
+
+def _rows(cursor: sqlite3.Cursor) -> list[dict]:
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def acquire_blob(conn: sqlite3.Connection, p_hash: str, p_storage_path: str, p_size: int,
+                 p_mime_type: str | None, p_refs: int = 1) -> list[dict]:
+    return _rows(conn.execute(
+        "INSERT INTO storage_blobs (hash, storage_path, size, mime_type, ref_count, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(hash) DO UPDATE SET ref_count = ref_count + excluded.ref_count "
+        "RETURNING *",
+        (p_hash, p_storage_path, p_size, p_mime_type, p_refs, datetime.now().isoformat()),
+    ))
+
+
+def release_blob(conn: sqlite3.Connection, p_storage_path: str, p_refs: int = 1) -> list[dict]:
+    rows = _rows(conn.execute(
+        "UPDATE storage_blobs SET ref_count = ref_count - ? WHERE storage_path = ? RETURNING *",
+        (p_refs, p_storage_path),
+    ))
+    conn.execute("DELETE FROM storage_blobs WHERE storage_path = ? AND ref_count <= 0", (p_storage_path,))
+    return rows
+
+
+def _match_query(terms: list[str]) -> str:
+    # every term is matched as a prefix, all terms have to match (search_query in Postgres)
+    return " AND ".join('"' + t.lower().replace('"', '""') + '"*' for t in terms)
+
+
+def _fold(text: str) -> str:
+    # same folding as the unicode61 tokenizer with remove_diacritics
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def _headline(document: str, terms: list[str]) -> str:
+    """Marks the matched words with ** and cuts the text around the first match, like ts_headline."""
+    words = (document or "").split()
+    prefixes = tuple(_fold(t) for t in terms)
+    matched = [i for i, w in enumerate(words) if _fold(re.sub(r"\W", "", w)).startswith(prefixes)]
+    start = max(0, matched[0] - HEADLINE_WORDS // 2) if matched else 0
+    window = words[start:start + HEADLINE_WORDS]
+    return " ".join(f"**{w}**" if start + i in matched else w for i, w in enumerate(window))
+
+
+def search_tickets(conn: sqlite3.Connection, p_terms: list[str], p_user_id: str | None = None,
+                   p_limit: int = 20, p_offset: int = 0) -> list[dict]:
+    query = _match_query(p_terms)
+    rows = _rows(conn.execute(
+        "SELECT 'ticket' AS kind, t.id AS ticket_id, NULL AS log_entry_id, t.name AS ticket_name, "
+        "       coalesce(t.name, '') || ' ' || coalesce(t.description, '') AS document, "
+        "       -bm25(tickets_fts) AS rank, t.created_at "
+        "FROM tickets_fts JOIN tickets t ON t.rowid = tickets_fts.rowid "
+        "WHERE tickets_fts MATCH ? AND (? IS NULL OR t.assigned_to = ?) "
+        "UNION ALL "
+        "SELECT 'log', l.ticket_id, l.id, t.name, l.message, -bm25(log_entries_fts), l.created_at "
+        "FROM log_entries_fts "
+        "JOIN ticket_log_entries l ON l.rowid = log_entries_fts.rowid "
+        "JOIN tickets t ON t.id = l.ticket_id "
+        "WHERE log_entries_fts MATCH ? AND (? IS NULL OR t.assigned_to = ?) "
+        "ORDER BY rank DESC, created_at DESC, ticket_id, log_entry_id "
+        "LIMIT ? OFFSET ?",
+        (query, p_user_id, p_user_id, query, p_user_id, p_user_id, p_limit, p_offset),
+    ))
+    for row in rows:
+        row["headline"] = _headline(row.pop("document"), p_terms)
+    return rows
+
+
+def search_log_entries(conn: sqlite3.Connection, p_terms: list[str], p_changed_field: str | None = None,
+                       p_limit: int = 200, p_offset: int = 0) -> list[dict]:
+    query = _match_query(p_terms)
+    return _rows(conn.execute(
+        "SELECT id, MAX(rank) AS rank FROM ("
+        "    SELECT l.id, h.rank, l.created_at, l.changed_fields "
+        "    FROM (SELECT t.id AS ticket_id, -bm25(tickets_fts) AS rank "
+        "          FROM tickets_fts JOIN tickets t ON t.rowid = tickets_fts.rowid "
+        "          WHERE tickets_fts MATCH ?) h "
+        "    JOIN ticket_log_entries l ON l.ticket_id = h.ticket_id "
+        "    UNION ALL "
+        "    SELECT l.id, -bm25(log_entries_fts), l.created_at, l.changed_fields "
+        "    FROM log_entries_fts JOIN ticket_log_entries l ON l.rowid = log_entries_fts.rowid "
+        "    WHERE log_entries_fts MATCH ?"
+        ") "
+        "WHERE ? IS NULL OR EXISTS (SELECT 1 FROM json_each(changed_fields) WHERE value = ?) "
+        "GROUP BY id "
+        "ORDER BY rank DESC, created_at DESC, id "
+        "LIMIT ? OFFSET ?",
+        (query, query, p_changed_field, p_changed_field, p_limit, p_offset),
+    ))
+
+
+TICKET_UPDATE_FIELDS = ("name", "description", "status", "priority", "assigned_to")
+
+
+def update_ticket_with_log(conn: sqlite3.Connection, p_ticket_id: str, p_actor_user_id: str, p_updates: dict,
+                           p_note: str = "", p_expected_version: int | None = None,
+                           p_now: str | None = None) -> dict:
+    """
+    Applies p_updates to the ticket and writes the log entry of the change in one transaction.
+    The change set is computed from the row as it is now, p_expected_version (if given) has to be
+    its current version, otherwise nothing is written and conflict is returned with the current row.
+    """
+    row = conn.execute("SELECT * FROM tickets WHERE id = ?", (p_ticket_id,)).fetchone()
+    if row is None:
+        return {"conflict": False, "ticket": None, "log": None}
+    old = dict(row)
+    if p_expected_version is not None and old["version"] != p_expected_version:
+        return {"conflict": True, "ticket": old, "log": None}
+
+    new = {field: p_updates.get(field, old[field]) for field in TICKET_UPDATE_FIELDS}
+    changes = [
+        {"field": field, "from": old[column], "to": new[column]}
+        for field, column in (("status", "status"), ("priority", "priority"), ("assignee", "assigned_to"))
+        if (old[column] or None) != (new[column] or None)
+    ]
+    # same layout as _build_log_payload in app/db.py (LOG_PAYLOAD_VERSION 1)
+    payload = {
+        "version": 1,
+        "note": p_note or "",
+        "old_priority": old["priority"], "new_priority": new["priority"],
+        "old_assignee": old["assigned_to"], "new_assignee": new["assigned_to"],
+        "old_name": old["name"], "new_name": new["name"],
+        "old_description": old["description"], "new_description": new["description"],
+        "changes": changes,
+    }
+    now = p_now or datetime.now().isoformat()
+
+    log = dict(conn.execute(
+        "INSERT INTO ticket_log_entries (id, ticket_id, actor_user_id, action_type, message, old_status, "
+        "new_status, payload, changed_fields, created_at) VALUES (?, ?, ?, 'update', ?, ?, ?, ?, ?, ?) RETURNING *",
+        (str(uuid.uuid4()), p_ticket_id, p_actor_user_id, p_note or "", old["status"], new["status"],
+         json.dumps(payload), json.dumps([c["field"] for c in changes]), now),
+    ).fetchone())
+    log["payload"] = payload
+    log["changed_fields"] = [c["field"] for c in changes]
+
+    conn.execute(
+        "UPDATE tickets SET name = ?, description = ?, status = ?, priority = ?, assigned_to = ?, updated_at = ? "
+        "WHERE id = ?",
+        (*(new[field] for field in TICKET_UPDATE_FIELDS), now, p_ticket_id),
+    )
+    if old["assigned_to"] and old["assigned_to"] != new["assigned_to"]:
+        # lets the old assignee's delta feed report the ticket as removed
+        conn.execute("INSERT INTO ticket_tombstones (id, ticket_id, user_id, created_at) VALUES (?, ?, ?, ?)",
+                     (str(uuid.uuid4()), p_ticket_id, old["assigned_to"], now))
+
+    # read back, the version is bumped by the tickets_row_version trigger
+    ticket = dict(conn.execute("SELECT * FROM tickets WHERE id = ?", (p_ticket_id,)).fetchone())
+    return {"conflict": False, "ticket": ticket, "log": log}
+
+
+def bulk_update_tickets_with_log(conn: sqlite3.Connection, p_actor_user_id: str, p_items: list[dict],
+                                 p_note: str = "", p_now: str | None = None) -> list[dict]:
+    """
+    Creates (items without "id") and updates (items with "id", optionally "version") many tickets in one
+    transaction. Updates go through update_ticket_with_log, creates are logged with their values.
+    Returns one {conflict, ticket, log} per item, ticket is None for a ticket that doesn't exist.
+    """
+    now = p_now or datetime.now().isoformat()
+    results = []
+    for item in p_items:
+        if "id" in item:
+            updates = {k: v for k, v in item.items() if k not in ("id", "version")}
+            results.append(update_ticket_with_log(conn, item["id"], p_actor_user_id, updates, p_note,
+                                                  item.get("version"), now))
+            continue
+
+        ticket = dict(conn.execute(
+            "INSERT INTO tickets (id, name, description, priority, status, created_by, assigned_to, created_at, "
+            "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING *",
+            (str(uuid.uuid4()), item.get("name"), item.get("description") or "", item.get("priority") or 1,
+             item.get("status") or 1, p_actor_user_id, item.get("assigned_to") or None, now, now),
+        ).fetchone())
+        # same layout as _build_log_payload in app/db.py (LOG_PAYLOAD_VERSION 1)
+        payload = {
+            "version": 1,
+            "note": p_note or "",
+            "old_priority": ticket["priority"], "new_priority": ticket["priority"],
+            "old_assignee": ticket["assigned_to"], "new_assignee": ticket["assigned_to"],
+            "old_name": ticket["name"], "new_name": ticket["name"],
+            "old_description": ticket["description"], "new_description": ticket["description"],
+            "changes": [],
+        }
+        log = dict(conn.execute(
+            "INSERT INTO ticket_log_entries (id, ticket_id, actor_user_id, action_type, message, old_status, "
+            "new_status, payload, changed_fields, created_at) VALUES (?, ?, ?, 'create', ?, ?, ?, ?, '[]', ?) "
+            "RETURNING *",
+            (str(uuid.uuid4()), ticket["id"], p_actor_user_id, p_note or "", ticket["status"], ticket["status"],
+             json.dumps(payload), now),
+        ).fetchone())
+        log["payload"] = payload
+        log["changed_fields"] = []
+        results.append({"conflict": False, "ticket": ticket, "log": log})
+    return results
+
+
+FUNCTIONS = {
+    "bulk_update_tickets_with_log": bulk_update_tickets_with_log,
+    "acquire_blob": acquire_blob,
+    "release_blob": release_blob,
+    "search_tickets": search_tickets,
+    "search_log_entries": search_log_entries,
+    "update_ticket_with_log": update_ticket_with_log,
+}
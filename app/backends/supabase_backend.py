@@ -0,0 +1,25 @@
+import httpx
+from supabase import create_client, Client, ClientOptions
+
+
+def create_supabase_client(url: str, key: str, pool_size: int = 20, keepalive: float = 30,
+                           timeout: float = 10) -> Client:
+    """
+    Creates the client with one pooled keep-alive HTTP client shared by all threads of the worker,
+    instead of opening a new connection per request.
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive,
+        ),
+        timeout=timeout,
+    )
+    try:
+        options = ClientOptions(httpx_client=http_client)
+    except TypeError:
+        # supabase < 2.13 has no httpx_client option and keeps its own (unpooled) sessions
+        http_client.close()
+        return create_client(url, key)
+    return create_client(url, key, options=options)
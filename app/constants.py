@@ -11,11 +11,28 @@ PROFILE_URL = "/profile"
 API_PREFIX = "/api"
 API_TICKETS = API_PREFIX + "/tickets"
 API_USERS = API_PREFIX + "/users"
-API_PHOTOS = API_PREFIX + "/photos/<ticket_id>"
+API_PHOTOS_BATCH = API_PREFIX + "/photos"
+API_PHOTOS = API_PHOTOS_BATCH + "/<ticket_id>"
+API_PHOTO = API_PHOTOS + "/<photo_id>"
 API_PROFILE = API_PREFIX + "/profile"
+API_SEARCH = API_PREFIX + "/search"
+API_AUTH_REFRESH = API_PREFIX + "/auth/refresh"
+API_AUTH_LOGOUT = API_PREFIX + "/auth/logout"
+API_UPLOADS = API_PREFIX + "/uploads"
+API_UPLOADS_FINALIZE = API_UPLOADS + "/finalize"
+
+# prometheus metrics
+METRICS_URL = "/metrics"
+
+# files uploaded to the local storage backend
+LOCAL_STORAGE_URL = "/storage/<bucket>/<path:file_path>"
+LOCAL_STORAGE_UPLOAD_URL = "/storage/upload/<bucket>/<path:file_path>"
 
 
 # DEBUG PATHS
 DEBUG_URL = "/debug"
 DEBUG_DUMP_USERS_URL = "/dumpUsers"
-DEBUG_DUMP_TICKETS_URL = "/dumpTickets"
\ No newline at end of file
+DEBUG_DUMP_TICKETS_URL = "/dumpTickets"
+DEBUG_TOKEN_REVOCATIONS_URL = "/tokenRevocations"
+DEBUG_PHOTO_CACHE_URL = "/photoCache"
+DEBUG_TABLE_VERSIONS_URL = "/tableVersions"
\ No newline at end of file
@@ -1,153 +1,617 @@
 from datetime import datetime
 
-from .models import UserRoles
-from .supabase_client import supabase
+from . import events, metrics, passwords, thumbnails, tokens
+from .cache import TTLCache
+from .models import TicketPriority, TicketStatus, UserRoles
+from .backends import get_client
+from config import Config
 
 from flask import jsonify
-import os, json
+import base64, hashlib, io, os, json, logging, re, threading, uuid
+from concurrent.futures import ThreadPoolExecutor
 
-# TOKEN VALIDATION / LOGIN / REGISTRATION
-# return enum for which page token is valid
-def validate_token(token: str) -> tuple[UserRoles, str] | None:
-    if token is None:
-        return None
-
-    response = supabase.table("users").select("*").eq("token", token).execute()
-    if len(response.data) == 1:
-        role_id = response.data[0].get("role")
-        return UserRoles.get_role_by_id(role_id), response.data[0].get("id")
+# child of the app logger ("app"), goes to the same handlers as the slow request log
+logger = logging.getLogger(__name__)
 
-    return None
-
-def verify_user(email: str, password: str) -> tuple[str, UserRoles] | None:
+# LOGIN / REGISTRATION / SESSIONS
+# access tokens are signed and checked locally (app/tokens.py), the opaque users.token
+# column is the refresh token and only read on login / refresh
+@metrics.db_function
+def verify_user(email: str, password: str) -> tuple[str, str, UserRoles] | None:
     """
     Check if a user exists and password matches.
-    Returns token and role if valid, None otherwise.
+    Returns user id, refresh token and role if valid, None otherwise.
     """
-    response = supabase.table("users").select("*").eq("email", email).eq("password", password).execute()
+    response = get_client().table("users").select("id, password, token, role").eq("email", email).execute()
+    found_user = response.data[0] if len(response.data) == 1 else None
+
+    # unknown emails are checked against a dummy hash, so they take as long as wrong passwords
+    stored = found_user.get("password") if found_user else passwords.dummy_hash()
+    if not passwords.verify_password(password, stored) or found_user is None:
+        return None
 
-    if len(response.data) == 1:
-        found_user = response.data[0]
-        return found_user.get("token"), UserRoles.get_role_by_id(found_user.get("role"))
+    if passwords.needs_rehash(stored):
+        # plaintext or older work factor
+        get_client().table("users").update(
+            {"password": passwords.hash_password(password)}
+        ).eq("id", found_user.get("id")).execute()
 
-    return None
+    return found_user.get("id"), found_user.get("token"), UserRoles.get_role_by_id(found_user.get("role"))
 
+@metrics.db_function
+def refresh_session(refresh_token: str) -> tuple[str, str, UserRoles] | None:
+    """
+    Exchanges a refresh token for a new one (rotation), the old one stops working.
+    Returns user id, new refresh token and the current role, None for unknown tokens.
+    """
+    if not refresh_token:
+        return None
+    rotated = uuid.uuid4().hex
+    # conditional on the old token, of two concurrent refreshes only one succeeds
+    response = get_client().table("users").update({"token": rotated}).eq("token", refresh_token).execute()
+    if len(response.data) != 1:
+        return None
+    user = response.data[0]
+    return user.get("id"), rotated, UserRoles.get_role_by_id(user.get("role"))
+
+@metrics.db_function
+def revoke_refresh_token(user_id: str) -> None:
+    get_client().table("users").update({"token": uuid.uuid4().hex}).eq("id", user_id).execute()
+
+@metrics.db_function
+def revoke_access_token(jti: str, expires_at: datetime) -> None:
+    now = datetime.now().isoformat()
+    client = get_client()
+    client.table("revoked_tokens").upsert({
+        "jti": jti,
+        "expires_at": expires_at.isoformat(),
+        "created_at": now,
+    }, on_conflict="jti").execute()
+    # expired tokens are rejected anyway
+    client.table("revoked_tokens").delete().lt("expires_at", now).execute()
+
+@metrics.db_function
+def get_revoked_tokens() -> list[str]:
+    """jti of the revoked access tokens that haven't expired yet."""
+    return [r["jti"] for r in (get_client().table("revoked_tokens")
+                               .select("jti")
+                               .gt("expires_at", datetime.now().isoformat())
+                               .execute()).data]
+
+@metrics.db_function
 def register_user(username:str, email: str, password: str) -> str:
     try:
-        response = supabase.table('users').insert({
+        response = get_client().table('users').insert({
             "name": username,
             "email": email,
-            "password": password
+            "password": passwords.hash_password(password)
         }).execute()
         return response.data[0].get("token")
     except Exception as e:
         return e.message
 
 # TICKET MANAGEMENT
+@metrics.db_function
 def create_ticket(name: str, description: str, priority: int, created_by: str) -> bool:
-    response = supabase.table('tickets').insert({
+    now = datetime.now().isoformat()
+    response = get_client().table('tickets').insert({
         "name": name,
         "description": description,
         "priority": priority,
         "status": 1,  # Default to OPEN
         "created_by": created_by,
-        "created_at": datetime.now().isoformat()
+        "created_at": now,
+        "updated_at": now
     }).execute()
+    events.publish("ticket_created", response.data[0].get("id"), response.data[0].get("assigned_to"))
     return response.data[0]
 
+@metrics.db_function
 def get_tickets(user_id: str | None) -> list[dict]:
     if user_id is None:
-        return supabase.table('tickets').select('*').order('created_at').execute().data
+        return get_client().table('tickets').select('*').order('created_at').execute().data
     else:
-        return supabase.table('tickets').select('*').eq('assigned_to', user_id).order('created_at').execute().data
+        return get_client().table('tickets').select('*').eq('assigned_to', user_id).order('created_at').execute().data
+
+# columns rendered by the dashboards
+TICKET_LIST_COLUMNS = "id, name, description, status, priority, assigned_to, created_at, updated_at, version"
+
+def _encode_cursor(*values: str) -> str:
+    return base64.urlsafe_b64encode("|".join(values).encode()).decode()
 
-def update_ticket(ticket: dict) -> bool:
+def _decode_cursor(cursor: str, parts: int = 2) -> list[str]:
     try:
-        supabase.table('tickets').update(ticket).eq('id', ticket.get('id')).execute()
-        return True
+        values = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
     except Exception:
+        raise ValueError("Invalid cursor")
+    if len(values) != parts:
+        raise ValueError("Invalid cursor")
+    return values
+
+def _search_pattern(search: str) -> str:
+    # characters with a meaning in PostgREST filter strings are dropped
+    return "*" + "".join(ch for ch in search if ch not in ',()"\\*%') + "*"
+
+# at most this many words of a search are matched
+MAX_SEARCH_TERMS = 8
+
+def _search_terms(search: str) -> list[str]:
+    return re.findall(r"\w+", search.lower())[:MAX_SEARCH_TERMS]
+
+def _decode_offset(cursor: str | None) -> int:
+    # ranked results are paged by position, there is no stable sort key
+    if not cursor:
+        return 0
+    offset = _decode_cursor(cursor, parts=1)[0]
+    if not offset.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(offset)
+
+@metrics.db_function
+def search_tickets(
+    search: str,
+    user_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = 20,
+) -> tuple[list[dict], str | None]:
+    """
+    Full-text search over ticket names, descriptions and log notes, best match first.
+    Every hit is a ticket (kind "ticket") or a log entry (kind "log") with a headline
+    marking the matched words with **. user_id restricts the hits to the tickets
+    assigned to that user (technician view).
+    """
+    terms = _search_terms(search)
+    if not terms:
+        return [], None
+    offset = _decode_offset(cursor)
+
+    hits = get_client().rpc("search_tickets", {
+        "p_terms": terms,
+        "p_user_id": user_id,
+        "p_limit": limit + 1,
+        "p_offset": offset,
+    }).execute().data or []
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = _encode_cursor(str(offset + limit))
+    return hits, next_cursor
+
+@metrics.db_function
+def get_tickets_page(
+    user_id: str | None,
+    status: int | None = None,
+    priority: int | None = None,
+    assigned_to: str | None = None,
+    search: str | None = None,
+    cursor: str | None = None,
+    limit: int = 50,
+) -> tuple[list[dict], str | None]:
+    """
+    Returns one page of tickets ordered by (created_at, id) and the cursor of the next page.
+    user_id restricts the result to the tickets assigned to that user (technician view),
+    assigned_to="unassigned" selects tickets without an assignee.
+    """
+    query = get_client().table('tickets').select(TICKET_LIST_COLUMNS)
+
+    if user_id is not None:
+        query = query.eq('assigned_to', user_id)
+    elif assigned_to == "unassigned":
+        query = query.is_('assigned_to', 'null')
+    elif assigned_to:
+        query = query.eq('assigned_to', assigned_to)
+
+    if status is not None:
+        query = query.eq('status', status)
+    if priority is not None:
+        query = query.eq('priority', priority)
+    if search:
+        pattern = _search_pattern(search)
+        query = query.or_(f'name.ilike."{pattern}",description.ilike."{pattern}"')
+
+    if cursor:
+        created_at, ticket_id = _decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt."{ticket_id}")'
+        )
+
+    # fetch one extra row to know whether there is a next page
+    rows = query.order('created_at').order('id').limit(limit + 1).execute().data
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]['created_at'], str(rows[-1]['id']))
+    return rows, next_cursor
+
+@metrics.db_function
+def update_ticket(ticket: dict, actor_user_id: str, expected_version: int | None = None) -> dict:
+    """
+    Quick edit of the dashboard (PUT /api/tickets/update), updated and logged in one transaction like
+    save_update. Only BULK_UPDATE_FIELDS can be changed (ValueError otherwise), expected_version makes it
+    fail with TicketVersionConflict if the ticket changed since. Returns the updated ticket.
+    """
+    result = _update_ticket_with_log(ticket["id"], actor_user_id, ticket, "", expected_version)
+    payload = result["log"]["payload"]
+    events.publish("ticket_updated", ticket["id"], payload["new_assignee"], payload["old_assignee"])
+    return result["ticket"]
+
+BULK_UPDATE_FIELDS = ("name", "description", "priority", "status", "assigned_to")
+
+def _is_uuid(value) -> bool:
+    try:
+        uuid.UUID(value)
+    except (TypeError, ValueError, AttributeError):
         return False
+    return True
+
+def _bulk_item_error(item) -> str | None:
+    if not isinstance(item, dict):
+        return "item must be an object"
+    unknown = set(item) - set(BULK_UPDATE_FIELDS) - {"id", "version"}
+    if unknown:
+        return f"unknown fields: {', '.join(sorted(unknown))}"
+    if "id" in item and not _is_uuid(item["id"]):
+        return "invalid id"
+    if "version" in item and ("id" not in item or type(item["version"]) is not int):
+        return "invalid version"
+    if "status" in item and item["status"] not in [s.value for s in TicketStatus]:
+        return "invalid status"
+    if "priority" in item and item["priority"] not in [p.value for p in TicketPriority]:
+        return "invalid priority"
+    if any(item.get(k) is not None and not isinstance(item[k], str) for k in ("name", "description")):
+        return "invalid name or description"
+    if item.get("assigned_to") not in (None, "") and not _is_uuid(item["assigned_to"]):
+        return "invalid assignee"
+    if "id" not in item and not item.get("name"):
+        return "name missing"
+    return None
+
+@metrics.db_function
+def bulk_update_tickets(items: list[dict], actor_user_id: str, note: str = "") -> list[dict]:
+    """
+    Creates (items without "id") and updates (items with "id") many tickets in one call and one
+    transaction (bulk_update_tickets_with_log function). Updates are applied to the locked row, logged
+    like save_update and, with a "version", fail their item if the ticket changed since.
+    Returns one result per item (success, id / error), in the order of the items.
+    """
+    results = [{"success": False, "error": _bulk_item_error(item)} for item in items]
+    valid = [item for item, result in zip(items, results) if result["error"] is None]
+    if not valid:
+        return [_bulk_result(r) for r in results]
+
+    try:
+        written = get_client().rpc("bulk_update_tickets_with_log", {
+            "p_actor_user_id": actor_user_id,
+            "p_items": valid,
+            "p_note": note or "",
+            "p_now": datetime.now().isoformat(),
+        }).execute().data
+    except Exception as e:
+        # nothing was written
+        for result in results:
+            if result["error"] is None:
+                result["error"] = str(e)
+        return [_bulk_result(r) for r in results]
+
+    outcomes = iter(written)
+    for item, result in zip(items, results):
+        if result["error"] is not None:
+            continue
+        outcome = next(outcomes)
+        if outcome["ticket"] is None:
+            result["error"] = "Ticket not found"
+        elif outcome["conflict"]:
+            result.update({"error": "Ticket was changed in the meantime", "ticket": outcome["ticket"]})
+        else:
+            ticket, payload = outcome["ticket"], outcome["log"]["payload"]
+            result.update({"success": True, "id": ticket["id"], "error": None})
+            if "id" in item:
+                events.publish("ticket_updated", ticket["id"], payload["new_assignee"], payload["old_assignee"])
+            else:
+                events.publish("ticket_created", ticket["id"], ticket["assigned_to"])
+
+    return [_bulk_result(r) for r in results]
+
+def _bulk_result(result: dict) -> dict:
+    if result["error"] is None:
+        result.pop("error")
+    return result
+
+def _changed_tickets(user_id: str | None, since: str) -> list[dict]:
+    query = get_client().table('tickets').select(TICKET_LIST_COLUMNS).gt('updated_at', since)
+    if user_id is not None:
+        query = query.eq('assigned_to', user_id)
+    return query.order('updated_at').execute().data
+
+def _tombstoned_ticket_ids(user_id: str | None, since: str) -> set[str]:
+    if user_id is None:
+        return set()
+    tombstones = (get_client().table('ticket_tombstones')
+                  .select('ticket_id')
+                  .eq('user_id', user_id)
+                  .gt('created_at', since)
+                  .execute()).data
+    return {t['ticket_id'] for t in tombstones}
 
+def _removed_ticket_ids(tickets: list[dict], tombstoned: set[str]) -> list[str]:
+    # a ticket that was assigned back meanwhile is reported as changed, not removed
+    return list(tombstoned - {t['id'] for t in tickets})
 
-def upload_attachment(ticket_id, file):
-    file_extension = os.path.splitext(file.filename)[1]
-    file_path = f"{ticket_id}/{os.urandom(4).hex()}{file_extension}"
 
+def _status_counts() -> dict[str, int]:
+    return {status.name.lower(): 0 for status in TicketStatus}
+
+def _workload_entry() -> dict:
+    return {"counts": _status_counts(), "by_priority": {p.name.lower(): _status_counts() for p in TicketPriority}}
+
+@metrics.db_function
+def get_workload() -> dict:
+    """
+    Ticket counts per technician, per priority and in total, split by status.
+    Read from the ticket_counts table maintained by triggers on tickets, so the cost
+    depends on the number of technicians, not on the number of tickets.
+    """
+    counts = get_client().table('ticket_counts').select('assignee, status, priority, count').gt('count', 0).execute().data
+    technicians = {t['id']: {"id": t['id'], "name": t['name'], **_workload_entry()}
+                   for t in get_users_by_role(UserRoles.TECHNICIAN)}
+    unassigned = _workload_entry()
+    priorities = {p.name.lower(): _status_counts() for p in TicketPriority}
+    totals = _status_counts()
+
+    for row in counts:
+        try:
+            status = TicketStatus(row['status']).name.lower()
+            priority = TicketPriority(row['priority']).name.lower()
+        except ValueError:
+            continue
+        entry = technicians.get(row['assignee']) if row['assignee'] else unassigned
+        if entry is not None:
+            entry["counts"][status] += row['count']
+            entry["by_priority"][priority][status] += row['count']
+        priorities[priority][status] += row['count']
+        totals[status] += row['count']
+
+    return {
+        "technicians": list(technicians.values()),
+        "unassigned": unassigned,
+        "priorities": priorities,
+        "totals": totals,
+    }
+
+
+@metrics.db_function
+def upload_attachment(ticket_id, file, uploaded_by: str | None = None):
     try:
-        file.seek(0)
-        file_content = file.read()
-        supabase.storage.from_('photo_bucket').upload(
-            file_path,
-            file_content,
-            {"content-type": file.content_type}
-        )
+        blob = _store_blob(file, refs=1)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        file_url = supabase.storage.from_('photo_bucket').get_public_url(file_path)
+    file_path = blob["storage_path"]
+    bucket = get_client().storage.from_('photo_bucket')
+    file_url = bucket.get_public_url(file_path)
 
-        supabase.table('ticket_photos').insert({
+    try:
+        get_client().table('ticket_photos').insert({
             "ticket_id": ticket_id,
             "url": file_url,
-            "file_path": file_path
+            "file_path": file_path,
+            "uploaded_by": uploaded_by,
+            "thumbnail_url": bucket.get_public_url(blob["thumbnail_path"]) if blob.get("thumbnail_path") else None,
+            "medium_url": bucket.get_public_url(blob["medium_path"]) if blob.get("medium_path") else None,
         }).execute()
-
-        return jsonify({"url": file_url}), 200
-
     except Exception as e:
+        release_blob(file_path, refs=1)
         return jsonify({"error": str(e)}), 500
+    _invalidate_pictures(ticket_id)
+
+    if blob["new"]:
+        _schedule_renditions(file_path, file.content_type)
+
+    return jsonify({"url": file_url}), 200
+
 
+# ticket id -> photos (newest first), every write to ticket_photos invalidates the tickets it touched.
+# The cache is per worker, other workers see a change after PHOTO_CACHE_TTL at the latest.
+_photo_cache = TTLCache(maxsize=Config.PHOTO_CACHE_SIZE, ttl=Config.PHOTO_CACHE_TTL)
+# counts invalidations, a read that overlapped one doesn't cache what it read. The lock makes the
+# increment and the compare-and-store of a read atomic against each other.
+_photo_invalidations = 0
+_photo_invalidations_lock = threading.Lock()
 
+PHOTO_COLUMNS = "id, ticket_id, url, thumbnail_url, medium_url, file_path, uploaded_by, created_at"
+
+@metrics.db_function
 def get_pictures(ticket_id):
-    response = (
-        supabase
+    return get_pictures_batch([ticket_id])[ticket_id]
+
+@metrics.db_function
+def get_pictures_batch(ticket_ids: list[str]) -> dict[str, list[dict]]:
+    """Photos of many tickets, the ones not cached are read with one query."""
+    pictures = {}
+    missing = []
+    for ticket_id in dict.fromkeys(ticket_ids):
+        cached = _photo_cache.get(ticket_id)
+        if cached is None:
+            missing.append(ticket_id)
+        else:
+            pictures[ticket_id] = cached
+    if not missing:
+        return pictures
+
+    invalidations = _photo_invalidations
+    for ticket_id in missing:
+        pictures[ticket_id] = []
+    rows = (
+        get_client()
         .table("ticket_photos")
-        .select("id, url, file_path, created_at")
-        .eq("ticket_id", ticket_id)
+        .select(PHOTO_COLUMNS)
+        .in_("ticket_id", missing)
         .order("created_at", desc=True)
         .execute()
-    )
+    ).data
+    for row in rows:
+        pictures[row["ticket_id"]].append(row)
+    with _photo_invalidations_lock:
+        if invalidations == _photo_invalidations:
+            for ticket_id in missing:
+                _photo_cache.set(ticket_id, pictures[ticket_id])
+    return pictures
+
+def _invalidate_pictures(*ticket_ids: str) -> None:
+    global _photo_invalidations
+    with _photo_invalidations_lock:
+        _photo_invalidations += 1
+        for ticket_id in ticket_ids:
+            _photo_cache.invalidate(ticket_id)
+
+def photo_cache_stats() -> dict:
+    return _photo_cache.stats()
+
+
+@metrics.db_function
+def delete_picture(ticket_id: str, photo_id: str, uploaded_by: str | None = None) -> bool:
+    """
+    Deletes a photo, only if it was uploaded by `uploaded_by` when that is given
+    (PermissionError if the photo exists but is someone else's).
+    """
+    query = (get_client().table("ticket_photos")
+             .delete()
+             .eq("id", photo_id)
+             .eq("ticket_id", ticket_id))
+    if uploaded_by is not None:
+        query = query.eq("uploaded_by", uploaded_by)
+    rows = query.execute().data
+    if not rows:
+        if uploaded_by is not None and (get_client().table("ticket_photos").select("id")
+                                        .eq("id", photo_id).eq("ticket_id", ticket_id).execute()).data:
+            raise PermissionError("Photo was uploaded by someone else")
+        return False
+    _invalidate_pictures(ticket_id)
+    release_blob(rows[0]["file_path"], refs=1)
+    return True
 
-    return response.data
+
+@metrics.db_function
+def get_storage_object(bucket: str, file_path: str) -> tuple[bytes, str | None] | None:
+    bucket_client = get_client().storage.from_(bucket)
+    try:
+        content = bucket_client.download(file_path)
+    except Exception:
+        return None
+    content_type = bucket_client.content_type(file_path) if hasattr(bucket_client, "content_type") else None
+    return content, content_type
 
 
 # USER MANAGEMENT
+@metrics.db_function
 def get_users() -> list[dict]:
-    return supabase.table('users').select('id, email, name, role').execute().data
+    return get_client().table('users').select('id, email, name, role').execute().data
 
+@metrics.db_function
 def get_users_by_role(role: UserRoles):
-    return supabase.table('users').select('id, email, name, role').eq('role', role.value).execute().data
+    return get_client().table('users').select('id, email, name, role').eq('role', role.value).execute().data
 
-def get_user_info(token: str):
+@metrics.db_function
+def get_user_info(user_id: str):
     try:
-        res = (supabase.table("users").select("email, name").eq("token", token).single().execute())
+        res = (get_client().table("users").select("email, name").eq("id", user_id).single().execute())
         return res.data
     except Exception as e:
         print("get_user_info failed:", e)
         return None
 
 
-def update_user(token: str, email: str, name: str, password: str) -> bool:
+@metrics.db_function
+def update_user(user_id: str, email: str, name: str, password: str) -> bool:
     try:
         if password is None:
-            supabase.table('users').update({"name": name, "email": email}).eq("token",token).execute()
+            get_client().table('users').update({"name": name, "email": email}).eq("id", user_id).execute()
         else:
-            supabase.table('users').update({"name": name, "email": email, "password": password}).eq("token", token).execute()
+            get_client().table('users').update(
+                {"name": name, "email": email, "password": passwords.hash_password(password)}
+            ).eq("id", user_id).execute()
         return True
     except Exception:
         return False
 
 
+@metrics.db_function
+def hash_plaintext_passwords(batch_size: int = 100) -> int:
+    """Replaces the plaintext passwords left from before hashing was introduced, returns the number of users."""
+    hashed = 0
+    last_id = None
+    while True:
+        query = get_client().table("users").select("id, password").order("id").limit(batch_size)
+        # users.id is a uuid in Postgres, the first page has no lower bound
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        users = query.execute().data
+        if not users:
+            return hashed
+        for user in users:
+            if user.get("password") and not user["password"].startswith(passwords.PREFIX + "$"):
+                get_client().table("users").update(
+                    {"password": passwords.hash_password(user["password"])}
+                ).eq("id", user["id"]).execute()
+                hashed += 1
+        last_id = users[-1]["id"]
+
+
 # this is only used for debugging purposes - includes sensitive info like password and token
+@metrics.db_function
 def _get_users() -> list[dict]:
-    return supabase.table('users').select('*').execute().data
+    return get_client().table('users').select('*').execute().data
 
 # ---  helpers ---
+@metrics.db_function
 def get_ticket_by_id(ticket_id: str) -> dict | None:
-    resp = supabase.table("tickets").select("*").eq("id", ticket_id).execute()
+    if not _is_uuid(ticket_id):
+        # tickets.id is a uuid in Postgres, other values can't match
+        return None
+    resp = get_client().table("tickets").select("*").eq("id", ticket_id).execute()
     if resp.data and len(resp.data) == 1:
         return resp.data[0]
     return None
 
-
+# tables -> versions, saves the round trip of @versioned views on repeated reads. Writes of the worker
+# invalidate it (invalidate_table_versions after every non-GET request), changes made elsewhere are
+# seen after TABLE_VERSIONS_TTL at the latest.
+_versions_cache = TTLCache(maxsize=64, ttl=Config.TABLE_VERSIONS_TTL)
+# counts invalidations, a read that overlapped one doesn't cache what it read (as for the photo cache)
+_versions_invalidations = 0
+_versions_invalidations_lock = threading.Lock()
+
+@metrics.db_function
+def get_table_versions(tables: tuple[str, ...]) -> dict[str, int]:
+    """Change counters of the given tables (maintained by triggers), 0 for tables never changed."""
+    cached = _versions_cache.get(tables)
+    if cached is not None:
+        return cached
+
+    invalidations = _versions_invalidations
+    rows = get_client().table("table_versions").select("table_name, version").in_("table_name", list(tables)).execute().data
+    versions = {row["table_name"]: row["version"] for row in rows}
+    versions = {table: versions.get(table, 0) for table in tables}
+    with _versions_invalidations_lock:
+        if invalidations == _versions_invalidations:
+            _versions_cache.set(tables, versions)
+    return versions
+
+def invalidate_table_versions() -> None:
+    global _versions_invalidations
+    with _versions_invalidations_lock:
+        _versions_invalidations += 1
+        _versions_cache.clear()
+
+def table_versions_cache_stats() -> dict:
+    return _versions_cache.stats()
+
+
+# version of the structured change set stored in ticket_log_entries.payload
+LOG_PAYLOAD_VERSION = 1
+
+@metrics.db_function
 def create_ticket_log_entry(
     ticket_id: str,
     actor_user_id: str,
@@ -155,218 +619,618 @@ def create_ticket_log_entry(
     message: str,
     old_status: int | None,
     new_status: int | None,
+    payload: dict | None = None,
 ) -> dict:
-    resp = supabase.table("ticket_log_entries").insert({
+    """
+    message holds the plain note text, payload the structured change set
+    (see _build_log_payload) stored in a JSON column.
+    """
+    resp = get_client().table("ticket_log_entries").insert({
         "ticket_id": ticket_id,
         "actor_user_id": actor_user_id,
         "action_type": action_type,
         "message": message,
         "old_status": old_status,
         "new_status": new_status,
+        "payload": payload,
+        "changed_fields": [c["field"] for c in (payload or {}).get("changes", [])],
         "created_at": datetime.now().isoformat(),
     }).execute()
     return resp.data[0]
 
+def _build_log_payload(note: str, changes: list[dict], **values) -> dict:
+    return {"version": LOG_PAYLOAD_VERSION, "note": note or "", **values, "changes": changes}
 
-def upload_log_attachment(ticket_id: str, log_entry_id: str, uploaded_by: str, file):
-    file_extension = os.path.splitext(file.filename)[1]
-    storage_path = f"{ticket_id}/{log_entry_id}/{os.urandom(4).hex()}{file_extension}"
-
-    file.seek(0)
-    file_content = file.read()
-
-    supabase.storage.from_("photo_bucket").upload(
-        storage_path,
-        file_content,
-        {"content-type": file.content_type}
-    )
-
-    public_url = supabase.storage.from_("photo_bucket").get_public_url(storage_path)
-
-    supabase.table("ticket_attachments").insert({
-        "ticket_id": ticket_id,
-        "log_entry_id": log_entry_id,
-        "uploaded_by": uploaded_by,
-        "storage_path": storage_path,
-        "file_name": file.filename,
-        "mime_type": file.content_type,
-        "file_size": len(file_content),
-        "created_at": datetime.now().isoformat(),
-    }).execute()
+def _legacy_log_payload(message: str) -> dict:
+    # rows written before the payload column existed keep the change set as JSON text in message
+    try:
+        payload = json.loads(message)
+        if not isinstance(payload, dict):
+            raise ValueError
+    except Exception:
+        payload = {"note": message}
+    return _build_log_payload(payload.pop("note", ""), payload.pop("changes", []), **payload)
 
+@metrics.db_function
+def migrate_log_payloads(batch_size: int = 500) -> int:
+    """
+    Moves the JSON change sets of old log entries from message into payload/changed_fields.
+    Returns the number of migrated rows.
+    """
+    migrated = 0
+    while True:
+        rows = (get_client().table("ticket_log_entries")
+                .select("id, message")
+                .is_("payload", "null")
+                .limit(batch_size)
+                .execute()).data
+        if not rows:
+            return migrated
+
+        for row in rows:
+            payload = _legacy_log_payload(row.get("message") or "")
+            get_client().table("ticket_log_entries").update({
+                "message": payload["note"],
+                "payload": payload,
+                "changed_fields": [c["field"] for c in payload["changes"]],
+            }).eq("id", row["id"]).execute()
+        migrated += len(rows)
+
+
+# bounded pool shared by all requests, a request with many files can't starve the others
+_upload_pool = ThreadPoolExecutor(max_workers=Config.UPLOAD_WORKERS, thread_name_prefix="upload")
+
+# renditions of uploaded photos are created off the request thread
+_image_pool = ThreadPoolExecutor(max_workers=Config.IMAGE_WORKERS, thread_name_prefix="thumbnails")
+
+def _schedule_renditions(storage_path: str, mime_type: str | None) -> None:
+    if thumbnails.available() and thumbnails.is_image(mime_type):
+        _image_pool.submit(_create_renditions, storage_path)
+
+@metrics.db_function
+def _create_renditions(storage_path: str) -> None:
+    """Stores WebP thumbnail/medium renditions next to the original and links them to its rows."""
     try:
-        supabase.table("ticket_photos").insert({
-            "ticket_id": ticket_id,
-            "url": public_url,
-            "file_path": storage_path
-        }).execute()
+        bucket = get_client().storage.from_("photo_bucket")
+        paths = {}
+        for name, content in thumbnails.render(bucket.download(storage_path)).items():
+            paths[name] = thumbnails.rendition_path(storage_path, name)
+            bucket.upload(paths[name], content, {"content-type": "image/webp", "upsert": "true"})
+
+        photos = get_client().table("ticket_photos").update({
+            "thumbnail_url": bucket.get_public_url(paths["thumbnail"]),
+            "medium_url": bucket.get_public_url(paths["medium"]),
+        }).eq("file_path", storage_path).execute().data
+        _invalidate_pictures(*{p["ticket_id"] for p in photos})
+        get_client().table("ticket_attachments").update({
+            "thumbnail_path": paths["thumbnail"],
+            "medium_path": paths["medium"],
+        }).eq("storage_path", storage_path).execute()
+        # later uploads of the same content copy the renditions from the blob row
+        get_client().table("storage_blobs").update({
+            "thumbnail_path": paths["thumbnail"],
+            "medium_path": paths["medium"],
+        }).eq("storage_path", storage_path).execute()
     except Exception:
-        pass
+        logger.exception("creating renditions failed: %s", storage_path)
+
+def _hash_file(file) -> tuple[str, int]:
+    """sha256 and size of an uploaded file, read in chunks from its stream."""
+    digest = hashlib.sha256()
+    size = 0
+    file.stream.seek(0)
+    for chunk in iter(lambda: file.stream.read(64 * 1024), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    file.stream.seek(0)
+    return digest.hexdigest(), size
+
+def _store_blob(file, refs: int) -> dict:
+    """
+    Stores an uploaded file deduplicated by content hash and adds `refs` references to it.
+    The upload is skipped when a file with the same content already exists. References are only
+    taken once the file is stored, a failed upload leaves no reference behind.
+    Returns the storage_blobs row plus "new" (True if the file was uploaded now).
+    """
+    digest, size = _hash_file(file)
+    extension = os.path.splitext(file.filename)[1].lower()
+    # a path of its own for every blob row: release_blob removes the file of a row after deleting it,
+    # a row created for the same content meanwhile must not share that file
+    storage_path = f"blobs/{digest[:2]}/{digest}-{uuid.uuid4().hex}{extension}"
+
+    stored = bool(get_client().table("storage_blobs").select("hash").eq("hash", digest).execute().data)
+    if not stored:
+        _store_file(storage_path, file)
+
+    blob = get_client().rpc("acquire_blob", {
+        "p_hash": digest,
+        "p_storage_path": storage_path,
+        "p_size": size,
+        "p_mime_type": file.content_type,
+        "p_refs": refs,
+    }).execute().data[0]
+
+    blob["new"] = blob["ref_count"] == refs
+    if blob["new"] and stored:
+        # the row found by the lookup lost its last reference meanwhile, this one is new (with our path)
+        try:
+            _store_file(blob["storage_path"], file)
+        except Exception:
+            release_blob(blob["storage_path"], refs)
+            raise
+    elif not stored and blob["storage_path"] != storage_path:
+        # stored concurrently under another path, that one is kept
+        get_client().storage.from_("photo_bucket").remove([storage_path])
+    return blob
+
+@metrics.db_function
+def release_blob(storage_path: str, refs: int = 1) -> None:
+    """
+    Drops references to a stored file, the file and its renditions are removed with the last one.
+    The row is deleted in the same transaction as the last reference is dropped, so no reference can be
+    taken to the file being removed (a new row for the same content gets a new path, see _store_blob).
+    """
+    released = get_client().rpc("release_blob", {"p_storage_path": storage_path, "p_refs": refs}).execute().data
+    if released and released[0]["ref_count"] <= 0:
+        blob = released[0]
+        paths = [p for p in (blob["storage_path"], blob.get("thumbnail_path"), blob.get("medium_path")) if p]
+        get_client().storage.from_("photo_bucket").remove(paths)
+
+def _store_file(storage_path: str, file) -> str:
+    """Streams an uploaded file into the photo bucket and returns its public url."""
+    file.stream.seek(0)
+    # hand the storage client a reader instead of the whole file content
+    reader = io.BufferedReader(file.stream)
+    try:
+        # upsert, a blob stored again (see _store_blob) replaces its file
+        get_client().storage.from_("photo_bucket").upload(
+            storage_path,
+            reader,
+            {"content-type": file.content_type, "upsert": "true"}
+        )
+    finally:
+        reader.detach()
+    return get_client().storage.from_("photo_bucket").get_public_url(storage_path)
 
-    return {
-        "url": public_url,
-        "storage_path": storage_path,
+def _upload_one(file) -> dict:
+    result = {
         "file_name": file.filename,
         "mime_type": file.content_type,
-        "file_size": len(file_content),
     }
+    try:
+        # referenced by one ticket_attachments and one ticket_photos row
+        blob = _store_blob(file, refs=2)
+        bucket = get_client().storage.from_("photo_bucket")
+        result.update({
+            "storage_path": blob["storage_path"],
+            "thumbnail_path": blob.get("thumbnail_path"),
+            "medium_path": blob.get("medium_path"),
+            "file_size": blob["size"],
+            "url": bucket.get_public_url(blob["storage_path"]),
+            "new": blob["new"],
+            "success": True,
+        })
+    except Exception as e:
+        result["success"] = False
+        result["error"] = str(e)
+    return result
+
+def _upload_files(files: list) -> list[dict]:
+    """Stores the files in parallel, each successful one holds two blob references until it is recorded."""
+    if not files:
+        return []
+    return list(_upload_pool.map(metrics.bind_context(_upload_one), files))
+
+def _release_uploads(results: list[dict]) -> None:
+    for r in results:
+        if r["success"]:
+            release_blob(r["storage_path"], refs=2)
+
+def _record_log_attachments(ticket_id: str, log_entry_id: str, uploaded_by: str, results: list[dict]) -> list[dict]:
+    uploaded = [r for r in results if r["success"]]
+    if not uploaded:
+        return results
+
+    now = datetime.now().isoformat()
+    try:
+        get_client().table("ticket_attachments").insert([{
+            "ticket_id": ticket_id,
+            "log_entry_id": log_entry_id,
+            "uploaded_by": uploaded_by,
+            "storage_path": r["storage_path"],
+            "thumbnail_path": r["thumbnail_path"],
+            "medium_path": r["medium_path"],
+            "file_name": r["file_name"],
+            "mime_type": r["mime_type"],
+            "file_size": r["file_size"],
+            "created_at": now,
+        } for r in uploaded]).execute()
+    except Exception as e:
+        # don't leave unreferenced files behind
+        _release_uploads(uploaded)
+        for r in uploaded:
+            r.update({"success": False, "error": str(e)})
+            r.pop("url", None)
+            r.pop("new", None)
+        return results
 
+    try:
+        get_client().table("ticket_photos").insert(_photo_rows(ticket_id, uploaded_by, uploaded)).execute()
+        _invalidate_pictures(ticket_id)
+    except Exception:
+        for r in uploaded:
+            release_blob(r["storage_path"], refs=1)
 
-def save_ticket_update_with_log(
-    ticket_id: str,
-    actor_user_id: str,
-    updates: dict,
-    note_text: str,
-    files: list
-) -> dict:
-    """
-    updates may contain: name, description, status, priority, assigned_to
-    """
-
-    ticket = get_ticket_by_id(ticket_id)
-    if ticket is None:
-        raise ValueError("Ticket not found")
-
-    old_status = ticket.get("status")
-    new_status = updates.get("status", old_status)
-
-    old_priority = ticket.get("priority")
-    new_priority = updates.get("priority", old_priority)
-
-    old_assignee = ticket.get("assigned_to")
-    new_assignee = updates.get("assigned_to", old_assignee)
+    for r in uploaded:
+        if r.pop("new"):
+            _schedule_renditions(r["storage_path"], r["mime_type"])
 
-    changes = []
-    if old_status != new_status:
-        changes.append({"field": "status", "from": old_status, "to": new_status})
+    return results
 
-    if old_priority != new_priority:
-        changes.append({"field": "priority", "from": old_priority, "to": new_priority})
 
-    if (old_assignee or None) != (new_assignee or None):
-        changes.append({"field": "assignee", "from": old_assignee, "to": new_assignee})
+def _photo_rows(ticket_id: str, uploaded_by: str | None, results: list[dict]) -> list[dict]:
+    bucket = get_client().storage.from_("photo_bucket")
+    return [{
+        "ticket_id": ticket_id,
+        "url": r["url"],
+        "file_path": r["storage_path"],
+        "uploaded_by": uploaded_by,
+        "thumbnail_url": bucket.get_public_url(r["thumbnail_path"]) if r["thumbnail_path"] else None,
+        "medium_url": bucket.get_public_url(r["medium_path"]) if r["medium_path"] else None,
+    } for r in results]
 
 
-    old_name = ticket.get("name")
-    new_name = updates.get("name", old_name)
+# DIRECT UPLOADS
+# clients upload files to signed storage urls themselves, the app only issues the urls and records the
+# rows afterwards. The server never sees the content, so these files aren't content addressed: every
+# upload gets a random path (its own storage_blobs row) and an upload token binding the path to the
+# ticket and the user it was issued for.
+UPLOADS_FOLDER = "uploads"
 
-    old_desc = ticket.get("description")
-    new_desc = updates.get("description", old_desc)
+@metrics.db_function
+def create_upload_urls(ticket_id: str, user_id: str, files: list[dict]) -> list[dict]:
+    """
+    files: [{"file_name", "mime_type"}], returns per file the signed url to PUT the content to
+    and the upload token to record it with (POST /api/uploads/finalize or save_update).
+    """
+    return list(_upload_pool.map(metrics.bind_context(lambda f: _create_upload_url(ticket_id, user_id, f)), files))
 
-    message_payload = {
-        "note": note_text or "",
-        "old_priority": old_priority,
-        "new_priority": new_priority,
-        "old_assignee": old_assignee,
-        "new_assignee": new_assignee,
-        "old_name": old_name,
-        "new_name": new_name,
-        "old_description": old_desc,
-        "new_description": new_desc,
-        "changes": changes
+def _mime_type(value: str | None) -> str:
+    # without parameters (charset, ...), clients send files of unknown type as octet-stream
+    return (value or "").split(";")[0].strip().lower() or "application/octet-stream"
 
+def _create_upload_url(ticket_id: str, user_id: str, file: dict) -> dict:
+    extension = os.path.splitext(file.get("file_name") or "")[1].lower()
+    path = f"{UPLOADS_FOLDER}/{uuid.uuid4().hex}{extension}"
+    signed = get_client().storage.from_("photo_bucket").create_signed_upload_url(path)
+    return {
+        "file_name": file.get("file_name"),
+        "path": path,
+        "upload_url": signed.get("signed_url") or signed.get("signedUrl"),
+        "upload_token": tokens.sign_claims("upload", {
+            "sub": user_id,
+            "ticket_id": ticket_id,
+            "path": path,
+            "file_name": file.get("file_name"),
+            "mime_type": _mime_type(file.get("mime_type")),
+        }, Config.UPLOAD_TOKEN_TTL),
     }
 
-    log = create_ticket_log_entry(
-        ticket_id=ticket_id,
-        actor_user_id=actor_user_id,
-        action_type="update",
-        message=json.dumps(message_payload),
-        old_status=old_status,
-        new_status=new_status
-    )
+def _stored_object(path: str) -> dict | None:
+    """Storage metadata (size, mimetype) of an uploaded object, None if it doesn't exist."""
+    folder, name = path.rsplit("/", 1)
+    for entry in get_client().storage.from_("photo_bucket").list(folder, {"search": name}):
+        if entry.get("name") == name:
+            return entry.get("metadata") or {}
+    return None
+
+def _claim_upload(upload_token: str, ticket_id: str, user_id: str, refs: int) -> dict:
+    """Checks a direct upload and adds `refs` references to it, same result layout as _upload_one."""
+    claims = tokens.verify_claims("upload", upload_token)
+    if claims is None or claims.get("ticket_id") != ticket_id or claims.get("sub") != user_id:
+        return {"success": False, "error": "Invalid or expired upload token"}
 
-    supabase.table("tickets").update(updates).eq("id", ticket_id).execute()
+    path = claims["path"]
+    result = {"file_name": claims.get("file_name"), "mime_type": claims.get("mime_type")}
+    try:
+        stored = _stored_object(path)
+        if stored is None:
+            raise ValueError("File was not uploaded")
+        size = stored.get("size") or 0
+        if size > Config.UPLOAD_MAX_SIZE:
+            get_client().storage.from_("photo_bucket").remove([path])
+            raise ValueError("File is too large")
+        # the type the upload url was issued for, renditions and downloads rely on it
+        if _mime_type(stored.get("mimetype")) != _mime_type(claims.get("mime_type")):
+            get_client().storage.from_("photo_bucket").remove([path])
+            raise ValueError("File type doesn't match the upload")
+        result["mime_type"] = _mime_type(claims.get("mime_type"))
+
+        blob = get_client().rpc("acquire_blob", {
+            "p_hash": f"{UPLOADS_FOLDER}:{path}",
+            "p_storage_path": path,
+            "p_size": size,
+            "p_mime_type": result["mime_type"],
+            "p_refs": refs,
+        }).execute().data[0]
+        if blob["ref_count"] != refs:
+            # the token was recorded before
+            release_blob(path, refs)
+            raise ValueError("Upload was already recorded")
+
+        result.update({
+            "storage_path": path,
+            "thumbnail_path": None,
+            "medium_path": None,
+            "file_size": size,
+            "url": get_client().storage.from_("photo_bucket").get_public_url(path),
+            "new": True,
+            "success": True,
+        })
+    except Exception as e:
+        result["success"] = False
+        result["error"] = str(e)
+    return result
+
+def _claim_uploads(upload_tokens: list[str], ticket_id: str, user_id: str, refs: int = 2) -> list[dict]:
+    """Checks the direct uploads in parallel, by default with the two references of an attachment."""
+    if not upload_tokens:
+        return []
+    return list(_upload_pool.map(
+        metrics.bind_context(lambda t: _claim_upload(t, ticket_id, user_id, refs)), upload_tokens
+    ))
+
+@metrics.db_function
+def record_photo_uploads(ticket_id: str, user_id: str, upload_tokens: list[str]) -> list[dict]:
+    """Records direct uploads as ticket photos (like PUT /api/photos), one result per token."""
+    results = _claim_uploads(upload_tokens, ticket_id, user_id, refs=1)
+    uploaded = [r for r in results if r["success"]]
+    if not uploaded:
+        return results
 
-    uploaded = []
-    for f in files:
-        uploaded.append(upload_log_attachment(ticket_id, log.get("id"), actor_user_id, f))
+    try:
+        get_client().table("ticket_photos").insert(_photo_rows(ticket_id, user_id, uploaded)).execute()
+    except Exception as e:
+        for r in uploaded:
+            release_blob(r["storage_path"], refs=1)
+            r.update({"success": False, "error": str(e)})
+            r.pop("url", None)
+            r.pop("new", None)
+        return results
+    _invalidate_pictures(ticket_id)
+
+    for r in uploaded:
+        if r.pop("new"):
+            _schedule_renditions(r["storage_path"], r["mime_type"])
+    return results
+
+@metrics.db_function
+def store_signed_upload(bucket: str, path: str, token: str, content: bytes, content_type: str | None) -> bool:
+    """PUT of a signed upload url of the sqlite / memory backends."""
+    try:
+        get_client().storage.from_(bucket).upload_to_signed_url(path, token, content, {"content-type": content_type})
+    except Exception:
+        return False
+    return True
 
-    return {"log": log, "uploaded": uploaded}
+@metrics.db_function
+def remove_unclaimed_uploads(batch_size: int = 1000) -> int:
+    """
+    Removes direct uploads that were never recorded (no storage_blobs row) and whose upload token
+    has expired, returns the number of removed files.
+    """
+    bucket = get_client().storage.from_("photo_bucket")
+    cutoff = datetime.now().timestamp() - Config.UPLOAD_TOKEN_TTL
+    removed = 0
+    offset = 0
+    while True:
+        entries = bucket.list(UPLOADS_FOLDER, {"limit": batch_size, "offset": offset,
+                                               "sortBy": {"column": "name", "order": "asc"}})
+        if not entries:
+            return removed
+        paths = [f"{UPLOADS_FOLDER}/{e['name']}" for e in entries
+                 if e.get("created_at") and _timestamp(e["created_at"]) < cutoff]
+        claimed = {b["storage_path"] for b in (get_client().table("storage_blobs")
+                                               .select("storage_path")
+                                               .in_("storage_path", paths)
+                                               .execute()).data} if paths else set()
+        unclaimed = [p for p in paths if p not in claimed]
+        if unclaimed:
+            bucket.remove(unclaimed)
+        removed += len(unclaimed)
+        offset += len(entries) - len(unclaimed)
+
+def _timestamp(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class TicketNotFound(ValueError):
+    pass
+
+
+class TicketVersionConflict(Exception):
+    """The ticket was changed since the version the client edited, carries the current row."""
+
+    def __init__(self, ticket: dict):
+        super().__init__("Ticket was changed in the meantime")
+        self.ticket = ticket
+
+
+def _update_ticket_with_log(ticket_id: str, actor_user_id: str, updates: dict, note_text: str,
+                            expected_version: int | None = None) -> dict:
+    """
+    Reads the ticket, writes the log entry and updates the ticket in one transaction and one call
+    (update_ticket_with_log function), returns the updated ticket and the log entry.
+    Invalid updates (see _bulk_item_error) raise ValueError before anything is written.
+    """
+    error = _bulk_item_error({**updates, "id": ticket_id})
+    if error is not None:
+        raise ValueError(error)
+
+    result = get_client().rpc("update_ticket_with_log", {
+        "p_ticket_id": ticket_id,
+        "p_actor_user_id": actor_user_id,
+        "p_updates": {k: v for k, v in updates.items() if k in BULK_UPDATE_FIELDS},
+        "p_note": note_text or "",
+        "p_expected_version": expected_version,
+        "p_now": datetime.now().isoformat(),
+    }).execute().data
+    if result["ticket"] is None:
+        raise TicketNotFound("Ticket not found")
+    if result["conflict"]:
+        raise TicketVersionConflict(result["ticket"])
+    return result
+
+def _recent_log_entries(log_query, limit: int, cursor: str | None,
+                        changed_field: str | None) -> tuple[list[dict], str | None]:
+    log_query = log_query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+    if changed_field:
+        log_query = log_query.contains("changed_fields", [changed_field])
+
+    if cursor:
+        created_at, log_id = _decode_cursor(cursor)
+        log_query = log_query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{log_id}")'
+        )
 
+    logs = log_query.execute().data or []
 
-def get_ticket_history(search: str | None = None, limit: int = 200) -> list[dict]:
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        next_cursor = _encode_cursor(logs[-1]["created_at"], str(logs[-1]["id"]))
+    return logs, next_cursor
+
+def _search_log_entries(log_query, search: str, limit: int, cursor: str | None,
+                        changed_field: str | None) -> tuple[list[dict], str | None]:
+    terms = _search_terms(search)
+    if not terms:
+        return [], None
+    offset = _decode_offset(cursor)
+
+    hits = get_client().rpc("search_log_entries", {
+        "p_terms": terms,
+        "p_changed_field": changed_field,
+        "p_limit": limit + 1,
+        "p_offset": offset,
+    }).execute().data or []
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = _encode_cursor(str(offset + limit))
+    if not hits:
+        return [], None
+
+    # keep the rank order of the search
+    position = {h["id"]: i for i, h in enumerate(hits)}
+    logs = log_query.in_("id", list(position)).execute().data or []
+    logs.sort(key=lambda l: position[l["id"]])
+    return logs, next_cursor
+
+# columns embedded in the history rows
+HISTORY_TICKET_COLUMNS = "id,name,created_at,assigned_to,priority,status"
+HISTORY_ATTACHMENT_COLUMNS = "storage_path,thumbnail_path,medium_path,file_name,mime_type,file_size,created_at"
+
+@metrics.db_function
+def get_ticket_history(
+    search: str | None = None,
+    limit: int = 200,
+    cursor: str | None = None,
+    changed_field: str | None = None,
+) -> tuple[list[dict], str | None]:
     """
-    Returns flattened rows for history page.
+    Returns flattened rows for history page, newest first, and the cursor of the next page.
+    Log entries, their tickets and attachments are fetched in a single query.
+    With a search (one more call) the rows matching in their note or ticket name / description are
+    returned best match first (see search_log_entries).
+    changed_field restricts the rows to updates of one field (status, priority, assignee).
     """
 
-    ticket_map = {}
-    ticket_ids = None
+    log_query = (get_client().table("ticket_log_entries")
+                 .select(f"*, tickets({HISTORY_TICKET_COLUMNS}), ticket_attachments({HISTORY_ATTACHMENT_COLUMNS})")
+                 .order("created_at", foreign_table="ticket_attachments"))
 
     if search:
-        t = (supabase.table("tickets")
-             .select("id,name,created_at,assigned_to,priority,status")
-             .ilike("name", f"%{search}%")
-             .execute())
-        tickets = t.data or []
-        ticket_ids = [x["id"] for x in tickets]
-        ticket_map = {x["id"]: x for x in tickets}
+        logs, next_cursor = _search_log_entries(log_query, search, limit, cursor, changed_field)
     else:
-        t = (supabase.table("tickets")
-             .select("id,name,created_at,assigned_to,priority,status")
-             .execute())
-        tickets = t.data or []
-        ticket_map = {x["id"]: x for x in tickets}
-
-    log_query = (supabase.table("ticket_log_entries")
-                 .select("*")
-                 .order("created_at", desc=True)
-                 .limit(limit))
-
-    if ticket_ids is not None:
-        if len(ticket_ids) == 0:
-            return []
-        log_query = log_query.in_("ticket_id", ticket_ids)
+        logs, next_cursor = _recent_log_entries(log_query, limit, cursor, changed_field)
 
-    logs = log_query.execute().data or []
+    bucket = get_client().storage.from_("photo_bucket")
+    return [_history_row(l, bucket) for l in logs], next_cursor
 
-    log_ids = [l["id"] for l in logs]
-    att_map = {lid: [] for lid in log_ids}
-    if log_ids:
-        atts = (supabase.table("ticket_attachments")
-                .select("*")
-                .in_("log_entry_id", log_ids)
-                .order("created_at", desc=False)
-                .execute()).data or []
-
-        for a in atts:
-            storage_path = a.get("storage_path")
-            url = supabase.storage.from_("photo_bucket").get_public_url(storage_path) if storage_path else None
-            att_map[a.get("log_entry_id")].append({
-                "url": url,
-                "file_name": a.get("file_name"),
-                "mime_type": a.get("mime_type"),
-                "file_size": a.get("file_size"),
-            })
-
-    rows = []
-    for l in logs:
-        tid = l.get("ticket_id")
-        t = ticket_map.get(tid) or {}
+def _history_row(l: dict, bucket) -> dict:
+    """Flattens a log entry with its embedded ticket and attachments into a history row."""
+    t = l.get("tickets") or {}
+    photos = [{
+        "url": bucket.get_public_url(a.get("storage_path")) if a.get("storage_path") else None,
+        "thumbnail_url": bucket.get_public_url(a.get("thumbnail_path")) if a.get("thumbnail_path") else None,
+        "medium_url": bucket.get_public_url(a.get("medium_path")) if a.get("medium_path") else None,
+        "file_name": a.get("file_name"),
+        "mime_type": a.get("mime_type"),
+        "file_size": a.get("file_size"),
+    } for a in l.get("ticket_attachments") or []]
 
-        msg = l.get("message") or ""
-        payload = None
-        try:
-            payload = json.loads(msg)
-        except Exception:
-            payload = {"note": msg}
-
-        new_priority = payload.get("new_priority", t.get("priority"))
-        new_assignee = payload.get("new_assignee", t.get("assigned_to"))
-        ticket_name = payload.get("new_name", t.get("name"))
-
-        rows.append({
-            "log_id": l.get("id"),
-            "ticket_id": tid,
-            "ticket_name": ticket_name,
-            "ticket_created_at": t.get("created_at"),
-            "updated_at": l.get("created_at"),
-            "assignee": new_assignee,
-            "update": payload.get("note", ""),
-            "status": l.get("new_status", t.get("status")),
-            "priority": new_priority,
-            "photos": att_map.get(l.get("id"), []),
-            "changes": payload.get("changes", [])
-        })
+    payload = l.get("payload") or _legacy_log_payload(l.get("message") or "")
+
+    return {
+        "log_id": l.get("id"),
+        "ticket_id": l.get("ticket_id"),
+        "ticket_name": payload.get("new_name", t.get("name")),
+        "ticket_created_at": t.get("created_at"),
+        "updated_at": l.get("created_at"),
+        "assignee": payload.get("new_assignee", t.get("assigned_to")),
+        "update": payload.get("note", ""),
+        "status": l.get("new_status", t.get("status")),
+        "priority": payload.get("new_priority", t.get("priority")),
+        "photos": photos,
+        "changes": payload.get("changes", [])
+    }
 
-    return rows
+@metrics.db_function
+def _history_export_page(since: str | None, until: str | None, ticket_id: str | None,
+                         after: tuple[str, str] | None, limit: int) -> list[dict]:
+    query = (get_client().table("ticket_log_entries")
+             .select(f"*, tickets({HISTORY_TICKET_COLUMNS})")
+             .order("created_at").order("id").limit(limit))
+    if since:
+        query = query.gte("created_at", since)
+    if until:
+        query = query.lt("created_at", until)
+    if ticket_id:
+        query = query.eq("ticket_id", ticket_id)
+    if after:
+        created_at, log_id = after
+        query = query.or_(f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt."{log_id}")')
+    logs = query.execute().data or []
+    if not logs:
+        return logs
+
+    # attachments of the whole page in one call
+    attachments = (get_client().table("ticket_attachments")
+                   .select(f"log_entry_id, {HISTORY_ATTACHMENT_COLUMNS}")
+                   .in_("log_entry_id", [l["id"] for l in logs])
+                   .order("created_at").execute().data or [])
+    by_log = {}
+    for a in attachments:
+        by_log.setdefault(a["log_entry_id"], []).append(a)
+    for l in logs:
+        l["ticket_attachments"] = by_log.get(l["id"], [])
+    return logs
+
+def export_ticket_history(since: str | None = None, until: str | None = None, ticket_id: str | None = None,
+                          batch_size: int = 500):
+    """
+    Yields the history rows created in [since, until) oldest first, one page of batch_size rows
+    (two backend calls) at a time, so an export of any size only holds one page in memory.
+    """
+    bucket = get_client().storage.from_("photo_bucket")
+    after = None
+    while True:
+        logs = _history_export_page(since, until, ticket_id, after, batch_size)
+        if logs:
+            yield [_history_row(l, bucket) for l in logs]
+        if len(logs) < batch_size:
+            return
+        after = (logs[-1]["created_at"], str(logs[-1]["id"]))
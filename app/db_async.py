@@ -0,0 +1,78 @@
+"""
+The app/db.py functions behind the heavy routes, written with asyncio (the routes are async).
+
+Backend calls that don't depend on each other are awaited together, so a request
+takes about as long as its slowest call instead of the sum of all of them.
+The blocking calls of the shared (pooled) backend client run on a bounded thread pool.
+get_ticket_history is a single embedded query already and stays synchronous.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from . import db, events, metrics
+from config import Config
+
+_query_pool = ThreadPoolExecutor(max_workers=Config.QUERY_WORKERS, thread_name_prefix="query")
+
+
+async def _run(fn, *args, **kwargs):
+    # bind_context keeps the calls attributed to the calling db function
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_query_pool, metrics.bind_context(partial(fn, *args, **kwargs)))
+
+
+@metrics.db_function
+async def get_ticket_changes(user_id: str | None, since: str) -> tuple[list[dict], list[str]]:
+    """
+    Returns the tickets created or modified after `since` and the ids of the tickets
+    that were reassigned away from `user_id` since then (tombstones), both read together.
+    user_id=None returns the changes of all tickets (manager view).
+    """
+    tickets, tombstoned = await asyncio.gather(
+        _run(db._changed_tickets, user_id, since),
+        _run(db._tombstoned_ticket_ids, user_id, since),
+    )
+    return tickets, db._removed_ticket_ids(tickets, tombstoned)
+
+
+@metrics.db_function
+async def save_ticket_update_with_log(
+    ticket_id: str,
+    actor_user_id: str,
+    updates: dict,
+    note_text: str,
+    files: list,
+    expected_version: int | None = None,
+    upload_tokens: list[str] | None = None,
+) -> dict:
+    """
+    updates may contain: name, description, status, priority, assigned_to
+    expected_version makes the update fail with TicketVersionConflict if the ticket changed since.
+    upload_tokens are direct uploads (db.create_upload_urls) attached like the files.
+    1. the ticket is updated and logged (one call) while the files are uploaded and the
+       direct uploads checked
+    2. the attachments are recorded (needs the log entry id)
+    """
+    update, stored, claimed = await asyncio.gather(
+        _run(db._update_ticket_with_log, ticket_id, actor_user_id, updates, note_text, expected_version),
+        _run(db._upload_files, files),
+        _run(db._claim_uploads, upload_tokens, ticket_id, actor_user_id),
+        return_exceptions=True,
+    )
+    if isinstance(update, BaseException):
+        for results in (stored, claimed):
+            if not isinstance(results, BaseException):
+                await _run(db._release_uploads, results)
+        raise update
+    for results in (stored, claimed):
+        if isinstance(results, BaseException):
+            raise results
+    stored += claimed
+
+    log = update["log"]
+    uploaded = await _run(db._record_log_attachments, ticket_id, log.get("id"), actor_user_id, stored)
+
+    events.publish("ticket_log", ticket_id, log["payload"]["new_assignee"], log["payload"]["old_assignee"])
+
+    return {"log": log, "uploaded": uploaded, "ticket": update["ticket"]}
@@ -0,0 +1,104 @@
+"""
+In-process pub/sub hub for live ticket updates (served as Server-Sent Events).
+
+Every open dashboard holds one subscription with a bounded queue. Publishing never
+blocks: when a slow client's queue is full its pending events are dropped and
+replaced by a single "resync" event, so the client falls back to one delta fetch.
+The hub lives in the worker process, events are only delivered to clients
+connected to the worker that handled the change.
+"""
+import json
+import queue
+import threading
+
+from .models import UserRoles
+
+
+class Subscription:
+    def __init__(self, role: UserRoles, user_id: str, maxsize: int):
+        self.role = role
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    def wants(self, event: dict) -> bool:
+        # technicians only see tickets that are, or just were, assigned to them
+        if self.role == UserRoles.MANAGER:
+            return True
+        return self.user_id in (event.get("assigned_to"), event.get("previous_assigned_to"))
+
+    def offer(self, event: dict) -> None:
+        with self._lock:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                # backpressure: drop the backlog and ask the client to resync once
+                while True:
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                self.queue.put_nowait({"type": "resync"})
+
+
+class EventHub:
+    def __init__(self, queue_size: int = 100, max_subscribers: int = 500):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, role: UserRoles, user_id: str) -> Subscription | None:
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(role, user_id, self.queue_size)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            if subscription.wants(event):
+                subscription.offer(event)
+
+    def stream(self, subscription: Subscription, heartbeat: float = 15.0):
+        """Yields the subscription's events in text/event-stream format."""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(subscription)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+hub = EventHub()
+
+
+def configure(queue_size: int, max_subscribers: int) -> None:
+    hub.queue_size = queue_size
+    hub.max_subscribers = max_subscribers
+
+
+def publish(event_type: str, ticket_id: str, assigned_to: str | None, previous_assigned_to: str | None = None) -> None:
+    hub.publish({
+        "type": event_type,
+        "ticket_id": ticket_id,
+        "assigned_to": assigned_to,
+        "previous_assigned_to": previous_assigned_to,
+    })
@@ -0,0 +1,185 @@
+"""
+Request latency, db function and backend call metrics, rendered in Prometheus text format.
+
+- every request is timed per route (url rule, method, status)
+- functions in app/db.py decorated with @db_function are timed and count the
+  backend calls (queries, rpc, storage) they issue
+- every backend call is timed by the instrumented client from app/backends/instrumented.py
+
+Requests slower than SLOW_REQUEST_MS are logged with a per backend call breakdown.
+"""
+import contextvars
+import inspect
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from flask import g, has_app_context, request
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# names of the (nested) db functions currently running in this context
+_current_functions = contextvars.ContextVar("current_db_functions", default=())
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = defaultdict(lambda: [[0] * len(BUCKETS), 0.0, 0])
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            buckets, _, _ = series = self._series[labels]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (buckets, total, count) in sorted(self._series.items()):
+                base = _labels(self.label_names, labels)
+                for bound, bucket_count in zip(BUCKETS, buckets):
+                    lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+                lines.append(f"{self.name}_sum{{{base}}} {total}")
+                lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: int = 1) -> None:
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{{{_labels(self.label_names, labels)}}} {value}")
+        return lines
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values))
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency per route.", ("endpoint", "method", "status"))
+db_function_duration = Histogram(
+    "db_function_duration_seconds", "Duration of app.db functions.", ("function",))
+db_function_calls = Counter(
+    "db_function_calls_total", "Calls of app.db functions.", ("function",))
+db_function_backend_calls = Counter(
+    "db_function_backend_calls_total", "Backend calls issued by app.db functions.", ("function",))
+backend_call_duration = Histogram(
+    "backend_call_duration_seconds", "Duration of single backend calls.", ("call",))
+
+METRICS = (request_duration, db_function_duration, db_function_calls, db_function_backend_calls,
+           backend_call_duration)
+
+
+def db_function(f):
+    """
+    Times a db function and attributes the backend calls made inside it,
+    including the ones made by nested db functions.
+    """
+    name = f.__name__
+
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_async(*args, **kwargs):
+            token = _current_functions.set(_current_functions.get() + (name,))
+            start = time.perf_counter()
+            try:
+                return await f(*args, **kwargs)
+            finally:
+                _current_functions.reset(token)
+                db_function_duration.observe((name,), time.perf_counter() - start)
+                db_function_calls.inc((name,))
+
+        return decorated_async
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        token = _current_functions.set(_current_functions.get() + (name,))
+        start = time.perf_counter()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            _current_functions.reset(token)
+            db_function_duration.observe((name,), time.perf_counter() - start)
+            db_function_calls.inc((name,))
+
+    return decorated
+
+
+def bind_context(fn):
+    """Runs fn in a copy of the caller's context, so work on thread pools keeps its db function."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def record_backend_call(call: str, duration: float) -> None:
+    backend_call_duration.observe((call,), duration)
+
+    functions = _current_functions.get()
+    for name in set(functions):
+        db_function_backend_calls.inc((name,))
+    function = functions[-1] if functions else None
+
+    # per request breakdown for the slow request log
+    if has_app_context() and "backend_calls" in g:
+        g.backend_calls.append((function, call, duration))
+
+
+def render() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app) -> None:
+    slow_request_seconds = app.config["SLOW_REQUEST_MS"] / 1000
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.backend_calls = []
+
+    @app.after_request
+    def record_request(response):
+        if "request_start" not in g:
+            return response
+
+        duration = time.perf_counter() - g.request_start
+        endpoint = request.url_rule.rule if request.url_rule else "<unmatched>"
+        request_duration.observe((endpoint, request.method, str(response.status_code)), duration)
+
+        if slow_request_seconds and duration >= slow_request_seconds:
+            breakdown = "\n".join(
+                f"  {function or '-'} {call} {call_duration * 1000:.1f}ms"
+                for function, call, call_duration in g.backend_calls
+            )
+            app.logger.warning(
+                "slow request %s %s %.1fms, %d backend calls (%.1fms)\n%s",
+                request.method, request.path, duration * 1000, len(g.backend_calls),
+                sum(c[2] for c in g.backend_calls) * 1000, breakdown,
+            )
+        return response
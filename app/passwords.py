@@ -0,0 +1,74 @@
+"""
+Salted scrypt password hashes, stored as "scrypt$<log2 n>$<r>$<p>$<salt>$<hash>".
+
+The work factor (PASSWORD_HASH_COST = log2 of the scrypt n parameter) can be raised
+at any time, older hashes are upgraded on the next successful login (needs_rehash).
+Hashing runs on a bounded pool, so a burst of logins can't occupy every CPU.
+"""
+import base64
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+PREFIX = "scrypt"
+BLOCK_SIZE = 8
+PARALLELISM = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_hash_pool = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="passwords")
+
+
+def _scrypt(password: str, salt: bytes, cost: int, r: int, p: int) -> bytes:
+    n = 2 ** cost
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * r * n * p, dklen=KEY_BYTES)
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _hash(password: str, cost: int) -> str:
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, cost, BLOCK_SIZE, PARALLELISM)
+    return f"{PREFIX}${cost}${BLOCK_SIZE}${PARALLELISM}${_b64(salt)}${_b64(key)}"
+
+
+def _verify(password: str, stored: str | None) -> bool:
+    if not stored or not stored.startswith(PREFIX + "$"):
+        # plaintext password of an account that hasn't logged in since hashing was introduced
+        return hmac.compare_digest((stored or "").encode(), password.encode()) and bool(stored)
+    try:
+        _, cost, r, p, salt, key = stored.split("$")
+        expected = base64.b64decode(key)
+        actual = _scrypt(password, base64.b64decode(salt), int(cost), int(r), int(p))
+    except ValueError:
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def hash_password(password: str) -> str:
+    return _hash_pool.submit(_hash, password, Config.PASSWORD_HASH_COST).result()
+
+
+def verify_password(password: str, stored: str | None) -> bool:
+    return _hash_pool.submit(_verify, password, stored).result()
+
+
+def needs_rehash(stored: str | None) -> bool:
+    return not stored or not stored.startswith(f"{PREFIX}${Config.PASSWORD_HASH_COST}$")
+
+
+# compared against when the account doesn't exist, so unknown emails take as long as wrong passwords
+_dummy_hash = None
+
+
+def dummy_hash() -> str:
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(base64.b64encode(os.urandom(12)).decode())
+    return _dummy_hash
@@ -0,0 +1,124 @@
+"""
+Cheaper JSON responses:
+
+- JSON is encoded with orjson when it is installed (optional, falls back to the json module)
+- responses above COMPRESSION_MIN_SIZE are compressed with brotli (optional) or gzip,
+  whichever the client accepts
+- @versioned views answer If-None-Match with 304 when the versions of the tables they read
+  haven't changed, before anything else is queried or serialized. The versions are cached for
+  TABLE_VERSIONS_TTL, every non-GET request clears them
+"""
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+from . import db
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {"application/json", "text/html", "text/plain", "text/css", "text/csv",
+                      "application/javascript", "text/javascript", "application/x-ndjson"}
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Same output as the default provider (without sorted keys), encoded by orjson."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return self._dumps(obj, kwargs.get("indent")).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def _dumps(self, obj, indent=None) -> bytes:
+        # dates go through default(), so they are formatted like the default provider does
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dumps(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def _accepts(encoding: str) -> bool:
+    return request.accept_encodings[encoding] > 0
+
+
+def compress(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESSION_MIN_SIZE']:
+        return response
+
+    if brotli is not None and _accepts("br"):
+        response.set_data(brotli.compress(body, quality=current_app.config['BROTLI_QUALITY']))
+        response.headers["Content-Encoding"] = "br"
+    elif _accepts("gzip"):
+        response.set_data(gzip.compress(body, compresslevel=current_app.config['GZIP_LEVEL']))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def versioned(*tables: str):
+    """
+    Conditional GET for views whose response only depends on the given tables, the query string
+    and the role / user id passed in by @authorized (so it goes below @authorized).
+    The ETag is a hash of these, clients revalidate every time (no-cache) and get a 304 while
+    no row of the tables changed. The versions are read before the view queries anything, a
+    change in between only causes one more full response. They come from a short lived cache
+    (see db.get_table_versions), a change made by another worker can be answered with 304 for up
+    to TABLE_VERSIONS_TTL.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            versions = db.get_table_versions(tables)
+            scope = (kwargs.get("role"), kwargs.get("user_id"), request.full_path, sorted(versions.items()))
+            etag = hashlib.sha1(repr(scope).encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # weak, the compressed and uncompressed bodies share it
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add("Token")
+            return response
+        return decorated
+    return decorator
+
+
+def invalidate_versions(response):
+    # the request may have written, the next @versioned view of the worker reads fresh versions
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        db.invalidate_table_versions()
+    return response
+
+
+def init_app(app) -> None:
+    if orjson is not None:
+        app.json = ORJSONProvider(app)
+    app.after_request(invalidate_versions)
+    app.after_request(compress)
@@ -1,9 +1,16 @@
-from flask import Blueprint, render_template, request, jsonify, Response, redirect, url_for, session
+import csv
+import io
+from datetime import datetime, timedelta
 
-from . import db
+from flask import Blueprint, current_app, render_template, request, jsonify, Response, redirect, url_for, session, \
+    stream_with_context
+
+from . import db, db_async, events, metrics, tokens
 from .auth_decorator import authorized
 from .constants import *
 from .models import UserRoles
+from .responses import versioned
+from .throttle import login_throttle
 
 main = Blueprint('main', __name__)
 
@@ -18,16 +25,51 @@ def login():
         email = request.form['email']
         password = request.form['password']
 
+        if login_throttle.blocked(email, request.remote_addr):
+            return jsonify({"success": False, "message": "Too many failed logins, try again later"}), 429, \
+                {"Retry-After": str(int(login_throttle.window))}
+
         response = db.verify_user(email, password)
 
         if isinstance(response, tuple):
-            return jsonify({"success": True, "token": response[0], "role": response[1].__str__()}), 200
+            login_throttle.succeeded(email)
+            return _session_response(*response)
         else:
+            login_throttle.failed(email, request.remote_addr)
             return jsonify({"success": False, "message": "Invalid email or password"}), 401
 
     return render_template('login.html')
 
 
+def _session_response(user_id: str, refresh_token: str, role: UserRoles):
+    return jsonify({
+        "success": True,
+        "token": tokens.issue_access_token(user_id, role),
+        "refresh_token": refresh_token,
+        "expires_in": int(current_app.config['ACCESS_TOKEN_TTL']),
+        "role": role.__str__(),
+    }), 200
+
+@main.route(API_AUTH_REFRESH, methods=['POST'])
+def refresh_session():
+    refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+    response = db.refresh_session(refresh_token)
+    if response is None or response[2] is None:
+        return jsonify({"success": False, "message": "Invalid refresh token"}), 401
+    return _session_response(*response)
+
+@main.route(API_AUTH_LOGOUT, methods=['POST'])
+def logout():
+    token = request.headers.get('Token')
+    result = tokens.validate_token(token)
+    if result is None:
+        return Response(status=401)
+    tokens.revoke(token)
+    # the refresh token is rotated, so the session can't be extended any more
+    db.revoke_refresh_token(result[1])
+    return jsonify({"success": True})
+
+
 @main.route(REGISTER_URL, methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -54,7 +96,7 @@ def dashboard_technician():
 
 # API ROUTES
 @main.route(API_TICKETS + '/create', methods=['POST'])
-@authorized
+@authorized(roles=[UserRoles.MANAGER])
 def create_ticket(user_id: str):
     ticket_name = request.get_json().get('name')
     db.create_ticket(ticket_name, "Description", 1, user_id)
@@ -62,24 +104,157 @@ def create_ticket(user_id: str):
 
 @main.route(API_TICKETS, methods=['GET'])
 @authorized
+@versioned('tickets')
 def get_all_tickets(role: UserRoles, user_id: str):
+    # taken before querying, so changes made meanwhile are reported by the next delta
+    watermark = datetime.now().isoformat()
+    page_size = current_app.config['TICKETS_PAGE_SIZE']
+    limit = min(request.args.get('limit', page_size, type=int), current_app.config['TICKETS_MAX_PAGE_SIZE'])
+    if limit < 1:
+        return jsonify({"success": False, "message": "Invalid limit"}), 400
+
+    try:
+        tickets, next_cursor = db.get_tickets_page(
+            None if role == UserRoles.MANAGER else user_id,
+            status=request.args.get('status', type=int),
+            priority=request.args.get('priority', type=int),
+            assigned_to=request.args.get('assigned_to'),
+            search=request.args.get('q'),
+            cursor=request.args.get('cursor'),
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({"success": True, "tickets": tickets, "next_cursor": next_cursor, "watermark": watermark})
+
+@main.route(API_TICKETS + '/changes', methods=['GET'])
+@authorized
+async def get_ticket_changes(role: UserRoles, user_id: str):
+    since = request.args.get('since')
+    if not since:
+        return jsonify({"success": False, "message": "since missing"}), 400
+    try:
+        since = datetime.fromisoformat(since)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid since"}), 400
+    # overlapping deltas, clients skip the tickets they already have in this version
+    since -= timedelta(seconds=current_app.config['DELTA_SYNC_OVERLAP'])
+
+    watermark = datetime.now().isoformat()
+    tickets, removed = await db_async.get_ticket_changes(None if role == UserRoles.MANAGER else user_id,
+                                                         since.isoformat())
+    return jsonify({"success": True, "tickets": tickets, "removed": removed, "watermark": watermark})
+
+@main.route(API_TICKETS + '/bulk', methods=['POST'])
+@authorized(roles=[UserRoles.MANAGER])
+def bulk_update_tickets(user_id: str):
+    data = request.get_json(silent=True) or {}
+    items = data.get('tickets')
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "tickets missing"}), 400
+    if len(items) > current_app.config['BULK_MAX_ITEMS']:
+        return jsonify({"success": False, "message": "Too many tickets"}), 400
+
+    results = db.bulk_update_tickets(items, user_id, data.get('message') or "")
+    return jsonify({"success": all(r["success"] for r in results), "results": results})
+
+@main.route(API_TICKETS + '/workload', methods=['GET'])
+@authorized(roles=[UserRoles.MANAGER])
+def get_workload():
+    return jsonify({"success": True, **db.get_workload()})
+
+@main.route(API_SEARCH, methods=['GET'])
+@authorized
+def search(role: UserRoles, user_id: str):
+    q = request.args.get('q') or ''
+    if not q.strip():
+        return jsonify({"success": False, "message": "q missing"}), 400
+    limit = min(request.args.get('limit', current_app.config['SEARCH_PAGE_SIZE'], type=int),
+                current_app.config['SEARCH_MAX_PAGE_SIZE'])
+    if limit < 1:
+        return jsonify({"success": False, "message": "Invalid limit"}), 400
+
+    try:
+        hits, next_cursor = db.search_tickets(
+            q,
+            user_id=None if role == UserRoles.MANAGER else user_id,
+            cursor=request.args.get('cursor'),
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"success": True, "hits": hits, "next_cursor": next_cursor})
+
+@main.route(API_TICKETS + '/stream', methods=['GET'])
+def stream_ticket_events():
+    # EventSource cannot send headers, so the token may also be passed as query parameter
+    token = request.headers.get('Token') or request.args.get('token')
+    result = tokens.validate_token(token)
+    if result is None or result[0] is None:
+        return Response(status=401)
+    role, user_id = result
+
+    subscription = events.hub.subscribe(role, user_id)
+    if subscription is None:
+        return Response(status=503)
+
+    return Response(
+        events.hub.stream(subscription, current_app.config['EVENTS_HEARTBEAT']),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+# technicians may only move the tickets assigned to them through the statuses
+TECHNICIAN_UPDATE_FIELDS = {"status"}
+
+def _ticket_edit_error(role: UserRoles, user_id: str, updates: dict):
+    """
+    Response rejecting the edit of ticket updates["id"], None if the user may make it.
+    Managers edit any ticket. Technicians only edit tickets assigned to them and only change
+    TECHNICIAN_UPDATE_FIELDS, other fields may be sent with their current value (forms send all fields).
+    """
     if role == UserRoles.MANAGER:
-        tickets = db.get_tickets(None)
-    else:
-        tickets = db.get_tickets(user_id)
-    return jsonify({"success": True, "tickets": tickets})
+        return None
+    ticket = db.get_ticket_by_id(updates["id"])
+    if ticket is None:
+        return jsonify({"success": False, "message": "Ticket not found"}), 404
+    if ticket.get("assigned_to") != user_id:
+        return Response(status=403)
+    changed = {k for k, v in updates.items() if k != "id" and ticket.get(k) != v}
+    if changed - TECHNICIAN_UPDATE_FIELDS:
+        return Response(status=403)
+    return None
 
 @main.route(API_TICKETS + '/update', methods=['PUT'])
 @authorized
-def update_ticket_priority():
-    ticket_update = request.json
+def update_ticket_priority(role: UserRoles, user_id: str):
+    ticket_update = request.get_json(silent=True)
+    if not isinstance(ticket_update, dict) or not isinstance(ticket_update.get("id"), str) or not ticket_update["id"]:
+        return jsonify({"success": False, "message": "id missing"}), 400
 
-    if db.update_ticket(ticket_update):
-        return jsonify({"success": True})
-    return Response(status=400)
+    # version of the ticket the client edited, a concurrent change is answered with 409
+    expected_version = ticket_update.pop("version", None)
+    if expected_version is not None and not isinstance(expected_version, int):
+        return jsonify({"success": False, "message": "Invalid version"}), 400
+
+    error = _ticket_edit_error(role, user_id, ticket_update)
+    if error is not None:
+        return error
+
+    try:
+        ticket = db.update_ticket(ticket_update, user_id, expected_version)
+    except db.TicketVersionConflict as e:
+        return jsonify({"success": False, "message": str(e), "ticket": e.ticket}), 409
+    except db.TicketNotFound as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"success": True, "ticket": ticket})
 
 @main.route(API_USERS, methods=['GET'])
 @authorized
+@versioned('users')
 def get_users():
     role = request.args.get('role')
     if role:
@@ -103,7 +278,7 @@ def about():
 
 @main.route(API_PHOTOS, methods=['PUT'])
 @authorized
-def put_photos(ticket_id: str):
+def put_photos(ticket_id: str, user_id: str):
 
     if not ticket_id:
         return jsonify({"error": "Ticket ID fehlt"}), 400
@@ -112,7 +287,7 @@ def put_photos(ticket_id: str):
         return jsonify({"error": "No file"}), 400
 
     file = request.files['file']
-    ret = db.upload_attachment(ticket_id, file)
+    ret = db.upload_attachment(ticket_id, file, user_id)
 
     return ret
 
@@ -123,6 +298,98 @@ def get_photos(ticket_id: str):
         return jsonify({"error": "Ticket ID fehlt"}), 400
     return jsonify({"success": True, "pictures": db.get_pictures(ticket_id)})
 
+@main.route(API_PHOTOS_BATCH, methods=['GET'])
+@authorized
+def get_photos_batch():
+    """Photos of many tickets in one request (prefetch of the visible tickets): ?ticket_ids=<id>,<id>,..."""
+    ticket_ids = [t for t in request.args.get("ticket_ids", "").split(",") if t]
+    if not ticket_ids:
+        return jsonify({"success": False, "message": "ticket_ids missing"}), 400
+    if len(ticket_ids) > current_app.config['PHOTO_BATCH_MAX']:
+        return jsonify({"success": False, "message": "Too many ticket_ids"}), 400
+    return jsonify({"success": True, "pictures": db.get_pictures_batch(ticket_ids)})
+
+@main.route(LOCAL_STORAGE_URL, methods=['GET'])
+def local_storage_file(bucket: str, file_path: str):
+    # only used by the sqlite / memory backends, supabase serves its public urls itself
+    result = db.get_storage_object(bucket, file_path)
+    if result is None:
+        return Response(status=404)
+    content, content_type = result
+    return Response(content, mimetype=content_type or 'application/octet-stream')
+
+@main.route(LOCAL_STORAGE_UPLOAD_URL, methods=['PUT'])
+def local_storage_upload(bucket: str, file_path: str):
+    # signed upload urls of the sqlite / memory backends, supabase storage takes the uploads itself
+    if (request.content_length or 0) > current_app.config['UPLOAD_MAX_SIZE']:
+        return jsonify({"error": "File is too large"}), 413
+    if not db.store_signed_upload(bucket, file_path, request.args.get("token", ""),
+                                  request.get_data(), request.mimetype or None):
+        return jsonify({"error": "Invalid or expired upload token"}), 403
+    return jsonify({"Key": f"{bucket}/{file_path}"})
+
+@main.route(API_UPLOADS, methods=['POST'])
+@authorized
+def create_uploads(role: UserRoles, user_id: str):
+    """
+    Signed upload urls for direct uploads to the photo bucket:
+    {"ticket_id": ..., "files": [{"file_name": ..., "mime_type": ..., "size": ...}]}
+    The client PUTs every file to its upload_url and records them with the upload tokens,
+    either in POST /api/uploads/finalize (ticket photos) or as "uploads" of save_update.
+    """
+    data = request.get_json(silent=True) or {}
+    ticket_id = data.get("ticket_id")
+    files = data.get("files")
+    if not ticket_id or not isinstance(ticket_id, str) or not isinstance(files, list) or not files:
+        return jsonify({"success": False, "message": "ticket_id and files required"}), 400
+    if len(files) > current_app.config['UPLOAD_MAX_FILES']:
+        return jsonify({"success": False, "message": "Too many files"}), 400
+    for f in files:
+        if not isinstance(f, dict) or not f.get("file_name") or not isinstance(f["file_name"], str):
+            return jsonify({"success": False, "message": "file_name missing"}), 400
+        if not isinstance(f.get("size"), int) or f["size"] > current_app.config['UPLOAD_MAX_SIZE']:
+            return jsonify({"success": False, "message": f"Invalid size of {f['file_name']}"}), 400
+        if not isinstance(f.get("mime_type") or "", str):
+            return jsonify({"success": False, "message": f"Invalid mime_type of {f['file_name']}"}), 400
+
+    # managers attach to any ticket, technicians to the tickets assigned to them
+    ticket = db.get_ticket_by_id(ticket_id)
+    if ticket is None:
+        return jsonify({"success": False, "message": "Ticket not found"}), 404
+    if role != UserRoles.MANAGER and ticket.get("assigned_to") != user_id:
+        return Response(status=403)
+
+    try:
+        uploads = db.create_upload_urls(ticket_id, user_id, files)
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+    return jsonify({"success": True, "uploads": uploads, "expires_in": current_app.config['UPLOAD_TOKEN_TTL']})
+
+@main.route(API_UPLOADS_FINALIZE, methods=['POST'])
+@authorized
+def finalize_uploads(user_id: str):
+    """Records finished direct uploads as ticket photos: {"ticket_id": ..., "uploads": [upload token, ...]}"""
+    data = request.get_json(silent=True) or {}
+    ticket_id = data.get("ticket_id")
+    upload_tokens = data.get("uploads")
+    if not ticket_id or not isinstance(upload_tokens, list) or not upload_tokens:
+        return jsonify({"success": False, "message": "ticket_id and uploads required"}), 400
+
+    uploaded = db.record_photo_uploads(ticket_id, user_id, upload_tokens)
+    return jsonify({"success": all(r["success"] for r in uploaded), "uploaded": uploaded})
+
+@main.route(API_PHOTO, methods=['DELETE'])
+@authorized
+def delete_photo(ticket_id: str, photo_id: str, role: UserRoles, user_id: str):
+    # managers delete any photo, everyone else only the ones they uploaded
+    try:
+        deleted = db.delete_picture(ticket_id, photo_id, None if role == UserRoles.MANAGER else user_id)
+    except PermissionError:
+        return Response(status=403)
+    if not deleted:
+        return jsonify({"success": False, "message": "Photo not found"}), 404
+    return jsonify({"success": True})
+
 @main.route(API_PROFILE, methods=['GET', 'POST'])
 def api_profile():
     auth = request.headers.get("Authorization")
@@ -130,10 +397,13 @@ def api_profile():
     if not auth or not auth.startswith("Bearer "):
         return {"error": "unauthorized"}, 401
 
-    token = auth.replace("Bearer ", "")
+    result = tokens.validate_token(auth.replace("Bearer ", ""))
+    if result is None:
+        return {"error": "unauthorized"}, 401
+    user_id = result[1]
 
     if request.method == "GET":
-        user = db.get_user_info(token)
+        user = db.get_user_info(user_id)
         if not user:
             return {"error": "not found"}, 404
 
@@ -156,7 +426,7 @@ def api_profile():
             return {"error": "name and email required"}, 400
 
         success = db.update_user(
-            token=token,
+            user_id=user_id,
             name=name,
             email=email,
             password=password
@@ -169,6 +439,10 @@ def api_profile():
 
 
 
+@main.route(METRICS_URL, methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # DEBUG ROUTES
 @main.route(DEBUG_URL + DEBUG_DUMP_USERS_URL, methods=['GET'])
 def dump_users():
@@ -182,13 +456,25 @@ def dump_tickets():
     print(tickets)
     return tickets
 
+@main.route(DEBUG_URL + DEBUG_TOKEN_REVOCATIONS_URL, methods=['GET'])
+def token_revocation_stats():
+    return tokens.revocation_stats()
+
+@main.route(DEBUG_URL + DEBUG_PHOTO_CACHE_URL, methods=['GET'])
+def photo_cache_stats():
+    return db.photo_cache_stats()
+
+@main.route(DEBUG_URL + DEBUG_TABLE_VERSIONS_URL, methods=['GET'])
+def table_versions_cache_stats():
+    return db.table_versions_cache_stats()
+
 @main.route('/history', methods=['GET'])
 def history_page():
     return render_template('history_log.html', hide_header_actions=True)
 
 @main.route(API_TICKETS + '/save_update', methods=['POST'])
 @authorized
-def save_ticket_update(user_id: str):
+async def save_ticket_update(role: UserRoles, user_id: str):
     ticket_id = request.form.get("ticket_id")
     if not ticket_id:
         return jsonify({"success": False, "message": "ticket_id missing"}), 400
@@ -208,33 +494,120 @@ def save_ticket_update(user_id: str):
     if description is not None:
         updates["description"] = description
 
-    if status_raw is not None and status_raw != "":
-        updates["status"] = int(status_raw)
-    if priority_raw is not None and priority_raw != "":
-        updates["priority"] = int(priority_raw)
+    try:
+        if status_raw is not None and status_raw != "":
+            updates["status"] = int(status_raw)
+        if priority_raw is not None and priority_raw != "":
+            updates["priority"] = int(priority_raw)
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid status or priority"}), 400
     if assigned_to_raw == "":
         updates["assigned_to"] = None
     elif assigned_to_raw is not None:
         updates["assigned_to"] = assigned_to_raw
 
+    error = _ticket_edit_error(role, user_id, updates)
+    if error is not None:
+        return error
+
     files = request.files.getlist("files")
+    # tokens of direct uploads (POST /api/uploads), attached like the files
+    upload_tokens = request.form.getlist("uploads")
+    # version of the ticket the client edited, a concurrent change is answered with 409
+    expected_version = request.form.get("version", type=int)
 
     try:
-        result = db.save_ticket_update_with_log(
+        result = await db_async.save_ticket_update_with_log(
             ticket_id=ticket_id,
             actor_user_id=user_id,
             updates=updates,
             note_text=message,
-            files=files
+            files=files,
+            expected_version=expected_version,
+            upload_tokens=upload_tokens,
         )
-        return jsonify({"success": True, "log": result["log"], "uploaded": result["uploaded"]})
+        return jsonify({"success": True, "log": result["log"], "uploaded": result["uploaded"],
+                        "ticket": result["ticket"]})
+    except db.TicketVersionConflict as e:
+        return jsonify({"success": False, "message": str(e), "ticket": e.ticket}), 409
+    except db.TicketNotFound as e:
+        return jsonify({"success": False, "message": str(e)}), 404
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 @main.route(API_TICKETS + '/history', methods=['GET'])
 @authorized
+@versioned('ticket_log_entries', 'tickets', 'ticket_attachments')
 def get_history():
     q = request.args.get("q")
-    rows = db.get_ticket_history(search=q)
-    return jsonify({"success": True, "entries": rows})
+    limit = request.args.get("limit", 200, type=int)
+    if limit < 1 or limit > 200:
+        return jsonify({"success": False, "message": "Invalid limit"}), 400
+
+    try:
+        rows, next_cursor = db.get_ticket_history(
+            search=q,
+            limit=limit,
+            cursor=request.args.get("cursor"),
+            changed_field=request.args.get("field"),
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    return jsonify({"success": True, "entries": rows, "next_cursor": next_cursor})
+
+EXPORT_CSV_COLUMNS = ("log_id", "ticket_id", "ticket_name", "updated_at", "assignee", "status", "priority",
+                      "update", "changes", "photos")
+
+def _export_ndjson(pages):
+    for rows in pages:
+        yield "".join(current_app.json.dumps(row) + "\n" for row in rows)
+
+def _export_csv(pages):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    for rows in pages:
+        for row in rows:
+            writer.writerow([
+                *(row[column] for column in EXPORT_CSV_COLUMNS[:-2]),
+                current_app.json.dumps(row["changes"]),
+                " ".join(photo["url"] for photo in row["photos"] if photo["url"]),
+            ])
+        # one chunk per page
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def _iso_datetime(value: str | None) -> str | None:
+    return datetime.fromisoformat(value).isoformat() if value else None
+
+@main.route(API_TICKETS + '/history/export', methods=['GET'])
+@authorized(roles=[UserRoles.MANAGER])
+def export_history():
+    """
+    Streams the history entries created in [from, to) (ISO dates), optionally of one ticket,
+    oldest first as NDJSON (default) or CSV (format=csv).
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({"success": False, "message": "Invalid format"}), 400
+    try:
+        since = _iso_datetime(request.args.get('from'))
+        until = _iso_datetime(request.args.get('to'))
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid date"}), 400
+
+    pages = db.export_ticket_history(since, until, request.args.get('ticket_id'),
+                                     current_app.config['EXPORT_BATCH_SIZE'])
+    if export_format == 'csv':
+        body, mimetype = _export_csv(pages), 'text/csv'
+    else:
+        body, mimetype = _export_ndjson(pages), 'application/x-ndjson'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=ticket_history.{export_format}'},
+    )
 
@@ -1,13 +1,50 @@
 // ensure headers exist in the options object
 const originalFetch = window.fetch;
+
+function withToken(options, token) {
+    const headers = { ...(options.headers || {}), Token: `${token}` };
+    // the profile api expects the token as bearer token
+    if (headers.Authorization) headers.Authorization = "Bearer " + token;
+    return { ...options, headers };
+}
+
+// access tokens expire after a few minutes, concurrent requests share one refresh
+let refreshInFlight = null;
+
+async function refreshAccessToken() {
+    const refreshToken = localStorage.getItem("refresh_token");
+    if (!refreshToken) return null;
+    if (!refreshInFlight) {
+        refreshInFlight = originalFetch("/api/auth/refresh", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ refresh_token: refreshToken }),
+        }).then(async (response) => {
+            if (!response.ok) return null;
+            const data = await response.json();
+            localStorage.setItem("token", data.token);
+            localStorage.setItem("refresh_token", data.refresh_token);
+            return data.token;
+        }).finally(() => {
+            refreshInFlight = null;
+        });
+    }
+    return refreshInFlight;
+}
+
+// the token is only sent to the app itself, not to the storage urls of direct uploads
+function isSameOrigin(url) {
+    return new URL(String(url), window.location.href).origin === window.location.origin;
+}
+
 window.fetch = async (url, options = {}) => {
     const token = localStorage.getItem("token");
     options.headers = options.headers || {};
-    if (token) {
-        options.headers = {
-            ...options.headers,
-            Token: `${token}`,
-        };
-    }
-    return originalFetch(url, options);
+    if (!token || !isSameOrigin(url)) return originalFetch(url, options);
+
+    const response = await originalFetch(url, withToken(options, token));
+    if (response.status !== 401 || String(url).startsWith("/api/auth/")) return response;
+
+    const refreshed = await refreshAccessToken();
+    return refreshed ? originalFetch(url, withToken(options, refreshed)) : response;
 };
@@ -1,6 +1,10 @@
 // state
 let techniciansCache = [];
+// technician id -> ticket counts per status, null when not available (technician view)
+let workloadCache = null;
 let ticketsCache = [];
+let ticketsNextCursor = null;
+let ticketsWatermark = null;
 let currentSidebarTicketId = null;
 let sidebarDraft = null;         
 let sidebarStagedFiles = [];     
@@ -12,6 +16,15 @@ let filters = {
 };
 
 let picturesLoadToken = 0;
+// ticket id -> { pictures, fetchedAt }, filled by the prefetch of the visible ticket cards
+const picturesCache = new Map();
+const PICTURES_CACHE_MS = 30000;
+const PICTURES_BATCH_MAX = 100;
+// bumped by every invalidation, a prefetch that overlapped one is not cached
+let picturesCacheGeneration = 0;
+let picturesPrefetchQueue = new Set();
+let picturesPrefetchTimer = null;
+let picturesObserver = null;
 
 // constants
 const STATUSES = [
@@ -31,14 +44,15 @@ const PRIORITIES = [
 
 // inits
 document.addEventListener('DOMContentLoaded', init);
-document.addEventListener('ticketCreated', loadTickets);
+document.addEventListener('ticketCreated', () => syncTickets());
 
 async function init() {
-    techniciansCache = await fetchTechnicians();
+    [techniciansCache, workloadCache] = await Promise.all([fetchTechnicians(), fetchWorkload()]);
     await loadTickets();
     setupShowTicketSidebarEventListener();
     setupSidebarEvents();
     initFilters();
+    subscribeTicketEvents();
 }
 
 function initFilters() {
@@ -62,14 +76,47 @@ async function fetchTechnicians() {
     }
 }
 
-async function loadTickets() {
+// counts are maintained on the server, only managers may read them
+async function fetchWorkload() {
     try {
-        const response = await fetch('/api/tickets');
+        const response = await fetch('/api/tickets/workload');
+        if (!response.ok) return null;
+        const data = await response.json();
+        return Object.fromEntries(data.technicians.map(t => [t.id, t.counts]));
+    } catch (error) {
+        console.error('Error fetching workload:', error);
+        return null;
+    }
+}
+
+// filters are applied on the server, the list is paginated with a cursor
+function buildTicketsQuery(cursor) {
+    const params = new URLSearchParams();
+
+    if (filters.technician === null) {
+        params.set('assigned_to', 'unassigned');
+    } else if (filters.technician) {
+        params.set('assigned_to', filters.technician);
+    }
+    if (filters.status) params.set('status', filters.status);
+    if (filters.priority) params.set('priority', filters.priority);
+    if (cursor) params.set('cursor', cursor);
+
+    const query = params.toString();
+    return query ? `/api/tickets?${query}` : '/api/tickets';
+}
+
+async function loadTickets(append = false) {
+    try {
+        const response = await fetch(buildTicketsQuery(append ? ticketsNextCursor : null));
         const data = await response.json();
         
         if (data.success) {
-            ticketsCache = data.tickets;
-            applyFilters();
+            ticketsCache = append ? ticketsCache.concat(data.tickets) : data.tickets;
+            ticketsNextCursor = data.next_cursor || null;
+            if (!append) ticketsWatermark = data.watermark || null;
+            renderTickets(ticketsCache);
+            updateLoadMoreButton();
             
             if (currentSidebarTicketId) {
                 showTicketSidebar(currentSidebarTicketId);
@@ -80,16 +127,131 @@ async function loadTickets() {
     }
 }
 
+// fetch only tickets changed since the last load/sync and patch them into the cache
+async function syncTickets() {
+    if (!ticketsWatermark) return loadTickets();
+
+    try {
+        const response = await fetch(`/api/tickets/changes?since=${encodeURIComponent(ticketsWatermark)}`);
+        const data = await response.json();
+        if (!data.success) return;
+
+        // deltas overlap (the server re-reads a few seconds before the watermark), tickets already
+        // cached in the same version are skipped
+        const changed = data.tickets.filter(ticket => {
+            const cached = ticketsCache.find(t => t.id === ticket.id);
+            return !cached || cached.version !== ticket.version || cached.updated_at !== ticket.updated_at;
+        });
+
+        for (const ticket of changed) {
+            // saves with attachments change the ticket too
+            invalidatePictures(ticket.id);
+            const idx = ticketsCache.findIndex(t => t.id === ticket.id);
+            if (!matchesFilters(ticket)) {
+                if (idx !== -1) ticketsCache.splice(idx, 1);
+            } else if (idx !== -1) {
+                ticketsCache[idx] = ticket;
+            } else if (!ticketsNextCursor) {
+                // new tickets are the newest ones, they belong on the last page
+                ticketsCache.push(ticket);
+            }
+        }
+
+        const removed = new Set(data.removed || []);
+        ticketsCache = ticketsCache.filter(t => !removed.has(t.id));
+        ticketsWatermark = data.watermark;
+        if (workloadCache) workloadCache = await fetchWorkload();
+
+        renderTickets(ticketsCache);
+        // only refresh the sidebar if its ticket changed, so an open draft is kept
+        if (currentSidebarTicketId && changed.some(t => t.id === currentSidebarTicketId)) {
+            showTicketSidebar(currentSidebarTicketId);
+        }
+    } catch (error) {
+        console.error('Error syncing tickets:', error);
+    }
+}
+
+function matchesFilters(ticket) {
+    if (filters.technician === null && ticket.assigned_to) return false;
+    if (filters.technician && ticket.assigned_to !== filters.technician) return false;
+    if (filters.status && ticket.status !== parseInt(filters.status)) return false;
+    if (filters.priority && ticket.priority !== parseInt(filters.priority)) return false;
+    return true;
+}
+
+// live updates: every event triggers (at most one running) delta sync
+let ticketEventsSource = null;
+let ticketSyncInFlight = false;
+let ticketSyncQueued = false;
+// a stream the server rejects (full, see EVENTS_MAX_SUBSCRIBERS) is retried later, polled meanwhile
+const TICKET_EVENTS_RETRY_MS = 30000;
+
+function subscribeTicketEvents() {
+    const token = localStorage.getItem("token");
+    if (!token || !window.EventSource) return;
+
+    const source = new EventSource(`/api/tickets/stream?token=${encodeURIComponent(token)}`);
+    let opened = false;
+    ticketEventsSource = source;
+    for (const type of ['ticket_created', 'ticket_updated', 'ticket_log', 'resync']) {
+        source.addEventListener(type, scheduleTicketSync);
+    }
+    source.addEventListener('open', () => { opened = true; });
+    // a reconnect with an expired access token is rejected, subscribe again with a refreshed one.
+    // A stream rejected right away (server full) is retried later, a delta sync catches up meanwhile
+    source.addEventListener('error', async () => {
+        if (source.readyState !== EventSource.CLOSED) return;
+        await refreshAccessToken();
+        scheduleTicketSync();
+        if (opened) subscribeTicketEvents();
+        else setTimeout(subscribeTicketEvents, TICKET_EVENTS_RETRY_MS * (0.5 + Math.random()));
+    });
+}
+
+async function scheduleTicketSync() {
+    if (ticketSyncInFlight) {
+        ticketSyncQueued = true;
+        return;
+    }
+
+    ticketSyncInFlight = true;
+    try {
+        await syncTickets();
+    } finally {
+        ticketSyncInFlight = false;
+        if (ticketSyncQueued) {
+            ticketSyncQueued = false;
+            scheduleTicketSync();
+        }
+    }
+}
+
+async function loadMoreTickets() {
+    if (!ticketsNextCursor) return;
+    await loadTickets(true);
+}
+
+function updateLoadMoreButton() {
+    const btn = document.getElementById('load-more-btn');
+    if (btn) btn.classList.toggle('hidden', !ticketsNextCursor);
+}
+
 async function updateTicket(ticket) {
+    // the server rejects the change with 409 if someone else changed the ticket since it was loaded
+    const version = ticketsCache.find(t => t.id === ticket.id)?.version;
     try {
         const response = await fetch('/api/tickets/update', {
             method: 'PUT',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(ticket)
+            body: JSON.stringify(version === undefined ? ticket : { ...ticket, version })
         });
         
         if (response.ok) {
-            await loadTickets();
+            await syncTickets();
+        } else if (response.status === 409) {
+            alert("This ticket was changed in the meantime, please check the current values and try again.");
+            await syncTickets();
         } else {
             console.error('Failed to update ticket');
         }
@@ -98,6 +260,67 @@ async function updateTicket(ticket) {
     }
 }
 
+function cachedPictures(ticketId) {
+  const entry = picturesCache.get(ticketId);
+  return entry && Date.now() - entry.fetchedAt < PICTURES_CACHE_MS ? entry.pictures : null;
+}
+
+function invalidatePictures(ticketId) {
+  picturesCacheGeneration++;
+  picturesCache.delete(ticketId);
+}
+
+// photo lists of the ticket cards scrolled into view are fetched in one batched request
+function observeTicketCards() {
+  if (!("IntersectionObserver" in window)) return;
+  if (!picturesObserver) {
+    picturesObserver = new IntersectionObserver(entries => {
+      for (const entry of entries) {
+        if (entry.isIntersecting) queuePicturesPrefetch(entry.target.dataset.ticketId);
+      }
+    });
+  }
+  picturesObserver.disconnect();
+  document.querySelectorAll('#tickets-container .ticket-card').forEach(card => picturesObserver.observe(card));
+}
+
+function queuePicturesPrefetch(ticketId) {
+  if (!ticketId || cachedPictures(ticketId)) return;
+  picturesPrefetchQueue.add(ticketId);
+  if (!picturesPrefetchTimer) picturesPrefetchTimer = setTimeout(prefetchPictures, 100);
+}
+
+async function prefetchPictures() {
+  picturesPrefetchTimer = null;
+  const ticketIds = Array.from(picturesPrefetchQueue);
+  picturesPrefetchQueue.clear();
+
+  for (let i = 0; i < ticketIds.length; i += PICTURES_BATCH_MAX) {
+    const batch = ticketIds.slice(i, i + PICTURES_BATCH_MAX);
+    const generation = picturesCacheGeneration;
+    try {
+      const response = await fetch(`/api/photos?ticket_ids=${batch.map(encodeURIComponent).join(",")}`);
+      const data = await response.json();
+      if (!data.success || generation !== picturesCacheGeneration) continue;
+
+      const fetchedAt = Date.now();
+      for (const [ticketId, pictures] of Object.entries(data.pictures)) {
+        picturesCache.set(ticketId, { pictures, fetchedAt });
+      }
+    } catch (error) {
+      console.error('Error prefetching pictures:', error);
+    }
+  }
+}
+
+function renderPictures(pics) {
+  for (const pic of pics) {
+    // small rendition when available, the original otherwise
+    const url = pic.thumbnail_url || pic.url || pic;
+    addPictureThumbnail(url);
+  }
+}
+
 async function loadPictures(ticketId) {
   const container = document.getElementById('sidebar-attachments');
   if (!container || !ticketId) return;
@@ -106,7 +329,14 @@ async function loadPictures(ticketId) {
 
   clearPictures();
 
+  const cached = cachedPictures(ticketId);
+  if (cached) {
+    renderPictures(cached);
+    return;
+  }
+
   try {
+    const generation = picturesCacheGeneration;
     const response = await fetch(`/api/photos/${ticketId}`);
     const data = await response.json();
 
@@ -114,11 +344,10 @@ async function loadPictures(ticketId) {
     if (!data.success) return;
 
     const pics = data.pictures || data.photos || [];
-
-    for (const pic of pics) {
-      const url = pic.url || pic;
-      addPictureThumbnail(url);
+    if (generation === picturesCacheGeneration) {
+      picturesCache.set(ticketId, { pictures: pics, fetchedAt: Date.now() });
     }
+    renderPictures(pics);
   } catch (error) {
       console.error('Error loading pictures:', error);
   }
@@ -212,19 +441,19 @@ document.addEventListener('click', closeAllMenus);
 function setFilterTechnician(technicianId) {
     filters.technician = technicianId;
     updateFilterUI();
-    applyFilters();
+    loadTickets();
 }
 
 function setFilterPriority(priority) {
     filters.priority = priority;
     updateFilterUI();
-    applyFilters();
+    loadTickets();
 }
 
 function setFilterStatus(status) {
     filters.status = status;
     updateFilterUI();
-    applyFilters();
+    loadTickets();
 }
 
 function toggleFilterTechnicianMenu(e) {
@@ -245,7 +474,7 @@ function toggleFilterPriorityMenu(e) {
 function clearFilters() {
     filters = { technician: '', status: '', priority: '' };
     updateFilterUI();
-    applyFilters();
+    loadTickets();
 }
 
 function updateFilterUI() {
@@ -289,26 +518,6 @@ function updateFilterUI() {
     document.getElementById('clear-filters-btn').classList.toggle('hidden', !hasFilters);
 }
 
-function applyFilters() {
-    let filtered = [...ticketsCache];
-    
-    if (filters.technician === null) {
-        filtered = filtered.filter(t => !t.assigned_to);
-    } else if (filters.technician) {
-        filtered = filtered.filter(t => t.assigned_to === filters.technician);
-    }
-    
-    if (filters.status) {
-        filtered = filtered.filter(t => t.status === parseInt(filters.status));
-    }
-    
-    if (filters.priority) {
-        filtered = filtered.filter(t => t.priority === parseInt(filters.priority));
-    }
-    
-    renderTickets(filtered);
-}
-
 // ===================
 // Ticket Card Functions
 // ===================
@@ -392,6 +601,8 @@ function renderTickets(tickets) {
         
         container.appendChild(clone);
     });
+
+    observeTicketCards();
 }
 
 // ===================
@@ -458,6 +669,8 @@ async function showTicketSidebar(ticketId) {
   // init draft
   sidebarDraft = {
     ticketId,
+    // sent with the full save, the server rejects it if someone else changed the ticket since
+    version: ticket.version,
     original: {
       name: ticket.name || "",
       description: ticket.description || "",
@@ -659,7 +872,8 @@ function addAssigneeButtonsToMenu(menu, onclickAction, isFilter) {
             event.stopPropagation();
             onclickAction(tech.id);
         };
-        techBtn.textContent = tech.name;
+        const counts = !isFilter && workloadCache ? workloadCache[tech.id] : null;
+        techBtn.textContent = counts ? `${tech.name} (${counts.open + counts.in_progress} active)` : tech.name;
 
         menu.appendChild(techBtn);
     }
@@ -723,6 +937,45 @@ function updateSaveButtonState() {
   btn.disabled = !hasDraftChanges();
 }
 
+// --- Direct uploads: files go to signed storage urls, save_update only gets their upload tokens ---
+async function uploadDirect(ticketId, files) {
+  const r = await fetch("/api/uploads", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      ticket_id: ticketId,
+      files: files.map(f => ({ file_name: f.name, mime_type: f.type, size: f.size })),
+    }),
+  });
+  const d = await r.json();
+  if (!r.ok || !d.success) throw new Error(d.message || "Could not create upload urls");
+
+  await Promise.all(d.uploads.map(async (u, i) => {
+    const put = await fetch(u.upload_url, {
+      method: "PUT",
+      headers: { "Content-Type": files[i].type || "application/octet-stream" },
+      body: files[i],
+    });
+    if (!put.ok) throw new Error(`Upload of ${files[i].name} failed`);
+  }));
+  return d.uploads.map(u => u.upload_token);
+}
+
+// falls back to sending the files with the form if the direct upload fails
+async function appendAttachments(formData, ticketId, files) {
+  if (!files.length) return;
+  try {
+    for (const token of await uploadDirect(ticketId, files)) {
+      formData.append("uploads", token);
+    }
+  } catch (e) {
+    console.error(e);
+    for (const f of files) {
+      formData.append("files", f, f.name);
+    }
+  }
+}
+
 // --- Auto-save (creates history log immediately) ---
 let sidebarAutoSaveInFlight = false;
 let sidebarAutoSaveQueued = null;
@@ -744,10 +997,6 @@ async function autoSaveSidebar({ status, priority, assigned_to } = {}, files = [
   // note text shown in history 
   formData.append("message", note ?? "");
 
-  for (const f of files) {
-    formData.append("files", f, f.name);
-  }
-
   // simple queue so fast clicks don't lose changes
   if (sidebarAutoSaveInFlight) {
     sidebarAutoSaveQueued = { patch: { status, priority, assigned_to }, files, note };
@@ -756,6 +1005,7 @@ async function autoSaveSidebar({ status, priority, assigned_to } = {}, files = [
 
   sidebarAutoSaveInFlight = true;
   try {
+    await appendAttachments(formData, ticketId, files);
     const r = await fetch("/api/tickets/save_update", { method: "POST", body: formData });
     const d = await r.json();
 
@@ -763,9 +1013,10 @@ async function autoSaveSidebar({ status, priority, assigned_to } = {}, files = [
       console.error("AutoSave failed:", d);
       return;
     }
+    if (files.length) invalidatePictures(ticketId);
 
     // refresh list + sidebar so draft/original stays in sync + photos reload
-    await loadTickets();
+    await syncTickets();
     await showTicketSidebar(ticketId);
   } catch (e) {
     console.error(e);
@@ -795,22 +1046,27 @@ async function saveSidebarChanges() {
   formData.append("priority", String(v.priority ?? ""));
   formData.append("assigned_to", v.assigned_to ?? "");
   formData.append("message", v.message ?? "");
-
-  for (const sf of sidebarStagedFiles) {
-    formData.append("files", sf.file, sf.file.name);
-  }
+  if (sidebarDraft.version !== undefined) formData.append("version", String(sidebarDraft.version));
 
   try {
+    await appendAttachments(formData, ticketId, sidebarStagedFiles.map(sf => sf.file));
     const r = await fetch("/api/tickets/save_update", {
       method: "POST",
       body: formData
     });
 
     const d = await r.json();
+    if (r.status === 409) {
+      alert("This ticket was changed in the meantime, please check the current values and save again.");
+      await syncTickets();
+      await showTicketSidebar(ticketId);
+      return;
+    }
     if (!r.ok || !d.success) {
       console.error("Save failed:", d);
       return;
     }
+    if (sidebarStagedFiles.length) invalidatePictures(ticketId);
 
     // reset draft message + staged
     const msgEl = document.getElementById("sidebar-update-message");
@@ -819,7 +1075,7 @@ async function saveSidebarChanges() {
     sidebarStagedFiles.forEach(x => URL.revokeObjectURL(x.url));
     sidebarStagedFiles = [];
 
-    await loadTickets();          
+    await syncTickets();
     await showTicketSidebar(ticketId);
   } catch (e) {
     console.error(e);
@@ -1,4 +1,5 @@
 let techniciansCache = [];
+let historyNextCursor = null;
 
 const STATUSES = [
   { text: 'All Status' },
@@ -61,36 +62,46 @@ function isMobile() {
 // Load ticket history from backend and render it:
 // - table rows into #history-body
 // - mobile cards into #history-cards (only when mobile)
-async function loadHistory() {
+// append=true loads the next page (cursor) below the current rows
+async function loadHistory(append = false) {
   const q = document.getElementById("history-search")?.value || "";
-  const url = q ? `/api/tickets/history?q=${encodeURIComponent(q)}` : "/api/tickets/history";
+  const params = new URLSearchParams();
+  if (q) params.set("q", q);
+  if (append && historyNextCursor) params.set("cursor", historyNextCursor);
+  const url = params.toString() ? `/api/tickets/history?${params}` : "/api/tickets/history";
 
   const body = document.getElementById("history-body");
   const cards = document.getElementById("history-cards");
-  if (cards) cards.innerHTML = `<div class="text-gray-500 text-sm">Loading...</div>`;
-
-  body.innerHTML = `<tr><td class="p-3 text-gray-500" colspan="8">Loading...</td></tr>`;
+  if (!append) {
+    if (cards) cards.innerHTML = `<div class="text-gray-500 text-sm">Loading...</div>`;
+    body.innerHTML = `<tr><td class="p-3 text-gray-500" colspan="8">Loading...</td></tr>`;
+  }
 
   try {
     const r = await fetch(url);
     const d = await r.json();
     if (!d.success) throw new Error(d.message || "failed");
 
-    if (!d.entries || d.entries.length === 0) {
+    historyNextCursor = d.next_cursor || null;
+    document.getElementById("history-load-more")?.classList.toggle("hidden", !historyNextCursor);
+
+    if (!append && (!d.entries || d.entries.length === 0)) {
       if (cards) cards.innerHTML = `<div class="text-gray-500 text-sm">No entries found.</div>`;
       body.innerHTML = `<tr><td class="p-3 text-gray-500" colspan="8">No entries found.</td></tr>`;
       return;
     }
 
 
-    body.innerHTML = "";
-    if (cards) cards.innerHTML = "";
+    if (!append) {
+      body.innerHTML = "";
+      if (cards) cards.innerHTML = "";
+    }
     for (const row of d.entries) {
       const created = formatVienna(row.ticket_created_at);
       const updated = formatVienna(row.updated_at);
 
       const photosHtml = (row.photos || []).slice(0, 3).map(p => `
-        <img src="${p.url}" class="w-10 h-10 object-cover rounded border cursor-pointer"
+        <img src="${p.thumbnail_url || p.url}" class="w-10 h-10 object-cover rounded border cursor-pointer"
              onclick="window.open('${p.url}','_blank')" alt="photo">
       `).join("");
 
@@ -109,7 +120,7 @@ async function loadHistory() {
         <td class="p-3">
             <div class="flex flex-wrap gap-2 max-w-[220px] overflow-hidden">
                 ${(row.photos || []).slice(0, 6).map(p => `
-                <img src="${p.url}"
+                <img src="${p.thumbnail_url || p.url}"
                     class="w-12 h-12 object-cover rounded border cursor-pointer block"
                     style="max-width:48px; max-height:48px;"
                     onclick="window.open('${p.url}','_blank')" alt="photo">
@@ -175,7 +186,7 @@ function renderMobileCard(row) {
   div.className = "border border-gray-200 rounded-xl p-3 bg-white shadow-sm";
 
   const photos = (row.photos || []).slice(0, 4).map(p => `
-    <img src="${p.url}"
+    <img src="${p.thumbnail_url || p.url}"
          class="w-8 h-8 object-cover rounded-lg border flex-none"
          onclick="event.stopPropagation(); window.open('${p.url}','_blank')"
          alt="photo">
@@ -13,6 +13,7 @@ loginForm.addEventListener("submit", async (e) => {
 
     if (data.success) {
         localStorage.setItem("token", data.token);
+        localStorage.setItem("refresh_token", data.refresh_token);
         localStorage.setItem("role", data.role);
         window.location.href = "/dashboard/" + data.role; // redirect after login
     } else {
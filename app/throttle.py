@@ -0,0 +1,39 @@
+"""
+Login throttling: failed attempts are counted per account (email) and per client address.
+Once either count reaches its limit further attempts are rejected until no attempt
+failed for `window` seconds. The counters live in the worker process.
+"""
+import threading
+
+from .cache import TTLCache
+
+
+class LoginThrottle:
+    def __init__(self, max_per_account: int = 5, max_per_address: int = 50, window: float = 300,
+                 maxsize: int = 10000):
+        self.max_per_account = max_per_account
+        self.max_per_address = max_per_address
+        self.window = window
+        self._failures = TTLCache(maxsize=maxsize, ttl=window)
+        self._lock = threading.Lock()
+
+    def blocked(self, email: str, address: str | None) -> bool:
+        return ((self._failures.get(("account", email.lower())) or 0) >= self.max_per_account
+                or (self._failures.get(("address", address)) or 0) >= self.max_per_address)
+
+    def failed(self, email: str, address: str | None) -> None:
+        with self._lock:
+            for key in (("account", email.lower()), ("address", address)):
+                self._failures.set(key, (self._failures.get(key) or 0) + 1)
+
+    def succeeded(self, email: str) -> None:
+        self._failures.invalidate(("account", email.lower()))
+
+    def configure(self, max_per_account: int, max_per_address: int, window: float) -> None:
+        self.max_per_account = max_per_account
+        self.max_per_address = max_per_address
+        self.window = window
+        self._failures.ttl = window
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,48 @@
+"""
+Downscaled WebP renditions of uploaded photos, stored next to the originals.
+Pillow is optional: without it no renditions are created and the original urls are used.
+"""
+import io
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# rendition name -> longest edge in pixels
+RENDITIONS = {
+    "thumbnail": 256,
+    "medium": 1024,
+}
+WEBP_QUALITY = 75
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def is_image(mime_type: str | None) -> bool:
+    return bool(mime_type) and mime_type.startswith("image/") and mime_type != "image/svg+xml"
+
+
+def rendition_path(storage_path: str, name: str) -> str:
+    return f"{os.path.splitext(storage_path)[0]}.{name}.webp"
+
+
+def render(content: bytes) -> dict[str, bytes]:
+    """Returns the encoded WebP renditions of an image, keyed by rendition name."""
+    with Image.open(io.BytesIO(content)) as image:
+        # phone photos carry their rotation in the EXIF data
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        renditions = {}
+        for name, size in RENDITIONS.items():
+            copy = image.copy()
+            copy.thumbnail((size, size))
+            buffer = io.BytesIO()
+            copy.save(buffer, "WEBP", quality=WEBP_QUALITY)
+            renditions[name] = buffer.getvalue()
+        return renditions
@@ -0,0 +1,127 @@
+"""
+Signed tokens: "<payload>.<signature>", both base64url, the payload is a JSON object with
+"typ" and "exp" (unix time) and the signature an HMAC-SHA256 of it with Config.SECRET_KEY.
+Session (access) tokens carry {"sub": user id, "role": UserRoles value, "jti": token id},
+upload tokens (app/db.py, direct uploads) the storage path they allow to record.
+
+Access tokens are checked without a backend call and expire after ACCESS_TOKEN_TTL.
+The refresh token is the opaque `users.token` column, it is exchanged (and rotated)
+for a new pair in POST /api/auth/refresh. Logging out revokes the access token until
+it expires: the jti is stored in the revoked_tokens table and every worker re-reads the
+unexpired revocations at most every TOKEN_REVOCATION_SYNC seconds, so a logged out token
+is rejected everywhere after that delay, in the worker that handled the logout at once.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from . import db
+from .cache import TTLCache
+from .models import UserRoles
+from config import Config
+
+# jti -> True until the token would have expired anyway
+_revoked = TTLCache(maxsize=Config.TOKEN_REVOCATION_LIST_SIZE, ttl=Config.ACCESS_TOKEN_TTL)
+# monotonic time of the last read of revoked_tokens, one request thread reads at a time
+_revocations_synced_at = float("-inf")
+_revocations_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(Config.SECRET_KEY.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def sign_claims(typ: str, claims: dict, ttl: float) -> str:
+    payload = _b64encode(json.dumps(
+        {"typ": typ, **claims, "exp": int(time.time() + ttl)}, separators=(",", ":")
+    ).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_claims(typ: str, token: str | None) -> dict | None:
+    """Returns the payload of a token of this type with a valid signature that hasn't expired, None otherwise."""
+    claims = _claims(token)
+    if claims is None or claims.get("typ") != typ:
+        return None
+    return claims
+
+
+def issue_access_token(user_id: str, role: UserRoles) -> str:
+    return sign_claims("access", {"sub": user_id, "role": role.value, "jti": uuid.uuid4().hex},
+                       Config.ACCESS_TOKEN_TTL)
+
+
+def _claims(token: str | None) -> dict | None:
+    if not token or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    # compared as bytes, compare_digest rejects str with non-ASCII characters
+    if not hmac.compare_digest(signature.encode(), _sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) <= time.time():
+        return None
+    return claims
+
+
+def _sync_revocations() -> None:
+    """Adds the revocations of the other workers, read at most every TOKEN_REVOCATION_SYNC seconds."""
+    global _revocations_synced_at
+    if time.monotonic() - _revocations_synced_at < Config.TOKEN_REVOCATION_SYNC:
+        return
+    if not _revocations_lock.acquire(blocking=False):
+        return
+    try:
+        # also after a failed read, an unavailable backend isn't asked on every request
+        _revocations_synced_at = time.monotonic()
+        for jti in db.get_revoked_tokens():
+            _revoked.set(jti, True)
+    except Exception:
+        logger.exception("reading the token revocations failed")
+    finally:
+        _revocations_lock.release()
+
+
+def validate_token(token: str | None) -> tuple[UserRoles, str] | None:
+    claims = verify_claims("access", token)
+    if claims is None:
+        return None
+    _sync_revocations()
+    if _revoked.get(claims.get("jti")):
+        return None
+    role = UserRoles.get_role_by_id(claims.get("role"))
+    if role is None:
+        return None
+    return role, claims.get("sub")
+
+
+def revoke(token: str | None) -> bool:
+    claims = verify_claims("access", token)
+    if claims is None:
+        return False
+    _revoked.set(claims.get("jti"), True)
+    db.revoke_access_token(claims.get("jti"), datetime.fromtimestamp(claims["exp"]))
+    return True
+
+
+def revocation_stats() -> dict:
+    return _revoked.stats()
@@ -0,0 +1,271 @@
+"""
+Offline benchmark / load test for the API routes.
+
+    python -m benchmarks.run --dataset 100k --latency-ms 20 --concurrency 8
+    python -m benchmarks.run --dataset 1k --baseline benchmarks/baseline.json
+
+By default the app runs in-process (Flask test client) on the in-memory SQLite engine,
+SIMULATED_LATENCY_MS adds a fixed round trip to every backend call to approximate the
+remote Supabase instance. With --url the requests go to a running server instead, seed
+its database first with --seed-only --sqlite-path <file> and start the server with
+STORAGE_BACKEND=sqlite SQLITE_PATH=<file>.
+
+Reports p50 / p95 / p99 latency and req/s per scenario. --save-baseline writes the
+results to a JSON file, --baseline compares against one and exits with status 1 when a
+scenario regresses by more than --threshold.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlencode, urlsplit
+
+DATASETS = {
+    # name -> (tickets, log entries)
+    "1k": (1_000, 5_000),
+    "100k": (100_000, 500_000),
+    "1m": (1_000_000, 5_000_000),
+}
+WARMUP_REQUESTS = 10
+
+
+def multipart(fields: dict, files: list[tuple[str, str, str, bytes]]) -> tuple[bytes, str]:
+    """Encodes form fields and (field, file name, mime type, content) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, file_name, mime_type, content in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{file_name}"\r\n'
+            f'Content-Type: {mime_type}\r\n\r\n'.encode() + content + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def scenarios(fixture: dict) -> dict:
+    """name -> function building (method, path, headers, body) for one request."""
+    manager = {"Token": fixture["manager_token"]}
+    technician = {"Token": fixture["technician_token"]}
+    ticket_ids = fixture["ticket_ids"]
+
+    def save_update():
+        # random payload bytes, so every upload stores a new blob
+        body, content_type = multipart(
+            {"ticket_id": random.choice(ticket_ids), "status": random.randint(1, 3), "message": "benchmark"},
+            [("files", "report.bin", "application/octet-stream", os.urandom(2048))])
+        return "POST", "/api/tickets/save_update", {**manager, "Content-Type": content_type}, body
+
+    def put_photo():
+        body, content_type = multipart(
+            {}, [("file", "photo.bin", "application/octet-stream", os.urandom(2048))])
+        return "PUT", f"/api/photos/{random.choice(ticket_ids)}", {**manager, "Content-Type": content_type}, body
+
+    def bulk_reassign():
+        # end of shift: 50 tickets handed over to one technician
+        body = json.dumps({"tickets": [
+            {"id": ticket_id, "assigned_to": fixture["technician_id"], "status": random.randint(1, 3)}
+            for ticket_id in ticket_ids
+        ], "message": "shift handover"}).encode()
+        return "POST", "/api/tickets/bulk", {**manager, "Content-Type": "application/json"}, body
+
+    def login():
+        body = urlencode({"email": random.choice(fixture["emails"]), "password": fixture["password"]}).encode()
+        return "POST", "/login", {"Content-Type": "application/x-www-form-urlencoded"}, body
+
+    return {
+        "tickets_manager": lambda: ("GET", "/api/tickets", manager, None),
+        "tickets_technician": lambda: ("GET", "/api/tickets", technician, None),
+        "history": lambda: ("GET", "/api/tickets/history?limit=50", manager, None),
+        "history_search": lambda: ("GET", "/api/tickets/history?limit=50&q=Pump", manager, None),
+        "save_update": save_update,
+        "photos_get": lambda: ("GET", f"/api/photos/{random.choice(ticket_ids)}", manager, None),
+        "photos_put": put_photo,
+        "bulk_reassign": bulk_reassign,
+        "login": login,
+    }
+
+
+class TestClientSession:
+    """Sends requests through the Flask test client of an in-process app."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, headers: dict, body: bytes | None) -> int:
+        return self.client.open(path, method=method, headers=headers, data=body).status_code
+
+
+class HTTPSession:
+    """Sends requests over one keep-alive connection to a running server."""
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+
+    def request(self, method: str, path: str, headers: dict, body: bytes | None) -> int:
+        self.connection.request(method, path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+
+def percentile(values: list[float], q: float) -> float:
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def run_scenario(new_session, build_request, requests: int, concurrency: int) -> dict:
+    sessions = [new_session() for _ in range(concurrency)]
+    for _ in range(WARMUP_REQUESTS):
+        sessions[0].request(*build_request())
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def worker(session):
+        nonlocal errors
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            method, path, headers, body = build_request()
+            start = time.perf_counter()
+            status = session.request(method, path, headers, body)
+            duration = time.perf_counter() - start
+            with lock:
+                latencies.append(duration)
+                if status >= 400:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(s,)) for s in sessions]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Returns the scenarios whose p95 or throughput got worse than the baseline by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: {base['rps']} req/s -> {result['rps']} req/s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dataset", choices=DATASETS, default="1k")
+    parser.add_argument("--latency-ms", type=float, default=0, help="simulated latency per backend call")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--hash-cost", type=int, help="password hash work factor (PASSWORD_HASH_COST)")
+    parser.add_argument("--scenario", action="append", help="only run these scenarios (repeatable)")
+    parser.add_argument("--url", help="benchmark a running server instead of an in-process app")
+    parser.add_argument("--sqlite-path", help="database file, default is an in-memory database")
+    parser.add_argument("--seed-only", action="store_true", help="seed --sqlite-path and exit")
+    parser.add_argument("--save-baseline", metavar="FILE")
+    parser.add_argument("--baseline", metavar="FILE")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed regression, 0.2 = 20%%")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    # config.Config reads the environment on import
+    os.environ["STORAGE_BACKEND"] = "sqlite" if args.sqlite_path else "memory"
+    if args.sqlite_path:
+        os.environ["SQLITE_PATH"] = args.sqlite_path
+    os.environ["SIMULATED_LATENCY_MS"] = str(args.latency_ms)
+    os.environ.setdefault("SLOW_REQUEST_MS", "0")
+    if args.hash_cost:
+        os.environ["PASSWORD_HASH_COST"] = str(args.hash_cost)
+
+    from app import create_app
+    from app.backends import get_client
+    from . import seed
+
+    app = create_app()
+    tickets, log_entries = DATASETS[args.dataset]
+
+    with app.app_context():
+        client = get_client()
+        if args.url and not args.seed_only:
+            fixture = seed.load_fixture(client)
+        else:
+            start = time.perf_counter()
+            fixture = seed.seed(client, tickets, log_entries)
+            print(f"seeded {tickets} tickets, {log_entries} log entries in {time.perf_counter() - start:.1f}s")
+    if args.seed_only:
+        return 0
+
+    if args.url:
+        new_session = lambda: HTTPSession(args.url)
+    else:
+        new_session = lambda: TestClientSession(app)
+
+    all_scenarios = scenarios(fixture)
+    names = args.scenario or list(all_scenarios)
+    results = {}
+    print(f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    for name in names:
+        result = run_scenario(new_session, all_scenarios[name], args.requests, args.concurrency)
+        results[name] = result
+        print(f"{name:<20}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+              f"{result['rps']:>10}{result['errors']:>8}")
+
+    report = {
+        "dataset": args.dataset,
+        "hash_cost": int(os.environ.get("PASSWORD_HASH_COST") or 14),
+        "latency_ms": args.latency_ms,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "target": args.url or "in-process",
+        "scenarios": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ("dataset", "hash_cost", "latency_ms", "concurrency", "target"):
+            if baseline.get(key) != report[key]:
+                print(f"WARNING baseline was measured with {key}={baseline.get(key)}, this run uses {report[key]}")
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
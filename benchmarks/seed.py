@@ -0,0 +1,140 @@
+"""
+Seeds a local (sqlite / memory) backend with a synthetic dataset for the benchmarks.
+Rows are written with executemany straight into the SQLite connection in batches,
+with fsync switched off while seeding.
+"""
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from app import passwords, tokens
+from app.backends.sqlite_backend import SQLiteClient
+from app.models import UserRoles
+
+BATCH_SIZE = 10_000
+PASSWORD = "bench"
+TECHNICIANS = 20
+PHOTO_TICKETS = 50
+NAMES = ("Pump", "Valve", "Conveyor", "Compressor", "Boiler", "Elevator", "Generator", "Forklift")
+
+
+def unwrap(client) -> SQLiteClient:
+    """Returns the SQLite engine behind the instrumented / latency wrappers."""
+    while not isinstance(client, SQLiteClient):
+        if not hasattr(client, "client"):
+            raise RuntimeError("benchmarks need the sqlite or memory storage backend")
+        client = client.client
+    return client
+
+
+def _batches(rows, size: int = BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(client: SQLiteClient, table: str, columns: tuple[str, ...], rows) -> None:
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for batch in _batches(rows):
+        with client.transaction() as conn:
+            conn.executemany(sql, batch)
+
+
+def seed(client, tickets: int, log_entries: int, rng: random.Random | None = None) -> dict:
+    """
+    Writes one manager, TECHNICIANS technicians, `tickets` tickets and `log_entries` log entries
+    (every tenth with an attachment) plus three photos for PHOTO_TICKETS tickets.
+    Returns the tokens and ids the benchmark scenarios need.
+    """
+    client = unwrap(client)
+    rng = rng or random.Random(42)
+    now = datetime.now()
+    client.fetchone("PRAGMA synchronous=OFF")
+
+    manager = {"id": str(uuid.uuid4()), "token": uuid.uuid4().hex}
+    technicians = [{"id": str(uuid.uuid4()), "token": uuid.uuid4().hex} for _ in range(TECHNICIANS)]
+    # one hash (and salt) for all users, the login benchmark only measures verification
+    password_hash = passwords.hash_password(PASSWORD)
+    _insert(client, "users", ("id", "name", "email", "password", "token", "role", "created_at"), [
+        (u["id"], f"user {i}", f"user{i}@bench.local", password_hash, u["token"], 1 if i == 0 else 2, now.isoformat())
+        for i, u in enumerate([manager] + technicians)
+    ])
+
+    ticket_ids = [str(uuid.uuid4()) for _ in range(tickets)]
+
+    def ticket_rows():
+        for i, ticket_id in enumerate(ticket_ids):
+            created_at = (now - timedelta(minutes=tickets - i)).isoformat()
+            assignee = rng.choice(technicians)["id"] if rng.random() < 0.9 else None
+            yield (ticket_id, f"{rng.choice(NAMES)} {i}", f"Maintenance of machine {i}",
+                   rng.randint(1, 3), rng.randint(1, 3), manager["id"], assignee, created_at, created_at)
+
+    _insert(client, "tickets", ("id", "name", "description", "priority", "status", "created_by",
+                                "assigned_to", "created_at", "updated_at"), ticket_rows())
+
+    attachments = []
+
+    def log_rows():
+        for i in range(log_entries):
+            log_id = str(uuid.uuid4())
+            ticket_id = rng.choice(ticket_ids)
+            old_status, new_status = rng.randint(1, 3), rng.randint(1, 3)
+            changes = [{"field": "status", "from": old_status, "to": new_status}] if old_status != new_status else []
+            payload = {"version": 1, "note": f"note {i}", "changes": changes}
+            created_at = (now - timedelta(seconds=log_entries - i)).isoformat()
+            if i % 10 == 0:
+                attachments.append((str(uuid.uuid4()), ticket_id, log_id, manager["id"],
+                                    f"bench/{log_id}.jpg", "photo.jpg", "image/jpeg", 1024, created_at))
+            yield (log_id, ticket_id, manager["id"], "update", payload["note"], old_status, new_status,
+                   json.dumps(payload), json.dumps([c["field"] for c in changes]), created_at)
+
+    _insert(client, "ticket_log_entries", ("id", "ticket_id", "actor_user_id", "action_type", "message",
+                                           "old_status", "new_status", "payload", "changed_fields",
+                                           "created_at"), log_rows())
+    _insert(client, "ticket_attachments", ("id", "ticket_id", "log_entry_id", "uploaded_by", "storage_path",
+                                           "file_name", "mime_type", "file_size", "created_at"), attachments)
+
+    photo_tickets = ticket_ids[-PHOTO_TICKETS:]
+    _insert(client, "ticket_photos", ("id", "ticket_id", "url", "file_path", "created_at"), [
+        (str(uuid.uuid4()), ticket_id, f"/storage/photo_bucket/bench/{ticket_id}/{n}.jpg",
+         f"bench/{ticket_id}/{n}.jpg", now.isoformat())
+        for ticket_id in photo_tickets for n in range(3)
+    ])
+
+    client.fetchone("PRAGMA synchronous=NORMAL")
+    return {
+        "manager_token": tokens.issue_access_token(manager["id"], UserRoles.MANAGER),
+        "technician_token": tokens.issue_access_token(technicians[0]["id"], UserRoles.TECHNICIAN),
+        "technician_id": technicians[0]["id"],
+        "ticket_ids": photo_tickets,
+        "emails": [f"user{i}@bench.local" for i in range(TECHNICIANS + 1)],
+        "password": PASSWORD,
+    }
+
+
+def load_fixture(client) -> dict:
+    """Reads the ids of an already seeded database and signs tokens for them (for runs against a live server)."""
+    client = unwrap(client)
+    manager = client.fetchone("SELECT id FROM users WHERE role = 1 AND email LIKE '%@bench.local' LIMIT 1")
+    technician = client.fetchone("SELECT id FROM users WHERE role = 2 AND email LIKE '%@bench.local' LIMIT 1")
+    if manager is None or technician is None:
+        raise RuntimeError("database is not seeded, run the benchmark with --seed-only first")
+    with client.transaction() as conn:
+        ticket_ids = [r[0] for r in conn.execute(
+            "SELECT DISTINCT ticket_id FROM ticket_photos WHERE file_path LIKE 'bench/%' LIMIT ?", (PHOTO_TICKETS,))]
+    with client.transaction() as conn:
+        emails = [r[0] for r in conn.execute("SELECT email FROM users WHERE email LIKE '%@bench.local'")]
+    return {
+        "manager_token": tokens.issue_access_token(manager["id"], UserRoles.MANAGER),
+        "technician_token": tokens.issue_access_token(technician["id"], UserRoles.TECHNICIAN),
+        "technician_id": technician["id"],
+        "ticket_ids": ticket_ids,
+        "emails": emails,
+        "password": PASSWORD,
+    }
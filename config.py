@@ -2,4 +2,88 @@ import os
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'mysecretkey'
-    DEBUG = True
+    # debug mode (reloader, debugger) only for the development server
+    DEBUG = (os.environ.get('DEBUG') or 'false').lower() == 'true'
+
+    # storage backend: "supabase", "sqlite" (file at SQLITE_PATH) or "memory"
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND') or 'supabase'
+    SQLITE_PATH = os.environ.get('SQLITE_PATH') or 'maintenance_tracker.db'
+    SUPABASE_URL = os.environ.get('SUPABASE_URL') or 'your_supabase_url'
+    SUPABASE_KEY = os.environ.get('SUPABASE_ANON_KEY') or 'your_supabase_anon_key'
+    # pooled keep-alive connections of each worker to the Supabase API
+    BACKEND_POOL_SIZE = int(os.environ.get('BACKEND_POOL_SIZE') or 20)
+    BACKEND_KEEPALIVE = float(os.environ.get('BACKEND_KEEPALIVE') or 30)
+    BACKEND_TIMEOUT = float(os.environ.get('BACKEND_TIMEOUT') or 10)
+    # delay added to every backend call (benchmarks / load tests against a local engine)
+    SIMULATED_LATENCY_MS = float(os.environ.get('SIMULATED_LATENCY_MS') or 0)
+
+    # GET /api/tickets pagination
+    TICKETS_PAGE_SIZE = int(os.environ.get('TICKETS_PAGE_SIZE') or 50)
+    TICKETS_MAX_PAGE_SIZE = int(os.environ.get('TICKETS_MAX_PAGE_SIZE') or 200)
+    # GET /api/tickets/changes re-reads this many seconds before the watermark: updated_at is taken
+    # before the write commits (and from the clocks of several app servers), a write in flight while
+    # the watermark was taken is reported by the next delta instead of being lost
+    DELTA_SYNC_OVERLAP = float(os.environ.get('DELTA_SYNC_OVERLAP') or 10)
+
+    # GET /api/tickets/history/export, log entries per backend page
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 500)
+
+    # POST /api/tickets/bulk, most items per request
+    BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS') or 200)
+
+    # GET /api/search page size
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE') or 20)
+    SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE') or 100)
+
+    # responses smaller than this are sent uncompressed, larger ones with brotli or gzip
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE') or 1024)
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL') or 6)
+    BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY') or 4)
+    # seconds the table versions behind the ETags of @versioned views are cached per worker,
+    # writes through the worker invalidate them right away
+    TABLE_VERSIONS_TTL = float(os.environ.get('TABLE_VERSIONS_TTL') or 1)
+
+    # live updates (GET /api/tickets/stream)
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE') or 100)
+    # every open stream holds a worker thread, by default a quarter of the threads (WEB_THREADS in
+    # gunicorn.conf.py) stays free for API requests, dashboards beyond the limit poll instead
+    EVENTS_MAX_SUBSCRIBERS = int(os.environ.get('EVENTS_MAX_SUBSCRIBERS')
+                                 or int(os.environ.get('WEB_THREADS') or 32) * 3 // 4)
+    EVENTS_HEARTBEAT = float(os.environ.get('EVENTS_HEARTBEAT') or 15)
+
+    # ticket id -> photo list cache of GET /api/photos, per worker, writes of the worker invalidate it
+    PHOTO_CACHE_SIZE = int(os.environ.get('PHOTO_CACHE_SIZE') or 4096)
+    PHOTO_CACHE_TTL = float(os.environ.get('PHOTO_CACHE_TTL') or 30)
+    # most ticket ids per GET /api/photos?ticket_ids=...
+    PHOTO_BATCH_MAX = int(os.environ.get('PHOTO_BATCH_MAX') or 100)
+
+    # threads uploading attachments to the storage bucket
+    UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS') or 8)
+    # direct uploads (POST /api/uploads): seconds an upload token can be recorded, largest file
+    # and most files per request
+    UPLOAD_TOKEN_TTL = int(os.environ.get('UPLOAD_TOKEN_TTL') or 600)
+    UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE') or 20 * 1024 * 1024)
+    UPLOAD_MAX_FILES = int(os.environ.get('UPLOAD_MAX_FILES') or 20)
+    # threads running the blocking backend calls of the async views (app/db_async.py)
+    QUERY_WORKERS = int(os.environ.get('QUERY_WORKERS') or 16)
+    # threads creating thumbnail / medium renditions of uploaded photos
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS') or 2)
+
+    # request / db / backend call metrics on /metrics, 0 disables the slow request log
+    METRICS_ENABLED = (os.environ.get('METRICS_ENABLED') or 'true').lower() == 'true'
+    SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS') or 500)
+
+    # scrypt work factor (log2 of n), raising it upgrades the hashes on the next login
+    PASSWORD_HASH_COST = int(os.environ.get('PASSWORD_HASH_COST') or 14)
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 2)
+    # failed logins per account / client address before further attempts are rejected
+    LOGIN_MAX_FAILURES = int(os.environ.get('LOGIN_MAX_FAILURES') or 5)
+    LOGIN_MAX_FAILURES_PER_ADDRESS = int(os.environ.get('LOGIN_MAX_FAILURES_PER_ADDRESS') or 50)
+    LOGIN_THROTTLE_WINDOW = float(os.environ.get('LOGIN_THROTTLE_WINDOW') or 300)
+
+    # lifetime of the signed access tokens, refreshed with the (rotating) refresh token
+    ACCESS_TOKEN_TTL = float(os.environ.get('ACCESS_TOKEN_TTL') or 900)
+    # logged out access tokens remembered until they expire
+    TOKEN_REVOCATION_LIST_SIZE = int(os.environ.get('TOKEN_REVOCATION_LIST_SIZE') or 10000)
+    # seconds between reads of the revocations of other workers / servers (revoked_tokens table)
+    TOKEN_REVOCATION_SYNC = float(os.environ.get('TOKEN_REVOCATION_SYNC') or 5)
@@ -0,0 +1,28 @@
+"""
+gunicorn settings for production, every value can be overridden from the environment.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+
+bind = os.environ.get("BIND") or f"0.0.0.0:{os.environ.get('PORT') or 8000}"
+# one process: the live update hub (app/events.py), the login throttle and the photo cache are
+# in-process, with more workers a dashboard only sees the changes handled by its own worker
+workers = int(os.environ.get("WEB_WORKERS") or 1)
+# threaded workers: requests mostly wait on backend round trips, and the live update
+# stream (/api/tickets/stream) holds one thread per open dashboard. Streams are limited to
+# EVENTS_MAX_SUBSCRIBERS (default 3/4 of the threads), the rest stays free for API requests.
+worker_class = os.environ.get("WEB_WORKER_CLASS") or "gthread"
+threads = int(os.environ.get("WEB_THREADS") or 32)
+keepalive = int(os.environ.get("WEB_KEEPALIVE") or 5)
+timeout = int(os.environ.get("WEB_TIMEOUT") or 60)
+# the app is imported once in the master, workers start faster and share its memory
+preload_app = (os.environ.get("WEB_PRELOAD") or "true").lower() == "true"
+accesslog = os.environ.get("WEB_ACCESS_LOG") or None
+
+
+def post_fork(server, worker):
+    # connections (sqlite handle, HTTP pool) must not be shared between processes,
+    # each worker builds its own backend client on first use
+    from app.backends import reset_client
+    reset_client()
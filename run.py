@@ -3,4 +3,5 @@ from app import create_app
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # development server, production runs wsgi:app under gunicorn (see gunicorn.conf.py)
+    app.run(debug=app.config['DEBUG'])
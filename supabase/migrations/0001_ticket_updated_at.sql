@@ -0,0 +1,14 @@
+-- updated_at watermark used by GET /api/tickets/changes
+alter table tickets add column if not exists updated_at timestamp;
+update tickets set updated_at = created_at where updated_at is null;
+create index if not exists idx_tickets_updated_at on tickets (updated_at);
+create index if not exists idx_tickets_assigned_to_updated_at on tickets (assigned_to, updated_at);
+
+-- tickets reassigned away from a technician, reported as removed in their delta feed
+create table if not exists ticket_tombstones (
+    id uuid primary key default gen_random_uuid(),
+    ticket_id uuid not null references tickets (id) on delete cascade,
+    user_id uuid not null references users (id) on delete cascade,
+    created_at timestamp not null default now()
+);
+create index if not exists idx_tombstones_user_id on ticket_tombstones (user_id, created_at);
@@ -0,0 +1,6 @@
+-- structured change set of a log entry, message only keeps the note text
+alter table ticket_log_entries add column if not exists payload jsonb;
+alter table ticket_log_entries add column if not exists changed_fields text[];
+create index if not exists idx_log_entries_changed_fields on ticket_log_entries using gin (changed_fields);
+
+-- existing rows are converted with: flask --app run migrate-log-payloads
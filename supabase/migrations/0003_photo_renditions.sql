@@ -0,0 +1,8 @@
+-- downscaled WebP renditions stored next to the original upload
+alter table ticket_photos add column if not exists thumbnail_url text;
+alter table ticket_photos add column if not exists medium_url text;
+create index if not exists idx_photos_file_path on ticket_photos (file_path);
+
+alter table ticket_attachments add column if not exists thumbnail_path text;
+alter table ticket_attachments add column if not exists medium_path text;
+create index if not exists idx_attachments_storage_path on ticket_attachments (storage_path);
@@ -0,0 +1,42 @@
+-- content addressed uploads: one stored file per distinct content, shared by
+-- ticket_photos / ticket_attachments rows and reference counted
+create table if not exists storage_blobs (
+    hash text primary key,
+    storage_path text unique not null,
+    size bigint,
+    mime_type text,
+    ref_count integer not null default 0,
+    thumbnail_path text,
+    medium_path text,
+    created_at timestamp not null default now()
+);
+
+-- adds p_refs references, a returned ref_count equal to p_refs means the file still has to be uploaded
+create or replace function acquire_blob(p_hash text, p_storage_path text, p_size bigint, p_mime_type text, p_refs integer default 1)
+returns setof storage_blobs
+language sql
+as $$
+    insert into storage_blobs (hash, storage_path, size, mime_type, ref_count)
+    values (p_hash, p_storage_path, p_size, p_mime_type, p_refs)
+    on conflict (hash) do update set ref_count = storage_blobs.ref_count + excluded.ref_count
+    returning *;
+$$;
+
+-- drops p_refs references, the row is deleted once no reference is left (ref_count <= 0 is returned)
+create or replace function release_blob(p_storage_path text, p_refs integer default 1)
+returns setof storage_blobs
+language plpgsql
+as $$
+declare
+    blob storage_blobs;
+begin
+    update storage_blobs set ref_count = ref_count - p_refs
+    where storage_path = p_storage_path
+    returning * into blob;
+
+    if found then
+        delete from storage_blobs where storage_path = p_storage_path and ref_count <= 0;
+        return next blob;
+    end if;
+end;
+$$;
@@ -0,0 +1,88 @@
+-- full-text search over ticket names, descriptions and log notes
+-- expression indexes instead of tsvector columns, so `select *` responses don't grow
+create extension if not exists pg_trgm;
+
+create index if not exists idx_tickets_search on tickets
+    using gin (to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, '')));
+create index if not exists idx_log_entries_search on ticket_log_entries
+    using gin (to_tsvector('simple', coalesce(message, '')));
+
+-- substring filters of the dashboards (ilike '%term%' on name / description)
+create index if not exists idx_tickets_name_trgm on tickets using gin (name gin_trgm_ops);
+create index if not exists idx_tickets_description_trgm on tickets using gin (description gin_trgm_ops);
+
+-- every term is matched as a prefix, all terms have to match
+create or replace function search_query(p_terms text[])
+returns tsquery
+language sql
+immutable
+as $$
+    select to_tsquery('simple', array_to_string(array(
+        select quote_literal(lower(t)) || ':*' from unnest(p_terms) t
+    ), ' & '));
+$$;
+
+-- ranked tickets (by name / description) and log entries (by note), best match first
+-- p_user_id restricts the hits to the tickets assigned to that user
+create or replace function search_tickets(p_terms text[], p_user_id uuid default null,
+                                          p_limit integer default 20, p_offset integer default 0)
+returns table (kind text, ticket_id uuid, log_entry_id uuid, ticket_name text, headline text,
+               rank real, created_at timestamp)
+language sql
+stable
+as $$
+    with q as (select search_query(p_terms) as query),
+    hits as (
+        select 'ticket' as kind, t.id as ticket_id, null::uuid as log_entry_id,
+               coalesce(t.name, '') || ' ' || coalesce(t.description, '') as document,
+               ts_rank(to_tsvector('simple', coalesce(t.name, '') || ' ' || coalesce(t.description, '')), q.query) as rank,
+               t.created_at
+        from tickets t, q
+        where to_tsvector('simple', coalesce(t.name, '') || ' ' || coalesce(t.description, '')) @@ q.query
+          and (p_user_id is null or t.assigned_to = p_user_id)
+        union all
+        select 'log', l.ticket_id, l.id, l.message,
+               ts_rank(to_tsvector('simple', coalesce(l.message, '')), q.query),
+               l.created_at
+        from ticket_log_entries l
+        join tickets t on t.id = l.ticket_id, q
+        where to_tsvector('simple', coalesce(l.message, '')) @@ q.query
+          and (p_user_id is null or t.assigned_to = p_user_id)
+        order by rank desc, created_at desc, ticket_id, log_entry_id
+        limit p_limit offset p_offset
+    )
+    -- headlines only for the returned page
+    select h.kind, h.ticket_id, h.log_entry_id, t.name,
+           ts_headline('simple', h.document, q.query, 'StartSel=**, StopSel=**, MaxFragments=1'),
+           h.rank, h.created_at
+    from hits h
+    join tickets t on t.id = h.ticket_id, q
+    order by h.rank desc, h.created_at desc, h.ticket_id, h.log_entry_id;
+$$;
+
+-- ranked ids of the log entries whose note or ticket name / description matches (history page)
+create or replace function search_log_entries(p_terms text[], p_changed_field text default null,
+                                              p_limit integer default 200, p_offset integer default 0)
+returns table (id uuid, rank real)
+language sql
+stable
+as $$
+    with q as (select search_query(p_terms) as query)
+    select m.id, max(m.rank)::real as rank
+    from (
+        select l.id,
+               ts_rank(to_tsvector('simple', coalesce(t.name, '') || ' ' || coalesce(t.description, '')), q.query) as rank,
+               l.created_at, l.changed_fields
+        from tickets t
+        join ticket_log_entries l on l.ticket_id = t.id, q
+        where to_tsvector('simple', coalesce(t.name, '') || ' ' || coalesce(t.description, '')) @@ q.query
+        union all
+        select l.id, ts_rank(to_tsvector('simple', coalesce(l.message, '')), q.query), l.created_at, l.changed_fields
+        from ticket_log_entries l, q
+        where to_tsvector('simple', coalesce(l.message, '')) @@ q.query
+    ) m
+    where p_changed_field is null or m.changed_fields @> array[p_changed_field]
+    group by m.id, m.created_at
+    order by rank desc, m.created_at desc, m.id
+    limit p_limit offset p_offset;
+$$;
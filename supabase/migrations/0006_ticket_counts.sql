@@ -0,0 +1,45 @@
+-- ticket counts per assignee / status / priority, kept up to date by a trigger on tickets,
+-- so the workload overview (GET /api/tickets/workload) never scans the tickets table
+create table if not exists ticket_counts (
+    assignee text not null default '',  -- assigned_to, '' for unassigned tickets
+    status integer not null,
+    priority integer not null,
+    count bigint not null default 0,
+    primary key (assignee, status, priority)
+);
+
+create or replace function adjust_ticket_count(p_assignee text, p_status integer, p_priority integer, p_delta integer)
+returns void
+language sql
+as $$
+    insert into ticket_counts (assignee, status, priority, count)
+    values (coalesce(p_assignee, ''), coalesce(p_status, 0), coalesce(p_priority, 0), p_delta)
+    on conflict (assignee, status, priority) do update set count = ticket_counts.count + excluded.count;
+$$;
+
+create or replace function maintain_ticket_counts()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform adjust_ticket_count(old.assigned_to::text, old.status, old.priority, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform adjust_ticket_count(new.assigned_to::text, new.status, new.priority, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists tickets_counts on tickets;
+create trigger tickets_counts
+    after insert or delete or update of assigned_to, status, priority on tickets
+    for each row execute function maintain_ticket_counts();
+
+-- counts of the existing tickets
+delete from ticket_counts;
+insert into ticket_counts (assignee, status, priority, count)
+select coalesce(assigned_to::text, ''), coalesce(status, 0), coalesce(priority, 0), count(*)
+from tickets
+group by 1, 2, 3;
@@ -0,0 +1,44 @@
+-- change counter per table, the ETags of GET /api/tickets, /api/users and /api/tickets/history
+-- are built from it, so a revalidation reads one small row instead of the whole list
+create table if not exists table_versions (
+    table_name text primary key,
+    version bigint not null default 0
+);
+
+create or replace function bump_table_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    insert into table_versions (table_name, version)
+    values (tg_table_name, 1)
+    on conflict (table_name) do update set version = table_versions.version + 1;
+    return null;
+end;
+$$;
+
+-- once per statement, a bulk update bumps the version once
+drop trigger if exists tickets_version on tickets;
+create trigger tickets_version
+    after insert or update or delete on tickets
+    for each statement execute function bump_table_version();
+
+-- users only on changes of the returned columns, not on token rotation / password rehashing
+drop trigger if exists users_version on users;
+create trigger users_version
+    after insert or update of name, email, role or delete on users
+    for each statement execute function bump_table_version();
+
+drop trigger if exists ticket_log_entries_version on ticket_log_entries;
+create trigger ticket_log_entries_version
+    after insert or update or delete on ticket_log_entries
+    for each statement execute function bump_table_version();
+
+drop trigger if exists ticket_attachments_version on ticket_attachments;
+create trigger ticket_attachments_version
+    after insert or update or delete on ticket_attachments
+    for each statement execute function bump_table_version();
+
+insert into table_versions (table_name)
+values ('tickets'), ('users'), ('ticket_log_entries'), ('ticket_attachments')
+on conflict do nothing;
@@ -0,0 +1,95 @@
+-- row version of every ticket, bumped by every update, for optimistic concurrency
+alter table tickets add column if not exists version integer not null default 0;
+
+create or replace function bump_ticket_row_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.version := old.version + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists tickets_row_version on tickets;
+create trigger tickets_row_version
+    before update on tickets
+    for each row execute function bump_ticket_row_version();
+
+-- POST /api/tickets/save_update in one call and one transaction: the change set is computed from the
+-- locked row, the log entry is written and the ticket updated together.
+-- p_expected_version (if given) has to be the current version of the ticket, otherwise nothing is
+-- written and conflict = true is returned with the current row.
+create or replace function update_ticket_with_log(p_ticket_id uuid, p_actor_user_id uuid, p_updates jsonb,
+                                                  p_note text default '', p_expected_version integer default null,
+                                                  p_now timestamp default now())
+returns jsonb
+language plpgsql
+as $$
+declare
+    old_ticket tickets%rowtype;
+    new_ticket tickets%rowtype;
+    log ticket_log_entries%rowtype;
+    new_status integer;
+    new_priority integer;
+    new_assignee uuid;
+    new_name text;
+    new_description text;
+    changes jsonb := '[]'::jsonb;
+begin
+    select * into old_ticket from tickets where id = p_ticket_id for update;
+    if not found then
+        return jsonb_build_object('conflict', false, 'ticket', null, 'log', null);
+    end if;
+    if p_expected_version is not null and old_ticket.version <> p_expected_version then
+        return jsonb_build_object('conflict', true, 'ticket', to_jsonb(old_ticket), 'log', null);
+    end if;
+
+    new_status := case when p_updates ? 'status' then (p_updates->>'status')::integer else old_ticket.status end;
+    new_priority := case when p_updates ? 'priority' then (p_updates->>'priority')::integer else old_ticket.priority end;
+    new_assignee := case when p_updates ? 'assigned_to' then nullif(p_updates->>'assigned_to', '')::uuid
+                         else old_ticket.assigned_to end;
+    new_name := case when p_updates ? 'name' then p_updates->>'name' else old_ticket.name end;
+    new_description := case when p_updates ? 'description' then p_updates->>'description'
+                            else old_ticket.description end;
+
+    if old_ticket.status is distinct from new_status then
+        changes := changes || jsonb_build_object('field', 'status', 'from', old_ticket.status, 'to', new_status);
+    end if;
+    if old_ticket.priority is distinct from new_priority then
+        changes := changes || jsonb_build_object('field', 'priority', 'from', old_ticket.priority, 'to', new_priority);
+    end if;
+    if old_ticket.assigned_to is distinct from new_assignee then
+        changes := changes || jsonb_build_object('field', 'assignee', 'from', old_ticket.assigned_to, 'to', new_assignee);
+    end if;
+
+    -- same layout as _build_log_payload in app/db.py (LOG_PAYLOAD_VERSION 1)
+    insert into ticket_log_entries (ticket_id, actor_user_id, action_type, message, old_status, new_status,
+                                    payload, changed_fields, created_at)
+    values (p_ticket_id, p_actor_user_id, 'update', coalesce(p_note, ''), old_ticket.status, new_status,
+            jsonb_build_object(
+                'version', 1,
+                'note', coalesce(p_note, ''),
+                'old_priority', old_ticket.priority, 'new_priority', new_priority,
+                'old_assignee', old_ticket.assigned_to, 'new_assignee', new_assignee,
+                'old_name', old_ticket.name, 'new_name', new_name,
+                'old_description', old_ticket.description, 'new_description', new_description,
+                'changes', changes),
+            array(select c->>'field' from jsonb_array_elements(changes) c),
+            p_now)
+    returning * into log;
+
+    update tickets
+    set name = new_name, description = new_description, status = new_status, priority = new_priority,
+        assigned_to = new_assignee, updated_at = p_now
+    where id = p_ticket_id
+    returning * into new_ticket;
+
+    -- lets the old assignee's delta feed report the ticket as removed
+    if old_ticket.assigned_to is not null and old_ticket.assigned_to is distinct from new_assignee then
+        insert into ticket_tombstones (ticket_id, user_id, created_at) values (p_ticket_id, old_ticket.assigned_to, p_now);
+    end if;
+
+    return jsonb_build_object('conflict', false, 'ticket', to_jsonb(new_ticket), 'log', to_jsonb(log));
+end;
+$$;
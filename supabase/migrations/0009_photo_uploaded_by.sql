@@ -0,0 +1,7 @@
+-- uploader of a photo, technicians can only delete their own photos
+alter table ticket_photos add column if not exists uploaded_by uuid;
+
+update ticket_photos p
+set uploaded_by = a.uploaded_by
+from ticket_attachments a
+where a.storage_path = p.file_path and a.ticket_id = p.ticket_id and p.uploaded_by is null;
@@ -0,0 +1,8 @@
+-- logged out access tokens until they expire, every app worker reads the unexpired ones periodically
+create table if not exists revoked_tokens (
+    jti text primary key,
+    expires_at timestamp not null,
+    created_at timestamp not null default now()
+);
+
+create index if not exists idx_revoked_tokens_expires_at on revoked_tokens (expires_at);
@@ -0,0 +1,50 @@
+-- POST /api/tickets/bulk in one call and one transaction. Items with an id go through update_ticket_with_log
+-- (locked row, optional "version" check, log entry, tombstone), items without one create a ticket logged with
+-- its values. Returns one {conflict, ticket, log} per item in the order of p_items, ticket is null for a
+-- ticket that doesn't exist.
+create or replace function bulk_update_tickets_with_log(p_actor_user_id uuid, p_items jsonb,
+                                                        p_note text default '', p_now timestamp default now())
+returns jsonb
+language plpgsql
+as $$
+declare
+    item jsonb;
+    new_ticket tickets%rowtype;
+    log ticket_log_entries%rowtype;
+    results jsonb := '[]'::jsonb;
+begin
+    for item in select value from jsonb_array_elements(p_items) loop
+        if item ? 'id' then
+            results := results || jsonb_build_array(update_ticket_with_log(
+                (item->>'id')::uuid, p_actor_user_id, item - 'id' - 'version', p_note,
+                (item->>'version')::integer, p_now));
+            continue;
+        end if;
+
+        insert into tickets (name, description, priority, status, created_by, assigned_to, created_at, updated_at)
+        values (item->>'name', coalesce(item->>'description', ''), coalesce((item->>'priority')::integer, 1),
+                coalesce((item->>'status')::integer, 1), p_actor_user_id, nullif(item->>'assigned_to', '')::uuid,
+                p_now, p_now)
+        returning * into new_ticket;
+
+        -- same layout as _build_log_payload in app/db.py (LOG_PAYLOAD_VERSION 1)
+        insert into ticket_log_entries (ticket_id, actor_user_id, action_type, message, old_status, new_status,
+                                        payload, changed_fields, created_at)
+        values (new_ticket.id, p_actor_user_id, 'create', coalesce(p_note, ''), new_ticket.status, new_ticket.status,
+                jsonb_build_object(
+                    'version', 1,
+                    'note', coalesce(p_note, ''),
+                    'old_priority', new_ticket.priority, 'new_priority', new_ticket.priority,
+                    'old_assignee', new_ticket.assigned_to, 'new_assignee', new_ticket.assigned_to,
+                    'old_name', new_ticket.name, 'new_name', new_ticket.name,
+                    'old_description', new_ticket.description, 'new_description', new_ticket.description,
+                    'changes', '[]'::jsonb),
+                '{}', p_now)
+        returning * into log;
+
+        results := results || jsonb_build_array(
+            jsonb_build_object('conflict', false, 'ticket', to_jsonb(new_ticket), 'log', to_jsonb(log)));
+    end loop;
+    return results;
+end;
+$$;
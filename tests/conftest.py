@@ -0,0 +1,66 @@
+import os
+
+# config.Config reads the environment on import: every test app gets a fresh in-memory database
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["SIMULATED_LATENCY_MS"] = "0"
+# cheap password hashes, the work factor isn't under test
+os.environ["PASSWORD_HASH_COST"] = "4"
+
+import pytest
+
+from app import create_app, db
+from app.backends import get_client
+from app.models import UserRoles
+
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config["TESTING"] = True
+    # module level caches outlive the database of the previous test
+    db.invalidate_table_versions()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def _session(client, name: str, role: UserRoles = UserRoles.TECHNICIAN) -> dict:
+    """Registers and logs in a user, returns its id, tokens and the headers of its requests."""
+    email = f"{name}@example.com"
+    client.post("/register", data={"username": name, "email": email, "password": "secret"})
+    user = get_client().table("users").update({"role": role.value}).eq("email", email).execute().data[0]
+    session = client.post("/login", data={"email": email, "password": "secret"}).json
+    return {
+        "id": user["id"],
+        "token": session["token"],
+        "refresh_token": session["refresh_token"],
+        "headers": {"Token": session["token"]},
+    }
+
+
+@pytest.fixture
+def manager(client):
+    return _session(client, "manager", UserRoles.MANAGER)
+
+
+@pytest.fixture
+def technician(client):
+    return _session(client, "technician")
+
+
+@pytest.fixture
+def other_technician(client):
+    return _session(client, "other")
+
+
+@pytest.fixture
+def ticket(client, manager, technician) -> dict:
+    """A ticket created by the manager and assigned to the technician."""
+    client.post("/api/tickets/create", json={"name": "Pump"}, headers=manager["headers"])
+    ticket_id = get_client().table("tickets").select("id").execute().data[0]["id"]
+    client.put("/api/tickets/update", json={"id": ticket_id, "assigned_to": technician["id"]},
+               headers=manager["headers"])
+    return db.get_ticket_by_id(ticket_id)
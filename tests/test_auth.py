@@ -0,0 +1,47 @@
+from app import db
+from app.backends import get_client
+
+
+def test_refresh_rotates_the_refresh_token(client, technician):
+    response = client.post("/api/auth/refresh", json={"refresh_token": technician["refresh_token"]})
+
+    assert response.status_code == 200
+    assert response.json["refresh_token"] != technician["refresh_token"]
+    assert client.get("/api/tickets", headers={"Token": response.json["token"]}).status_code == 200
+
+
+def test_reused_refresh_token_is_rejected(client, technician):
+    client.post("/api/auth/refresh", json={"refresh_token": technician["refresh_token"]})
+
+    response = client.post("/api/auth/refresh", json={"refresh_token": technician["refresh_token"]})
+
+    assert response.status_code == 401
+
+
+def test_logout_revokes_both_tokens(client, technician):
+    assert client.post("/api/auth/logout", headers=technician["headers"]).status_code == 200
+
+    assert client.get("/api/tickets", headers=technician["headers"]).status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": technician["refresh_token"]}).status_code == 401
+
+
+def test_missing_and_invalid_access_tokens(client):
+    assert client.get("/api/tickets").status_code == 401
+    assert client.get("/api/tickets", headers={"Token": "invalid"}).status_code == 401
+
+
+def test_non_ascii_token_is_rejected(client, technician):
+    payload = technician["token"].split(".")[0]
+
+    assert client.get("/api/tickets", headers={"Token": f"{payload}.sïgnature"}).status_code == 401
+    assert client.get("/api/tickets", headers={"Token": "pä.yload"}).status_code == 401
+
+
+def test_plaintext_passwords_are_hashed_in_pages(client):
+    for i in range(5):
+        get_client().table("users").insert({"name": f"legacy{i}", "email": f"legacy{i}@example.com",
+                                            "password": "secret"}).execute()
+
+    assert db.hash_plaintext_passwords(batch_size=2) == 5
+    assert db.hash_plaintext_passwords(batch_size=2) == 0
+    assert client.post("/login", data={"email": "legacy3@example.com", "password": "secret"}).status_code == 200
@@ -0,0 +1,99 @@
+import io
+
+import pytest
+
+from app.backends import get_client
+from app.backends.sqlite_backend import BucketClient
+
+
+def _upload(client, session: dict, ticket_id: str, content: bytes) -> None:
+    response = client.put(f"/api/photos/{ticket_id}", data={"file": (io.BytesIO(content), "report.txt")},
+                          content_type="multipart/form-data", headers=session["headers"])
+    assert response.status_code == 200
+
+
+def _photos(client, session: dict, ticket_id: str) -> list[dict]:
+    return client.get(f"/api/photos/{ticket_id}", headers=session["headers"]).json["pictures"]
+
+
+def _blobs() -> list[dict]:
+    return get_client().table("storage_blobs").select("*").execute().data
+
+
+@pytest.fixture
+def photo(client, technician, ticket) -> dict:
+    _upload(client, technician, ticket["id"], b"pump report")
+    return _photos(client, technician, ticket["id"])[0]
+
+
+def test_uploader_deletes_own_photo(client, technician, ticket, photo):
+    response = client.delete(f"/api/photos/{ticket['id']}/{photo['id']}", headers=technician["headers"])
+
+    assert response.status_code == 200
+    assert _photos(client, technician, ticket["id"]) == []
+
+
+def test_other_users_cannot_delete_a_photo(client, other_technician, ticket, photo):
+    response = client.delete(f"/api/photos/{ticket['id']}/{photo['id']}", headers=other_technician["headers"])
+
+    assert response.status_code == 403
+
+
+def test_manager_deletes_any_photo(client, manager, ticket, photo):
+    response = client.delete(f"/api/photos/{ticket['id']}/{photo['id']}", headers=manager["headers"])
+
+    assert response.status_code == 200
+
+
+def test_deleting_a_missing_photo(client, technician, ticket):
+    response = client.delete(f"/api/photos/{ticket['id']}/missing", headers=technician["headers"])
+
+    assert response.status_code == 404
+
+
+def test_same_content_is_stored_once(client, manager, technician, ticket):
+    _upload(client, technician, ticket["id"], b"pump report")
+    _upload(client, manager, ticket["id"], b"pump report")
+
+    photos = _photos(client, manager, ticket["id"])
+    blobs = _blobs()
+
+    assert len(photos) == 2
+    assert photos[0]["file_path"] == photos[1]["file_path"]
+    assert [b["ref_count"] for b in blobs] == [2]
+
+
+def test_blob_is_removed_with_its_last_reference(client, manager, technician, ticket):
+    _upload(client, technician, ticket["id"], b"pump report")
+    _upload(client, manager, ticket["id"], b"pump report")
+    first, second = _photos(client, manager, ticket["id"])
+    storage_url = f"/storage/photo_bucket/{first['file_path']}"
+
+    client.delete(f"/api/photos/{ticket['id']}/{first['id']}", headers=manager["headers"])
+
+    assert [b["ref_count"] for b in _blobs()] == [1]
+    assert client.get(storage_url).status_code == 200
+
+    client.delete(f"/api/photos/{ticket['id']}/{second['id']}", headers=manager["headers"])
+
+    assert _blobs() == []
+    assert client.get(storage_url).status_code == 404
+
+
+def test_upload_during_removal_keeps_its_file(client, manager, ticket, monkeypatch):
+    _upload(client, manager, ticket["id"], b"pump report")
+    photo = _photos(client, manager, ticket["id"])[0]
+
+    # the same content is uploaded again after the last reference was dropped, before the file is removed
+    remove = BucketClient.remove
+    def upload_then_remove(self, paths):
+        monkeypatch.setattr(BucketClient, "remove", remove)
+        _upload(client, manager, ticket["id"], b"pump report")
+        return remove(self, paths)
+    monkeypatch.setattr(BucketClient, "remove", upload_then_remove)
+    client.delete(f"/api/photos/{ticket['id']}/{photo['id']}", headers=manager["headers"])
+
+    photos = _photos(client, manager, ticket["id"])
+    assert len(photos) == 1
+    assert [b["storage_path"] for b in _blobs()] == [photos[0]["file_path"]]
+    assert client.get(f"/storage/photo_bucket/{photos[0]['file_path']}").status_code == 200
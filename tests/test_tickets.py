@@ -0,0 +1,171 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.backends import get_client
+
+
+@pytest.mark.parametrize("method, path, body", [
+    ("POST", "/api/tickets/create", {"name": "Valve"}),
+    ("POST", "/api/tickets/bulk", {"tickets": [{"id": "x", "status": 2}]}),
+    ("GET", "/api/tickets/workload", None),
+    ("GET", "/api/tickets/history/export", None),
+])
+def test_manager_routes_reject_technicians(client, technician, method, path, body):
+    response = client.open(path, method=method, json=body, headers=technician["headers"])
+
+    assert response.status_code == 403
+
+
+def test_technician_updates_the_status_of_own_ticket(client, technician, ticket):
+    response = client.put("/api/tickets/update", json={"id": ticket["id"], "status": 2},
+                          headers=technician["headers"])
+
+    assert response.status_code == 200
+    assert response.json["ticket"]["status"] == 2
+
+
+def test_technician_cannot_update_other_fields(client, technician, ticket):
+    response = client.put("/api/tickets/update", json={"id": ticket["id"], "priority": 3},
+                          headers=technician["headers"])
+
+    assert response.status_code == 403
+
+
+def test_technician_cannot_update_tickets_of_others(client, other_technician, ticket):
+    response = client.put("/api/tickets/update", json={"id": ticket["id"], "status": 2},
+                          headers=other_technician["headers"])
+
+    assert response.status_code == 403
+
+
+def test_technician_saves_status_and_note_of_own_ticket(client, technician, ticket):
+    # the sidebar sends every field, unchanged ones are allowed
+    response = client.post("/api/tickets/save_update",
+                           data={"ticket_id": ticket["id"], "status": 2, "priority": ticket["priority"],
+                                 "name": ticket["name"], "assigned_to": technician["id"], "message": "done"},
+                           headers=technician["headers"])
+
+    assert response.status_code == 200
+    assert response.json["ticket"]["status"] == 2
+
+
+@pytest.mark.parametrize("field, value", [("name", "Renamed"), ("priority", "3"), ("assigned_to", "")])
+def test_technician_cannot_save_other_fields(client, technician, ticket, field, value):
+    response = client.post("/api/tickets/save_update", data={"ticket_id": ticket["id"], field: value},
+                           headers=technician["headers"])
+
+    assert response.status_code == 403
+
+
+def test_technician_cannot_save_tickets_of_others(client, other_technician, ticket):
+    response = client.post("/api/tickets/save_update", data={"ticket_id": ticket["id"], "message": "note"},
+                           headers=other_technician["headers"])
+
+    assert response.status_code == 403
+
+
+def test_update_with_stale_version_conflicts(client, manager, ticket):
+    client.put("/api/tickets/update", json={"id": ticket["id"], "priority": 2}, headers=manager["headers"])
+
+    response = client.put("/api/tickets/update",
+                          json={"id": ticket["id"], "priority": 3, "version": ticket["version"]},
+                          headers=manager["headers"])
+
+    assert response.status_code == 409
+    assert response.json["ticket"]["priority"] == 2
+
+
+def test_save_update_with_stale_version_conflicts(client, manager, technician, ticket):
+    client.post("/api/tickets/save_update", data={"ticket_id": ticket["id"], "status": 2},
+                headers=technician["headers"])
+
+    response = client.post("/api/tickets/save_update",
+                           data={"ticket_id": ticket["id"], "status": 3, "version": ticket["version"]},
+                           headers=manager["headers"])
+
+    assert response.status_code == 409
+    assert response.json["ticket"]["status"] == 2
+
+
+def test_save_update_with_current_version(client, manager, ticket):
+    response = client.post("/api/tickets/save_update",
+                           data={"ticket_id": ticket["id"], "status": 3, "version": ticket["version"]},
+                           headers=manager["headers"])
+
+    assert response.status_code == 200
+    assert response.json["ticket"]["version"] == ticket["version"] + 1
+
+
+def test_save_update_of_missing_ticket(client, manager):
+    response = client.post("/api/tickets/save_update", data={"ticket_id": "5b0c7c1e-3f1a-4c50-9a4e-000000000000",
+                                                             "status": 2}, headers=manager["headers"])
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("field, value", [("status", "99"), ("priority", "0"), ("status", "closed")])
+def test_save_update_rejects_invalid_values(client, manager, ticket, field, value):
+    response = client.post("/api/tickets/save_update", data={"ticket_id": ticket["id"], field: value},
+                           headers=manager["headers"])
+
+    assert response.status_code == 400
+    assert db.get_ticket_by_id(ticket["id"])["version"] == ticket["version"]
+
+
+def test_changes_report_reassigned_tickets_as_removed(client, manager, technician, other_technician, ticket):
+    since = datetime.now().isoformat()
+    client.put("/api/tickets/update", json={"id": ticket["id"], "assigned_to": other_technician["id"]},
+               headers=manager["headers"])
+
+    removed = client.get("/api/tickets/changes", query_string={"since": since}, headers=technician["headers"]).json
+    added = client.get("/api/tickets/changes", query_string={"since": since},
+                       headers=other_technician["headers"]).json
+
+    assert removed["removed"] == [ticket["id"]]
+    assert removed["tickets"] == []
+    assert [t["id"] for t in added["tickets"]] == [ticket["id"]]
+    assert added["removed"] == []
+
+
+def test_changes_require_a_valid_since(client, technician):
+    response = client.get("/api/tickets/changes", query_string={"since": "yesterday"}, headers=technician["headers"])
+
+    assert response.status_code == 400
+
+
+def test_bulk_conflict_only_fails_its_item(client, manager, technician, ticket):
+    client.put("/api/tickets/update", json={"id": ticket["id"], "priority": 2}, headers=manager["headers"])
+
+    response = client.post("/api/tickets/bulk", json={"tickets": [
+        {"id": ticket["id"], "status": 3, "version": ticket["version"]},
+        {"name": "Valve", "assigned_to": technician["id"]},
+    ]}, headers=manager["headers"])
+    first, second = response.json["results"]
+
+    assert first["success"] is False
+    assert first["ticket"]["priority"] == 2
+    assert second["success"] is True
+
+
+def test_bulk_update_keeps_other_columns_and_logs(client, manager, other_technician, ticket):
+    client.put("/api/tickets/update", json={"id": ticket["id"], "name": "Renamed"}, headers=manager["headers"])
+
+    response = client.post("/api/tickets/bulk", json={"tickets": [
+        {"id": ticket["id"], "assigned_to": other_technician["id"]},
+    ], "message": "handover"}, headers=manager["headers"])
+    history = client.get("/api/tickets/history", headers=manager["headers"]).json["entries"]
+
+    assert response.json["success"] is True
+    assert get_client().table("tickets").select("name").eq("id", ticket["id"]).execute().data[0]["name"] == "Renamed"
+    assert history[0]["update"] == "handover"
+    assert history[0]["assignee"] == other_technician["id"]
+
+
+@pytest.mark.parametrize("item", [{"id": ["x"], "status": 2}, {"id": "x", "status": 2}, {"name": "Valve", "status": 99}])
+def test_bulk_rejects_invalid_items(client, manager, item):
+    response = client.post("/api/tickets/bulk", json={"tickets": [item]}, headers=manager["headers"])
+
+    assert response.status_code == 200
+    assert response.json["results"][0]["success"] is False
@@ -0,0 +1,38 @@
+import uuid
+
+
+def _create(client, session: dict, ticket_id: str, mime_type: str = "text/plain"):
+    return client.post("/api/uploads", json={"ticket_id": ticket_id, "files": [
+        {"file_name": "report.txt", "mime_type": mime_type, "size": 11},
+    ]}, headers=session["headers"])
+
+
+def _upload_and_finalize(client, session: dict, ticket_id: str, content_type: str):
+    upload = _create(client, session, ticket_id).json["uploads"][0]
+    assert client.put(upload["upload_url"], data=b"pump report", content_type=content_type).status_code == 200
+    return client.post("/api/uploads/finalize", json={"ticket_id": ticket_id, "uploads": [upload["upload_token"]]},
+                       headers=session["headers"])
+
+
+def test_uploads_for_missing_ticket(client, manager):
+    assert _create(client, manager, str(uuid.uuid4())).status_code == 404
+
+
+def test_uploads_for_tickets_of_others(client, other_technician, ticket):
+    assert _create(client, other_technician, ticket["id"]).status_code == 403
+
+
+def test_finalized_upload_becomes_a_photo(client, technician, ticket):
+    response = _upload_and_finalize(client, technician, ticket["id"], "text/plain")
+    photos = client.get(f"/api/photos/{ticket['id']}", headers=technician["headers"]).json["pictures"]
+
+    assert response.json["success"] is True
+    assert len(photos) == 1
+
+
+def test_upload_of_another_type_is_rejected(client, technician, ticket):
+    response = _upload_and_finalize(client, technician, ticket["id"], "text/html")
+    photos = client.get(f"/api/photos/{ticket['id']}", headers=technician["headers"]).json["pictures"]
+
+    assert response.json["success"] is False
+    assert photos == []
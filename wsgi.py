@@ -0,0 +1,8 @@
+"""
+Production entry point, served by a multi-worker WSGI server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import create_app
+
+app = create_app()